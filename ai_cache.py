@@ -0,0 +1,104 @@
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Вежливые и служебные слова, которые не меняют смысл вопроса
+FILLER_WORDS = {
+    "пожалуйста", "подскажите", "скажите", "здравствуйте", "привет", "добрый", "день", "вечер", "утро",
+    "а", "и", "ну", "please", "hi", "hello", "hey", "tell", "me", "could", "you", "iltimos", "salom",
+    "assalomu", "alaykum",
+}
+# Вопросы про собственную бронь, счёт или с цифрами (номер комнаты, даты, телефон) —
+# ответ зависит от данных гостя, такие запросы кэш пропускает
+PRIVATE_PATTERN = re.compile(
+    r"\d|\b(мо[йяеи]\w*|мне|меня|бронь\w*|брониров\w*|сч[её]т\w*|оплат\w*|выписк\w*|"
+    r"my|mine|booking|reservation|bill|invoice|payment|paid|"
+    r"mening|bron\w*|hisob\w*|to'lov\w*)\b",
+    re.IGNORECASE,
+)
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def normalize_prompt(prompt):
+    text = unicodedata.normalize("NFKC", prompt).casefold().replace("ё", "е")
+    return " ".join(word for word in TOKEN_PATTERN.findall(text) if word not in FILLER_WORDS)
+
+
+def is_private_prompt(prompt):
+    return bool(PRIVATE_PATTERN.search(unicodedata.normalize("NFKC", prompt)))
+
+
+# Кэш ответов модели: LRU с TTL в памяти воркера и, если передан redis, общий уровень
+# в Redis для всех воркеров. Ключ — нормализованный вопрос, язык и версия фактов об отеле
+class AIResponseCache:
+    def __init__(self, redis=None, ttl=3600, max_entries=1000, prefix="ai-cache"):
+        self.redis = redis
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self._entries = OrderedDict()
+        self.metrics = {"memory_hits": 0, "redis_hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+
+    def key(self, prompt, lang, facts_version):
+        normalized = normalize_prompt(prompt)
+        if not normalized or is_private_prompt(prompt):
+            return None
+        return hashlib.sha256(f"{facts_version}\x00{lang}\x00{normalized}".encode()).hexdigest()
+
+    def _remember(self, key, answer):
+        self._entries[key] = (time.monotonic() + self.ttl, answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.metrics["evictions"] += 1
+
+    async def get(self, key):
+        if key is None:
+            self.metrics["bypassed"] += 1
+            return None
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.metrics["memory_hits"] += 1
+                return entry[1]
+            del self._entries[key]
+
+        if self.redis is not None:
+            try:
+                answer = await self.redis.get(f"{self.prefix}:{key}")
+            except Exception as e:
+                logging.warning(f"AI cache lookup in Redis failed: {e}")
+                answer = None
+            if answer is not None:
+                answer = answer.decode() if isinstance(answer, bytes) else answer
+                self._remember(key, answer)
+                self.metrics["redis_hits"] += 1
+                return answer
+
+        self.metrics["misses"] += 1
+        return None
+
+    async def set(self, key, answer):
+        if key is None:
+            return
+        self._remember(key, answer)
+        self.metrics["stores"] += 1
+        if self.redis is not None:
+            try:
+                await self.redis.set(f"{self.prefix}:{key}", answer, ex=self.ttl)
+            except Exception as e:
+                logging.warning(f"AI cache store in Redis failed: {e}")
+
+    def stats(self):
+        hits = self.metrics["memory_hits"] + self.metrics["redis_hits"]
+        lookups = hits + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "entries": len(self._entries),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
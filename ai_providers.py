@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import zlib
+
+
+class AIProviderError(Exception):
+    pass
+
+
+# Провайдеры AI-ответов. Общий интерфейс: generate(prompt) возвращает текст целиком,
+# stream(prompt) — асинхронный генератор фрагментов текста по мере готовности,
+# warm_up() — синхронная подготовка клиента (вызывается в потоке при старте приложения).
+class GeminiProvider:
+    name = "gemini"
+
+    def __init__(self, api_key, model_name="gemini-1.5-flash"):
+        self.api_key = api_key
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    # Импорт клиента Gemini занимает около полсекунды, поэтому он откладывается до warm_up
+    # (фоном при старте) или до первого вызова, если warm_up ещё не закончился
+    def warm_up(self):
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=self.api_key)
+                self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    async def _get_model(self):
+        return self._model or await asyncio.to_thread(self.warm_up)
+
+    async def generate(self, prompt):
+        try:
+            model = await self._get_model()
+            response = await model.generate_content_async(prompt)
+            return response.text
+        except Exception as e:
+            raise AIProviderError(str(e)) from e
+
+    async def stream(self, prompt):
+        try:
+            model = await self._get_model()
+            response = await model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            raise AIProviderError(str(e)) from e
+
+
+LOCAL_ANSWERS = [
+    "Завтрак подаётся с 7:00 до 10:30 в ресторане на первом этаже. Для гостей номеров категории люкс доступна подача в номер.",
+    "Пароль от wifi указан на карточке в номере. Если карточки нет, обратитесь на ресепшен, вам его продиктуют.",
+    "Выезд до 12:00. Поздний выезд возможен по запросу, ресепшен подтвердит наличие и стоимость.",
+    "Фитнес-зал работает круглосуточно на втором этаже, вход по ключ-карте номера.",
+    "Трансфер в аэропорт можно заказать в разделе услуг приложения или на ресепшене не позднее чем за три часа.",
+]
+
+
+# Локальная замена модели для офлайн-стендов и нагрузочных тестов: ответ выбирается
+# по контрольной сумме вопроса, задержка, доля ошибок и разбиение потока на фрагменты
+# настраиваются. При одинаковом seed последовательность задержек и ошибок повторяется
+class LocalProvider:
+    name = "local"
+
+    def __init__(self, latency_ms=300, jitter_ms=100, failure_rate=0.0, chunk_words=3, chunk_delay_ms=40, seed=None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.failure_rate = failure_rate
+        self.chunk_words = max(1, chunk_words)
+        self.chunk_delay = chunk_delay_ms / 1000
+        self._random = random.Random(seed)
+
+    def warm_up(self):
+        pass
+
+    def _answer(self, prompt):
+        return LOCAL_ANSWERS[zlib.crc32(prompt.strip().lower().encode()) % len(LOCAL_ANSWERS)]
+
+    async def _wait_first_token(self):
+        delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        failed = self._random.random() < self.failure_rate
+        await asyncio.sleep(delay)
+        if failed:
+            raise AIProviderError("local provider: simulated failure")
+
+    async def generate(self, prompt):
+        await self._wait_first_token()
+        return self._answer(prompt)
+
+    async def stream(self, prompt):
+        await self._wait_first_token()
+        words = self._answer(prompt).split(" ")
+        for i in range(0, len(words), self.chunk_words):
+            if i:
+                await asyncio.sleep(self.chunk_delay)
+            chunk = " ".join(words[i:i + self.chunk_words])
+            yield chunk if i + self.chunk_words >= len(words) else chunk + " "
+
+
+def create_ai_provider():
+    provider = os.getenv("AI_PROVIDER", "gemini")
+    if provider == "gemini":
+        return GeminiProvider(os.getenv("API_KEY"), os.getenv("AI_MODEL", "gemini-1.5-flash"))
+    if provider == "local":
+        seed = os.getenv("LOCAL_AI_SEED")
+        return LocalProvider(
+            latency_ms=float(os.getenv("LOCAL_AI_LATENCY_MS", "300")),
+            jitter_ms=float(os.getenv("LOCAL_AI_JITTER_MS", "100")),
+            failure_rate=float(os.getenv("LOCAL_AI_FAILURE_RATE", "0")),
+            chunk_words=int(os.getenv("LOCAL_AI_CHUNK_WORDS", "3")),
+            chunk_delay_ms=float(os.getenv("LOCAL_AI_CHUNK_DELAY_MS", "40")),
+            seed=int(seed) if seed is not None else None,
+        )
+    raise ValueError(f"Unknown AI_PROVIDER: {provider}")
+
+
+class AIUnavailableError(AIProviderError):
+    pass
+
+
+# Защита API от деградации модели: не больше max_in_flight одновременных вызовов
+# (остальные ждут слот не дольше queue_timeout), дедлайн на каждый вызов и автомат
+# размыкания. После failure_threshold ошибок подряд вызовы сразу получают отказ;
+# через reset_timeout секунд пропускается один пробный вызов (half-open): успех
+# замыкает цепь, ошибка снова размыкает её. provider=None — AI выключен (AI_ENABLED=0):
+# вызовы сразу получают AIUnavailableError
+class GuardedAIClient:
+    def __init__(self, provider, max_in_flight=20, queue_timeout=1.0, timeout=15.0, stream_timeout=60.0,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.provider = provider
+        self.name = provider.name if provider else "disabled"
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.stream_timeout = stream_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._in_flight = 0
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.metrics = {"calls": 0, "errors": 0, "timeouts": 0, "rejected": 0, "shed": 0, "opened": 0}
+
+    def _now(self):
+        return asyncio.get_running_loop().time()
+
+    def _admit(self):
+        if self._state == "open":
+            if self._now() - self._opened_at < self.reset_timeout:
+                self.metrics["rejected"] += 1
+                raise AIUnavailableError("AI circuit is open")
+            self._state = "half_open"
+        if self._state == "half_open":
+            if self._probe_in_flight:
+                self.metrics["rejected"] += 1
+                raise AIUnavailableError("AI circuit is half-open, probe in progress")
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def _record(self, probe, ok):
+        if probe:
+            self._probe_in_flight = False
+        if ok:
+            self._failures = 0
+            self._state = "closed"
+            return
+        self._failures += 1
+        if probe or (self._state == "closed" and self._failures >= self.failure_threshold):
+            if self._state != "open":
+                self.metrics["opened"] += 1
+                logging.warning(f"AI circuit opened after {self._failures} consecutive failures")
+            self._state = "open"
+            self._opened_at = self._now()
+
+    # Проба, не дождавшаяся слота (таймаут очереди или отмена запроса), снимает флаг,
+    # иначе полуоткрытый автомат отклонял бы все вызовы навсегда
+    async def _acquire(self, probe):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if probe:
+                self._probe_in_flight = False
+            self.metrics["shed"] += 1
+            raise AIUnavailableError("Too many AI requests in flight")
+        except BaseException:
+            if probe:
+                self._probe_in_flight = False
+            raise
+        self._in_flight += 1
+        self.metrics["calls"] += 1
+
+    def _release(self):
+        self._in_flight -= 1
+        self._semaphore.release()
+
+    def _fail(self, probe, error):
+        self.metrics["timeouts" if isinstance(error, asyncio.TimeoutError) else "errors"] += 1
+        self._record(probe, ok=False)
+
+    def warm_up(self):
+        if self.provider:
+            self.provider.warm_up()
+
+    async def generate(self, prompt):
+        if self.provider is None:
+            raise AIUnavailableError("AI is disabled")
+        probe = self._admit()
+        await self._acquire(probe)
+        try:
+            answer = await asyncio.wait_for(self.provider.generate(prompt), timeout=self.timeout)
+        except asyncio.CancelledError:
+            if probe:
+                self._probe_in_flight = False
+            raise
+        except Exception as e:
+            self._fail(probe, e)
+            raise AIProviderError(f"AI call failed: {e!r}") from e
+        finally:
+            self._release()
+        self._record(probe, ok=True)
+        return answer
+
+    # Дедлайн потока: первый фрагмент — за timeout, весь ответ — за stream_timeout
+    async def stream(self, prompt):
+        if self.provider is None:
+            raise AIUnavailableError("AI is disabled")
+        probe = self._admit()
+        await self._acquire(probe)
+        started = self._now()
+        chunks = self.provider.stream(prompt)
+        first = True
+        try:
+            while True:
+                limit = self.timeout if first else self.stream_timeout - (self._now() - started)
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(0.0, limit))
+                except StopAsyncIteration:
+                    break
+                first = False
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            if probe:
+                self._probe_in_flight = False
+            raise
+        except Exception as e:
+            self._fail(probe, e)
+            raise AIProviderError(f"AI stream failed: {e!r}") from e
+        else:
+            self._record(probe, ok=True)
+        finally:
+            self._release()
+            await chunks.aclose()
+
+    def stats(self):
+        state = self._state
+        if state == "open" and self._now() - self._opened_at >= self.reset_timeout:
+            state = "half_open"
+        return {
+            **self.metrics,
+            "state": state,
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "consecutive_failures": self._failures,
+        }
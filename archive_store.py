@@ -0,0 +1,168 @@
+import gzip
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+
+import orjson
+
+# Запись индекса сегмента: booking_id, chat_id, смещение и длина gzip-блока чата в файле данных.
+# Записи отсортированы по (booking_id, chat_id), поэтому чаты брони ищутся двоичным поиском
+INDEX_RECORD = struct.Struct("<QQQQ")
+DATA_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".idx"
+
+
+class _BookingKeys:
+    def __init__(self, segment):
+        self.segment = segment
+
+    def __len__(self):
+        return self.segment.count
+
+    def __getitem__(self, i):
+        return self.segment.record(i)[0]
+
+
+# Неизменяемый сегмент архива. Файл данных — последовательность gzip-блоков по одному
+# на чат (вместе это обычный .jsonl.gz: zcat выдаёт по строке JSON на чат), индекс —
+# массив записей INDEX_RECORD. Оба файла отображаются в память и читаются без загрузки целиком
+class ArchiveSegment:
+    def __init__(self, directory, name):
+        self.name = name
+        self._maps = []
+        self._index = self._map(os.path.join(directory, name + INDEX_SUFFIX))
+        self._data = self._map(os.path.join(directory, name + DATA_SUFFIX))
+        self.count = len(self._index) // INDEX_RECORD.size if self._index else 0
+        self.size = len(self._data)
+        self.first_booking_id = self.record(0)[0] if self.count else None
+        self.last_booking_id = self.record(self.count - 1)[0] if self.count else None
+
+    def _map(self, path):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return mapped
+
+    def record(self, i):
+        return INDEX_RECORD.unpack_from(self._index, i * INDEX_RECORD.size)
+
+    def chat_ids(self):
+        return (chat_id for _, chat_id, _, _ in INDEX_RECORD.iter_unpack(self._index))
+
+    def find(self, booking_id):
+        if not self.count or not self.first_booking_id <= booking_id <= self.last_booking_id:
+            return []
+        i = bisect_left(_BookingKeys(self), booking_id)
+        chats = []
+        while i < self.count:
+            record_booking_id, chat_id, offset, length = self.record(i)
+            if record_booking_id != booking_id:
+                break
+            chats.append(orjson.loads(gzip.decompress(self._data[offset:offset + length])))
+            i += 1
+        return chats
+
+    def close(self):
+        for mapped in self._maps:
+            mapped.close()
+        self._maps = []
+
+
+# Холодный архив переписки: каталог с append-only сегментами. Каждый запуск архивации
+# пишет новый сегмент (временные файлы, fsync, rename), существующие не меняются.
+# Сегмент виден читателям, когда появился его индекс: данные переименовываются раньше.
+# Каталог должен быть общим для всех воркеров и хостов, пишет только лидер планировщика
+class ArchiveStore:
+    def __init__(self, directory, rescan_interval=5.0):
+        self.directory = directory
+        self.rescan_interval = rescan_interval
+        self._segments = {}
+        self._directory_mtime = None
+        self._listed_at = 0.0
+        self._lock = threading.Lock()
+
+    def _segment_names(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            name[:-len(INDEX_SUFFIX)] for name in names
+            if name.endswith(INDEX_SUFFIX) and name[:-len(INDEX_SUFFIX)] + DATA_SUFFIX in names
+        )
+
+    # Новые сегменты других воркеров подхватываются по изменению mtime каталога. Грубая
+    # точность mtime (секунды на части ФС, кэш атрибутов NFS) может скрыть rename индекса,
+    # поэтому каталог перечитывается и раз в rescan_interval секунд
+    def segments(self):
+        with self._lock:
+            try:
+                mtime = os.stat(self.directory).st_mtime_ns
+            except FileNotFoundError:
+                return []
+            now = time.monotonic()
+            if mtime != self._directory_mtime or now - self._listed_at >= self.rescan_interval:
+                for name in self._segment_names():
+                    if name not in self._segments:
+                        self._segments[name] = ArchiveSegment(self.directory, name)
+                self._directory_mtime = mtime
+                self._listed_at = now
+            return [self._segments[name] for name in sorted(self._segments, reverse=True)]
+
+    # Чаты брони из самого нового сегмента, где она есть: если запуск архивации прервался
+    # после записи сегмента, бронь попадёт в следующий, и читается последняя копия
+    def find(self, booking_id):
+        for segment in self.segments():
+            chats = segment.find(booking_id)
+            if chats:
+                return chats
+        return []
+
+    def write_segment(self, chats):
+        os.makedirs(self.directory, exist_ok=True)
+        names = self._segment_names()
+        name = f"{int(names[-1]) + 1 if names else 1:08d}"
+        data_path = os.path.join(self.directory, name + DATA_SUFFIX)
+        index_path = os.path.join(self.directory, name + INDEX_SUFFIX)
+
+        records = []
+        with open(data_path + ".tmp", "wb") as data:
+            for chat in sorted(chats, key=lambda chat: (chat["booking_id"], chat["id"])):
+                block = gzip.compress(orjson.dumps(chat) + b"\n", mtime=0)
+                records.append(INDEX_RECORD.pack(chat["booking_id"], chat["id"], data.tell(), len(block)))
+                data.write(block)
+            data.flush()
+            os.fsync(data.fileno())
+        with open(index_path + ".tmp", "wb") as index:
+            index.write(b"".join(records))
+            index.flush()
+            os.fsync(index.fileno())
+
+        os.rename(data_path + ".tmp", data_path)
+        os.rename(index_path + ".tmp", index_path)
+        logging.info(f"Archive segment {name}: {len(records)} chats, {os.path.getsize(data_path)} bytes")
+        return name
+
+    # Чат, повторно заархивированный после прерванного запуска, лежит в двух сегментах
+    # и считается один раз
+    def stats(self):
+        segments = self.segments()
+        return {
+            "segments": len(segments),
+            "chats": len({chat_id for segment in segments for chat_id in segment.chat_ids()}),
+            "bytes": sum(segment.size for segment in segments),
+        }
+
+    def close(self):
+        with self._lock:
+            for segment in self._segments.values():
+                segment.close()
+            self._segments = {}
+            self._directory_mtime = None
+            self._listed_at = 0.0
@@ -0,0 +1,87 @@
+import logging
+import time
+
+# Выбор сотрудника для чата одним скриптом в Redis, чтобы параллельные воркеры
+# не отдали один и тот же "наименее загруженный" слот двум чатам. Предпочтительный
+# сотрудник (тот, кто уже вёл этот чат) получает чат, если он в сети. Загрузка
+# выбранного сотрудника увеличивается в обоих случаях, поэтому вызывающий сначала
+# снимает чат с прежнего сотрудника через add_load(previous_id, -1); если чат занять
+# не удалось, увеличение возвращается через add_load(employee_id, -1)
+PICK_EMPLOYEE_SCRIPT = """
+local online = redis.call('zrangebyscore', KEYS[1], ARGV[1], '+inf')
+local best, best_load = nil, nil
+for _, member in ipairs(online) do
+    if member == ARGV[2] then
+        redis.call('hincrby', KEYS[2], member, 1)
+        return member
+    end
+    local load = tonumber(redis.call('hget', KEYS[2], member) or '0')
+    if best == nil or load < best_load or (load == best_load and tonumber(member) < tonumber(best)) then
+        best, best_load = member, load
+    end
+end
+if best then
+    redis.call('hincrby', KEYS[2], best, 1)
+end
+return best
+"""
+
+
+# Присутствие сотрудников ресепшена и их загрузка (число назначенных чатов) в Redis.
+# Присутствие — sorted set с временем последнего запроса; загрузка — hash, который
+# увеличивается при каждом назначении и периодически пересчитывается из БД
+class ReceptionRouter:
+    def __init__(self, redis, presence_ttl=90, prefix="reception"):
+        self.redis = redis
+        self.presence_ttl = presence_ttl
+        self.online_key = f"{prefix}:online"
+        self.load_key = f"{prefix}:load"
+        # Пульс пишется в Redis не чаще раза в треть TTL на сотрудника
+        self._last_heartbeat = {}
+
+    async def heartbeat(self, employee_id, force=False):
+        now = time.time()
+        if not force and now - self._last_heartbeat.get(employee_id, 0) < self.presence_ttl / 3:
+            return
+        self._last_heartbeat[employee_id] = now
+        try:
+            await self.redis.zadd(self.online_key, {str(employee_id): now})
+        except Exception as e:
+            logging.warning(f"Failed to record presence of employee {employee_id}: {e}")
+
+    async def go_offline(self, employee_id):
+        self._last_heartbeat.pop(employee_id, None)
+        await self.redis.zrem(self.online_key, str(employee_id))
+
+    async def online(self):
+        cutoff = time.time() - self.presence_ttl
+        await self.redis.zremrangebyscore(self.online_key, "-inf", f"({cutoff}")
+        members = await self.redis.zrange(self.online_key, 0, -1, withscores=True)
+        return {int(member): last_seen for member, last_seen in members}
+
+    async def pick(self, preferred=None):
+        try:
+            employee_id = await self.redis.eval(
+                PICK_EMPLOYEE_SCRIPT, 2, self.online_key, self.load_key,
+                time.time() - self.presence_ttl, str(preferred or ""),
+            )
+        except Exception as e:
+            logging.warning(f"Chat routing is unavailable: {e}")
+            return None
+        return int(employee_id) if employee_id is not None else None
+
+    async def add_load(self, employee_id, delta=1):
+        try:
+            await self.redis.hincrby(self.load_key, str(employee_id), delta)
+        except Exception as e:
+            logging.warning(f"Failed to update load of employee {employee_id}: {e}")
+
+    async def set_loads(self, loads):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self.load_key)
+            if loads:
+                pipe.hset(self.load_key, mapping={str(employee_id): count for employee_id, count in loads.items()})
+            await pipe.execute()
+
+    async def loads(self):
+        return {int(employee_id): int(count) for employee_id, count in (await self.redis.hgetall(self.load_key)).items()}
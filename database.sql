@@ -85,12 +85,15 @@
     `status` enum('available','occupied','maintenance') CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'available',
     `current_price_per_night` decimal(10,2) NOT NULL,
     PRIMARY KEY (`id`),
+    UNIQUE KEY `uq_rooms_room_number` (`room_number`),
     KEY `room_type_id` (`room_type_id`),
     CONSTRAINT `rooms_ibfk_1` FOREIGN KEY (`room_type_id`) REFERENCES `room_types` (`id`) ON DELETE RESTRICT ON UPDATE CASCADE
   ) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
   --
   -- Структура для таблицы `bookings`
+  -- Помесячные секции по check_in_date (см. migrations/005_partition_bookings_messages.sql);
+  -- у секционированных таблиц нет внешних ключей, целостность обеспечивает приложение
   --
   DROP TABLE IF EXISTS `bookings`;
   CREATE TABLE `bookings` (
@@ -103,14 +106,55 @@
     `check_out_date` datetime NOT NULL,
     `status` enum('confirmed','active','completed','cancelled') CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'confirmed',
     `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    PRIMARY KEY (`id`),
+    PRIMARY KEY (`id`, `check_in_date`),
     KEY `user_id` (`user_id`),
     KEY `room_id` (`room_id`),
     KEY `employee_id` (`employee_id`),
-    CONSTRAINT `bookings_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE RESTRICT ON UPDATE CASCADE,
-    CONSTRAINT `bookings_ibfk_2` FOREIGN KEY (`room_id`) REFERENCES `rooms` (`id`) ON DELETE RESTRICT ON UPDATE CASCADE,
-    CONSTRAINT `bookings_ibfk_3` FOREIGN KEY (`employee_id`) REFERENCES `employees` (`id`) ON DELETE RESTRICT ON UPDATE CASCADE
-  ) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    KEY `idx_bookings_check_in_date` (`check_in_date`),
+    KEY `idx_bookings_check_out_date` (`check_out_date`),
+    KEY `idx_bookings_created_at` (`created_at`),
+    KEY `idx_bookings_status` (`status`)
+  ) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+  PARTITION BY RANGE (UNIX_TIMESTAMP(`check_in_date`)) (
+    PARTITION p_old VALUES LESS THAN (1735671600),
+    PARTITION p202501 VALUES LESS THAN (1738350000),
+    PARTITION p202502 VALUES LESS THAN (1740769200),
+    PARTITION p202503 VALUES LESS THAN (1743447600),
+    PARTITION p202504 VALUES LESS THAN (1746039600),
+    PARTITION p202505 VALUES LESS THAN (1748718000),
+    PARTITION p202506 VALUES LESS THAN (1751310000),
+    PARTITION p202507 VALUES LESS THAN (1753988400),
+    PARTITION p202508 VALUES LESS THAN (1756666800),
+    PARTITION p202509 VALUES LESS THAN (1759258800),
+    PARTITION p202510 VALUES LESS THAN (1761937200),
+    PARTITION p202511 VALUES LESS THAN (1764529200),
+    PARTITION p202512 VALUES LESS THAN (1767207600),
+    PARTITION p202601 VALUES LESS THAN (1769886000),
+    PARTITION p202602 VALUES LESS THAN (1772305200),
+    PARTITION p202603 VALUES LESS THAN (1774983600),
+    PARTITION p202604 VALUES LESS THAN (1777575600),
+    PARTITION p202605 VALUES LESS THAN (1780254000),
+    PARTITION p202606 VALUES LESS THAN (1782846000),
+    PARTITION p202607 VALUES LESS THAN (1785524400),
+    PARTITION p202608 VALUES LESS THAN (1788202800),
+    PARTITION p202609 VALUES LESS THAN (1790794800),
+    PARTITION p202610 VALUES LESS THAN (1793473200),
+    PARTITION p202611 VALUES LESS THAN (1796065200),
+    PARTITION p202612 VALUES LESS THAN (1798743600),
+    PARTITION p202701 VALUES LESS THAN (1801422000),
+    PARTITION p202702 VALUES LESS THAN (1803841200),
+    PARTITION p202703 VALUES LESS THAN (1806519600),
+    PARTITION p202704 VALUES LESS THAN (1809111600),
+    PARTITION p202705 VALUES LESS THAN (1811790000),
+    PARTITION p202706 VALUES LESS THAN (1814382000),
+    PARTITION p202707 VALUES LESS THAN (1817060400),
+    PARTITION p202708 VALUES LESS THAN (1819738800),
+    PARTITION p202709 VALUES LESS THAN (1822330800),
+    PARTITION p202710 VALUES LESS THAN (1825009200),
+    PARTITION p202711 VALUES LESS THAN (1827601200),
+    PARTITION p202712 VALUES LESS THAN (1830279600),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+  );
 
   --
   -- Структура для таблицы `chats`
@@ -124,9 +168,9 @@
     `status` enum('open','claimed','closed') CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'open',
     `assigned_employee_id` bigint unsigned DEFAULT NULL,
     PRIMARY KEY (`id`),
+    UNIQUE KEY `uq_chats_booking_type` (`booking_id`,`type`),
     KEY `fk_chats_booking` (`booking_id`),
     KEY `fk_chats_assigned_employee` (`assigned_employee_id`),
-    CONSTRAINT `fk_chats_booking` FOREIGN KEY (`booking_id`) REFERENCES `bookings` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
     CONSTRAINT `fk_chats_assigned_employee` FOREIGN KEY (`assigned_employee_id`) REFERENCES `employees` (`id`) ON DELETE SET NULL
   ) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
@@ -143,14 +187,73 @@
     `sender_employee_id` bigint unsigned DEFAULT NULL,
     `content` text CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL,
     `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    PRIMARY KEY (`id`),
+    PRIMARY KEY (`id`, `created_at`),
     KEY `chat_id` (`chat_id`),
     KEY `sender_user_id` (`sender_user_id`),
-    KEY `sender_employee_id` (`sender_employee_id`),
-    CONSTRAINT `messages_ibfk_1` FOREIGN KEY (`chat_id`) REFERENCES `chats` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
-    CONSTRAINT `messages_ibfk_2` FOREIGN KEY (`sender_user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
-    CONSTRAINT `messages_ibfk_3` FOREIGN KEY (`sender_employee_id`) REFERENCES `employees` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
-  ) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    KEY `sender_employee_id` (`sender_employee_id`)
+  ) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+  PARTITION BY RANGE (UNIX_TIMESTAMP(`created_at`)) (
+    PARTITION p_old VALUES LESS THAN (1735671600),
+    PARTITION p202501 VALUES LESS THAN (1738350000),
+    PARTITION p202502 VALUES LESS THAN (1740769200),
+    PARTITION p202503 VALUES LESS THAN (1743447600),
+    PARTITION p202504 VALUES LESS THAN (1746039600),
+    PARTITION p202505 VALUES LESS THAN (1748718000),
+    PARTITION p202506 VALUES LESS THAN (1751310000),
+    PARTITION p202507 VALUES LESS THAN (1753988400),
+    PARTITION p202508 VALUES LESS THAN (1756666800),
+    PARTITION p202509 VALUES LESS THAN (1759258800),
+    PARTITION p202510 VALUES LESS THAN (1761937200),
+    PARTITION p202511 VALUES LESS THAN (1764529200),
+    PARTITION p202512 VALUES LESS THAN (1767207600),
+    PARTITION p202601 VALUES LESS THAN (1769886000),
+    PARTITION p202602 VALUES LESS THAN (1772305200),
+    PARTITION p202603 VALUES LESS THAN (1774983600),
+    PARTITION p202604 VALUES LESS THAN (1777575600),
+    PARTITION p202605 VALUES LESS THAN (1780254000),
+    PARTITION p202606 VALUES LESS THAN (1782846000),
+    PARTITION p202607 VALUES LESS THAN (1785524400),
+    PARTITION p202608 VALUES LESS THAN (1788202800),
+    PARTITION p202609 VALUES LESS THAN (1790794800),
+    PARTITION p202610 VALUES LESS THAN (1793473200),
+    PARTITION p202611 VALUES LESS THAN (1796065200),
+    PARTITION p202612 VALUES LESS THAN (1798743600),
+    PARTITION p202701 VALUES LESS THAN (1801422000),
+    PARTITION p202702 VALUES LESS THAN (1803841200),
+    PARTITION p202703 VALUES LESS THAN (1806519600),
+    PARTITION p202704 VALUES LESS THAN (1809111600),
+    PARTITION p202705 VALUES LESS THAN (1811790000),
+    PARTITION p202706 VALUES LESS THAN (1814382000),
+    PARTITION p202707 VALUES LESS THAN (1817060400),
+    PARTITION p202708 VALUES LESS THAN (1819738800),
+    PARTITION p202709 VALUES LESS THAN (1822330800),
+    PARTITION p202710 VALUES LESS THAN (1825009200),
+    PARTITION p202711 VALUES LESS THAN (1827601200),
+    PARTITION p202712 VALUES LESS THAN (1830279600),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+  );
+
+
+  --
+  -- Структура для таблицы `message_search`
+  -- (копия текста сообщений для FULLTEXT-поиска, заполняется триггерами на messages;
+  -- стоп-слова InnoDB на время создания индекса отключены)
+  --
+  DROP TABLE IF EXISTS `message_search`;
+  SET SESSION innodb_ft_enable_stopword = OFF;
+  CREATE TABLE `message_search` (
+    `message_id` bigint unsigned NOT NULL,
+    `chat_id` bigint unsigned NOT NULL,
+    `booking_id` bigint unsigned NOT NULL,
+    `sender_type` enum('user','employee','ai') CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL,
+    `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    `content` text CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL,
+    PRIMARY KEY (`message_id`),
+    KEY `idx_message_search_chat` (`chat_id`, `message_id`),
+    KEY `idx_message_search_booking` (`booking_id`, `message_id`),
+    FULLTEXT KEY `ft_message_search_content` (`content`)
+  ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+  SET SESSION innodb_ft_enable_stopword = ON;
 
 
   --
@@ -189,17 +292,41 @@
     `price` decimal(10,2) NOT NULL,
     `assigned_employee_id` bigint unsigned DEFAULT NULL,
     `status` enum('requested','in_progress','completed','cancelled') CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'requested',
+    `priority` enum('urgent','high','normal','low') CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'normal',
+    `sla_deadline` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    `escalated_at` timestamp NULL DEFAULT NULL,
     `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
     `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     PRIMARY KEY (`id`),
     KEY `service_id` (`service_id`),
     KEY `assigned_employee_id` (`assigned_employee_id`),
     KEY `idx_booking_id` (`booking_id`),
-    CONSTRAINT `fk_service_requests_booking` FOREIGN KEY (`booking_id`) REFERENCES `bookings` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+    KEY `idx_service_requests_created_at` (`created_at`),
+    KEY `idx_service_requests_queue` (`status`, `priority`, `created_at`),
+    KEY `idx_service_requests_sla` (`status`, `sla_deadline`),
     CONSTRAINT `service_requests_ibfk_2` FOREIGN KEY (`service_id`) REFERENCES `services` (`id`) ON DELETE RESTRICT ON UPDATE CASCADE,
     CONSTRAINT `service_requests_ibfk_3` FOREIGN KEY (`assigned_employee_id`) REFERENCES `employees` (`id`) ON DELETE SET NULL ON UPDATE CASCADE
   ) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+  --
+  -- Структура для таблицы `daily_room_type_stats` (агрегаты для аналитики)
+  --
+  DROP TABLE IF EXISTS `daily_room_type_stats`;
+  CREATE TABLE `daily_room_type_stats` (
+    `stat_date` date NOT NULL,
+    `room_type_id` int unsigned NOT NULL,
+    `rooms_total` int unsigned NOT NULL DEFAULT '0',
+    `occupied_room_nights` int unsigned NOT NULL DEFAULT '0',
+    `room_revenue` decimal(12,2) NOT NULL DEFAULT '0.00',
+    `bookings_created` int unsigned NOT NULL DEFAULT '0',
+    `cancellations` int unsigned NOT NULL DEFAULT '0',
+    `service_requests` int unsigned NOT NULL DEFAULT '0',
+    `service_revenue` decimal(12,2) NOT NULL DEFAULT '0.00',
+    `refreshed_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`stat_date`, `room_type_id`),
+    KEY `room_type_id` (`room_type_id`)
+  ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
   --
   -- Триггер для таблицы `employees`
   --
@@ -215,6 +342,19 @@
   END ;;
   DELIMITER ;
 
+  --
+  -- Триггеры для таблицы `messages` (поддерживают `message_search`)
+  --
+  DROP TRIGGER IF EXISTS `messages_search_insert`;
+  CREATE TRIGGER `messages_search_insert` AFTER INSERT ON `messages` FOR EACH ROW
+    INSERT INTO `message_search` (`message_id`, `chat_id`, `booking_id`, `sender_type`, `created_at`, `content`)
+    SELECT NEW.`id`, NEW.`chat_id`, `chats`.`booking_id`, NEW.`sender_type`, NEW.`created_at`, NEW.`content`
+    FROM `chats` WHERE `chats`.`id` = NEW.`chat_id`;
+
+  DROP TRIGGER IF EXISTS `messages_search_delete`;
+  CREATE TRIGGER `messages_search_delete` AFTER DELETE ON `messages` FOR EACH ROW
+    DELETE FROM `message_search` WHERE `message_id` = OLD.`id`;
+
 
   /*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;
   /*!40101 SET SQL_MODE=@OLD_SQL_MODE */;
@@ -0,0 +1,84 @@
+import asyncio
+import inspect
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import defaultdict
+
+import orjson
+
+
+# Внутренняя шина событий. Подписчики текущего воркера получают событие сразу
+# (в том же процессе), остальные воркеры и хосты — через Redis pub/sub.
+# Собственные события, вернувшиеся из Redis, повторно не доставляются.
+class EventBus:
+    def __init__(self, redis, channel="hotel:events"):
+        self.redis = redis
+        self.channel = channel
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers = defaultdict(list)
+        self._task = None
+
+    def subscribe(self, event_type, handler):
+        self._handlers[event_type].append(handler)
+
+        def unsubscribe():
+            if handler in self._handlers[event_type]:
+                self._handlers[event_type].remove(handler)
+
+        return unsubscribe
+
+    async def publish(self, event_type, payload):
+        event = {"type": event_type, "payload": payload, "origin": self.origin, "ts": time.time()}
+        await self._dispatch(event)
+
+        try:
+            await self.redis.publish(self.channel, orjson.dumps(event))
+        except Exception as e:
+            logging.warning(f"Failed to publish {event_type} to {self.channel}: {e}")
+
+    async def _dispatch(self, event):
+        for handler in list(self._handlers.get(event["type"], ())):
+            try:
+                result = handler(event)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logging.error(f"Event handler for {event['type']} failed: {e}", exc_info=True)
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    event = orjson.loads(message["data"])
+                    if event.get("origin") != self.origin:
+                        await self._dispatch(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Event bus listener on {self.channel} failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
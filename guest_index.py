@@ -0,0 +1,254 @@
+import asyncio
+import heapq
+import logging
+import re
+import sys
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Кириллица (русская и узбекская) в латиницу. Дальше FOLDS сводят разные записи одного
+# имени к одному ключу: Хуршид / Xurshid / Khurshid, Жасур / Jasur / Zhasur, Юрий / Yuriy / Iurii
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo", "ж": "j", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+    "ў": "o", "қ": "q", "ғ": "g", "ҳ": "h",
+}
+FOLDS = (("shch", "sh"), ("sch", "sh"), ("kh", "h"), ("zh", "j"), ("dj", "j"), ("q", "k"), ("w", "v"), ("ph", "f"), ("y", "i"))
+APOSTROPHES = str.maketrans("", "", "'`ʻʼ‘’")
+WORD = re.compile(r"[^\W\d_]+")
+DIGITS = re.compile(r"\d+")
+REPEATS = re.compile(r"(.)\1+")
+VOWELS = "aeiou"
+END = "\uffff"
+
+
+def transliterate(text):
+    text = unicodedata.normalize("NFKC", text).casefold().translate(APOSTROPHES)
+    return "".join(CYRILLIC_TO_LATIN.get(ch, ch) for ch in text)
+
+
+# Ключи одного слова. Латинская x — это «х» в узбекской латинице и «кс» в английской,
+# поэтому для слов с x ключей два
+def word_keys(word):
+    for source, target in FOLDS:
+        word = word.replace(source, target)
+    if len(word) > 1 and word[0] == "i" and word[1] in VOWELS:
+        word = word[1:]
+    word = REPEATS.sub(r"\1", word)
+    if "x" in word:
+        return {word.replace("x", "h"), REPEATS.sub(r"\1", word.replace("x", "ks"))}
+    return {word}
+
+
+def name_keys(*names):
+    keys = set()
+    for name in names:
+        for word in WORD.findall(transliterate(name or "")):
+            keys.update(word_keys(word))
+    return keys
+
+
+def phone_digits(phone_number):
+    return "".join(DIGITS.findall(phone_number or ""))
+
+
+class _SortedPairs:
+    def __init__(self, pairs=()):
+        pairs = sorted(pairs)
+        self.keys = [key for key, _ in pairs]
+        self.ids = array("I", (user_id for _, user_id in pairs))
+
+    def add(self, key, user_id):
+        i = bisect_right(self.keys, key)
+        self.keys.insert(i, key)
+        self.ids.insert(i, user_id)
+
+    def discard(self, key, user_id):
+        i = bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i] == key:
+            if self.ids[i] == user_id:
+                del self.keys[i]
+                del self.ids[i]
+                return
+            i += 1
+
+    def prefix_range(self, prefix):
+        return bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + END)
+
+
+# Цифры телефонов всех гостей одной строкой через разделитель: поиск подстроки — это
+# str.find по строке в несколько мегабайт, позиция переводится в гостя двоичным поиском
+# по смещениям. Гости, добавленные после построения, лежат в короткой строке tail
+class _PhoneDigits:
+    def __init__(self, phones=()):
+        self.offsets = array("I")
+        self.ids = array("I")
+        parts, offset = [], 0
+        for user_id, digits in phones:
+            self.offsets.append(offset)
+            self.ids.append(user_id)
+            parts.append(digits)
+            offset += len(digits) + 1
+        self.blob = "|".join(parts)
+        self.tail = []
+
+    def add(self, user_id, digits):
+        self.tail.append((user_id, digits))
+
+    def find(self, digits, limit):
+        found = []
+        position = self.blob.find(digits)
+        while position != -1 and len(found) < limit:
+            i = bisect_right(self.offsets, position) - 1
+            found.append(self.ids[i])
+            position = self.blob.find(digits, self.offsets[i + 1]) if i + 1 < len(self.offsets) else -1
+        found.extend(user_id for user_id, tail_digits in self.tail if digits in tail_digits)
+        return found
+
+
+class _Snapshot:
+    def __init__(self, rows=()):
+        self.docs = {}
+        names, phones = [], []
+        for user_id, first_name, last_name, patronymic, phone_number in rows:
+            keys = tuple(sys.intern(key) for key in name_keys(first_name, last_name, patronymic))
+            digits = phone_digits(phone_number)
+            self.docs[user_id] = (keys, digits)
+            names.extend((key, user_id) for key in keys)
+            if digits:
+                phones.append((user_id, digits))
+        self.names = _SortedPairs(names)
+        self.phones = _PhoneDigits(phones)
+
+
+# Поиск гостей в памяти воркера: отсортированный массив ключей имён (транслитерация
+# ru/uz/en, префиксы ищутся двоичным поиском) и строка цифр телефонов (любая подстрока
+# номера). Индекс строится из users при первом поиске и перестраивается в фоне раз
+# в ttl секунд; новые гости добавляются по событию guest_updated
+class GuestIndex:
+    def __init__(self, ttl=21600, country_code="998", scan_limit=2000):
+        self.ttl = ttl
+        self.country_code = country_code
+        self.scan_limit = scan_limit
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._reloading = None
+        self._pending = None
+
+    @property
+    def size(self):
+        return len(self._snapshot.docs) if self._snapshot else 0
+
+    async def _load(self, load_rows):
+        self._pending = []
+        try:
+            started = time.monotonic()
+            rows = await load_rows()
+            snapshot = await asyncio.to_thread(_Snapshot, rows)
+            for row in self._pending:
+                self._upsert(snapshot, row)
+            self._snapshot = snapshot
+            self._loaded_at = time.monotonic()
+            logging.info(f"Guest index: {len(snapshot.docs)} guests loaded in {time.monotonic() - started:.2f}s")
+        finally:
+            self._pending = None
+
+    async def ensure_loaded(self, load_rows):
+        if self._snapshot is None:
+            async with self._lock:
+                if self._snapshot is None:
+                    await self._load(load_rows)
+        elif time.monotonic() - self._loaded_at > self.ttl and self._reloading is None:
+            self._reloading = asyncio.create_task(self._reload(load_rows))
+
+    async def _reload(self, load_rows):
+        try:
+            async with self._lock:
+                await self._load(load_rows)
+        except Exception as e:
+            logging.warning(f"Guest index reload failed: {e}")
+        finally:
+            self._reloading = None
+
+    # Старый телефон из строки цифр не удаляется: найденные по нему гости отсеиваются проверкой docs
+    def _upsert(self, snapshot, row):
+        user_id, first_name, last_name, patronymic, phone_number = row
+        old = snapshot.docs.get(user_id)
+        for key in old[0] if old else ():
+            snapshot.names.discard(key, user_id)
+        keys = tuple(sys.intern(key) for key in name_keys(first_name, last_name, patronymic))
+        digits = phone_digits(phone_number)
+        snapshot.docs[user_id] = (keys, digits)
+        for key in keys:
+            snapshot.names.add(key, user_id)
+        if digits and (not old or old[1] != digits):
+            snapshot.phones.add(user_id, digits)
+
+    # row: (id, first_name, last_name, patronymic, phone_number)
+    def upsert(self, row):
+        if self._pending is not None:
+            self._pending.append(row)
+        if self._snapshot is not None:
+            self._upsert(self._snapshot, row)
+
+    def _score_phone(self, digits, value):
+        if digits == value or digits == self.country_code + value:
+            return 2
+        return 1 if value in digits else 0
+
+    # Кандидатов даёт самое узкое слово запроса (цифры — только если слов нет), остальные
+    # условия проверяются по ключам кандидата. Все цифры запроса — один номер: «+998 90 123 45 67»
+    # ищется как 998901234567. Точное совпадение слова или всего номера ценится выше
+    # префикса, при равенстве выше новые гости
+    def search(self, query, limit=20):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+        words = []
+        for word in WORD.findall(transliterate(query)):
+            keys = word_keys(word)
+            words.append((keys, [snapshot.names.prefix_range(key) for key in keys]))
+        query_digits = phone_digits(query)
+        numbers = [query_digits] if len(query_digits) >= 2 else []
+
+        scores = {}
+        if words:
+            words.sort(key=lambda word: sum(hi - lo for lo, hi in word[1]))
+            (driver_keys, ranges), words = words[0], words[1:]
+            for lo, hi in ranges:
+                hi = min(hi, lo + self.scan_limit)
+                for key, user_id in zip(snapshot.names.keys[lo:hi], snapshot.names.ids[lo:hi]):
+                    scores[user_id] = max(scores.get(user_id, 0), 2 if key in driver_keys else 1)
+        elif numbers:
+            driver, numbers = numbers[0], numbers[1:]
+            for user_id in snapshot.phones.find(driver, self.scan_limit):
+                score = self._score_phone(snapshot.docs[user_id][1], driver)
+                if score:
+                    scores[user_id] = score
+        else:
+            return []
+
+        ranked = []
+        for user_id, score in scores.items():
+            keys, digits = snapshot.docs[user_id]
+            for alternatives, _ in words:
+                if any(key in alternatives for key in keys):
+                    score += 2
+                elif any(key.startswith(prefix) for key in keys for prefix in alternatives):
+                    score += 1
+                else:
+                    break
+            else:
+                for value in numbers:
+                    phone_score = self._score_phone(digits, value)
+                    if not phone_score:
+                        break
+                    score += phone_score
+                else:
+                    ranked.append((-score, -user_id))
+        return [-user_id for _, user_id in heapq.nsmallest(limit, ranked)]
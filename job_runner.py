@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+
+# Продление и освобождение аренды выполняются только владельцем токена
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+# Выбор лидера через аренду в Redis (SET NX PX + продление Lua-скриптом).
+# Лидер продлевает аренду каждые lease/3 секунд, остальные воркеры с той же
+# периодичностью пытаются её захватить — при падении лидера задачи
+# подхватывает другой воркер не позже чем через lease секунд.
+class LeaderElection:
+    def __init__(self, redis, key, lease_seconds=15):
+        self.redis = redis
+        self.key = key
+        self.lease_ms = int(lease_seconds * 1000)
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._lease_valid_until = 0.0
+        self._task = None
+
+    @property
+    def has_lease(self):
+        # Локальный срок считается от момента отправки запроса, поэтому он
+        # никогда не переживает аренду в Redis
+        return self.is_leader and time.monotonic() < self._lease_valid_until
+
+    async def _acquire_or_renew(self):
+        requested_at = time.monotonic()
+        try:
+            if self.is_leader:
+                acquired = bool(await self.redis.eval(RENEW_SCRIPT, 1, self.key, self.token, self.lease_ms))
+            else:
+                acquired = bool(await self.redis.set(self.key, self.token, nx=True, px=self.lease_ms))
+        except Exception as e:
+            # Redis недоступен: лидер продолжает работать до истечения локальной аренды
+            logging.warning(f"Leader election for {self.key} failed: {e}")
+            if self.is_leader and not self.has_lease:
+                self.is_leader = False
+                logging.warning(f"Lease {self.key} expired, {self.token} stepped down")
+            return
+
+        if acquired:
+            if not self.is_leader:
+                logging.info(f"{self.token} became scheduler leader ({self.key})")
+            self.is_leader = True
+            self._lease_valid_until = requested_at + self.lease_ms / 1000
+        elif self.is_leader:
+            self.is_leader = False
+            logging.warning(f"{self.token} lost scheduler leadership ({self.key})")
+
+    async def _loop(self):
+        interval = self.lease_ms / 3000
+        while True:
+            await self._acquire_or_renew()
+            await asyncio.sleep(interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self.is_leader:
+            self.is_leader = False
+            try:
+                await self.redis.eval(RELEASE_SCRIPT, 1, self.key, self.token)
+            except Exception as e:
+                logging.warning(f"Failed to release lease {self.key}: {e}")
+
+
+class JobMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = None
+        self.last_started_at = None
+        self.last_error = None
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_ms": self.last_ms,
+            "avg_ms": round(self.total_ms / self.runs, 3) if self.runs else None,
+            "max_ms": self.max_ms if self.runs else None,
+            "last_started_at": self.last_started_at,
+            "last_error": self.last_error,
+        }
+
+
+# Обёртка над AsyncIOScheduler: задачи выполняются только на воркере-лидере
+# и собирают метрики времени выполнения. Планировщик создаёт scheduler_factory
+# в start(): воркер, где задачи не запускаются, не импортирует APScheduler
+class JobRunner:
+    def __init__(self, scheduler_factory, election=None):
+        self.scheduler_factory = scheduler_factory
+        self.scheduler = None
+        self.election = election
+        self.metrics = {}
+        self._jobs = []
+
+    def add_job(self, func, trigger, name=None, **trigger_args):
+        name = name or func.__name__
+        self.metrics[name] = JobMetrics(name)
+        self._jobs.append((name, func, trigger, trigger_args))
+        if self.scheduler:
+            self._schedule(name, func, trigger, trigger_args)
+
+    def _schedule(self, name, func, trigger, trigger_args):
+        self.scheduler.add_job(
+            self._run, trigger, args=[name, func], id=name, name=name,
+            max_instances=1, coalesce=True, replace_existing=True, **trigger_args
+        )
+
+    async def _run(self, name, func):
+        metrics = self.metrics[name]
+        if self.election and not self.election.has_lease:
+            metrics.skipped += 1
+            return
+
+        metrics.last_started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        try:
+            await func()
+            metrics.last_error = None
+        except Exception as e:
+            metrics.failures += 1
+            metrics.last_error = str(e)
+            logging.error(f"Job {name} failed: {e}", exc_info=True)
+        finally:
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+            metrics.runs += 1
+            metrics.total_ms += elapsed_ms
+            metrics.last_ms = elapsed_ms
+            metrics.max_ms = max(metrics.max_ms, elapsed_ms)
+
+    def stats(self):
+        return {
+            "is_leader": self.election.has_lease if self.election else True,
+            "worker": self.election.token if self.election else None,
+            "jobs": [metrics.as_dict() for metrics in self.metrics.values()],
+        }
+
+    def start(self):
+        if self.scheduler is None:
+            self.scheduler = self.scheduler_factory()
+            for name, func, trigger, trigger_args in self._jobs:
+                self._schedule(name, func, trigger, trigger_args)
+        if self.election:
+            self.election.start()
+        self.scheduler.start()
+
+    async def shutdown(self):
+        if self.scheduler is None:
+            return
+        self.scheduler.shutdown()
+        if self.election:
+            await self.election.stop()
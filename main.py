@@ -1,51 +1,101 @@
 import os
 import enum
 from contextlib import asynccontextmanager
-from datetime import timedelta, datetime, timezone
-from typing import List, Optional
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from datetime import timedelta, datetime, timezone, date
+from functools import lru_cache
+from inspect import isclass
+from typing import List, Optional, Union, get_args, get_origin
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, ValidationError
 from sqlalchemy import (Column, Integer, String, Enum,
                         DECIMAL, TIMESTAMP, Text, ForeignKey,
-                        UniqueConstraint, func, or_, select, text)
+                        UniqueConstraint, func, or_, and_, select, text, update,
+                        Date, delete, case)
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, relationship, DeclarativeBase, selectinload, aliased
-from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert, match as mysql_match
 from dotenv import load_dotenv
 from jose import JWTError, jwt
 from sqlalchemy.future import select
 import string
 import random
+import re
 from passlib.context import CryptContext
-import google.generativeai as genai
 import logging
 from logging.config import dictConfig
 from fastapi.concurrency import run_in_threadpool
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from job_runner import JobRunner, LeaderElection
+from event_bus import EventBus
+from read_replicas import ReplicaRouter
+from ai_providers import AIUnavailableError, GuardedAIClient, create_ai_provider
+from ai_cache import AIResponseCache
+from chat_routing import ReceptionRouter
+from archive_store import ArchiveStore
+from guest_index import GuestIndex
+from partitions import MonthlyPartitions
+from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
+import asyncio
 import time
 from starlette.middleware.base import BaseHTTPMiddleware
 from zoneinfo import ZoneInfo
+import orjson
+import zlib
+import hashlib
+import csv
+from decimal import Decimal
 
 load_dotenv()
 
-scheduler = AsyncIOScheduler(timezone=ZoneInfo("Asia/Tashkent"))
-
 DATABASE_URL = os.getenv("DATABASE")
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 TOKEN_EXPIRE_MINUTES = int(os.getenv("TOKEN_EXPIRE"))
-genai.configure(api_key=os.getenv("API_KEY"))
-model = genai.GenerativeModel('gemini-1.5-flash')
+# Быстрый путь сериализации больших списков (orjson без повторной валидации)
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "0") == "1"
+# Модель для AI-чата: AI_PROVIDER=gemini (по умолчанию) или local — локальная заглушка.
+# Вызовы идут через ограничитель параллельности, дедлайны и автомат размыкания:
+# при деградации модели гость сразу получает текст-заглушку, остальной API не ждёт.
+# AI_ENABLED=0 — провайдер не создаётся, AI-чат отвечает заглушкой
+AI_ENABLED = os.getenv("AI_ENABLED", "1") == "1"
+# SCHEDULER_ENABLED=0 — воркер не запускает периодические задачи и не импортирует APScheduler
+# (например, отдельные поды только для API, когда задачи выполняет другой деплой)
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+ai_provider = GuardedAIClient(
+    create_ai_provider() if AI_ENABLED else None,
+    max_in_flight=int(os.getenv("AI_MAX_IN_FLIGHT", "20")),
+    queue_timeout=float(os.getenv("AI_QUEUE_TIMEOUT", "1")),
+    timeout=float(os.getenv("AI_TIMEOUT", "15")),
+    stream_timeout=float(os.getenv("AI_STREAM_TIMEOUT", "60")),
+    failure_threshold=int(os.getenv("AI_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("AI_BREAKER_RESET", "30")),
+)
+
+# Клиент модели готовится в фоне и не задерживает приём запросов; при ошибке
+# провайдер попробует ещё раз при первом вызове
+async def warm_up_ai():
+    try:
+        await run_in_threadpool(ai_provider.warm_up)
+    except Exception as e:
+        logging.warning(f"AI provider warm-up failed: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Приложение запускается...")
-    scheduler.start()
+    event_bus.start()
+    if SCHEDULER_ENABLED:
+        job_runner.start()
+    replica_router.start()
+    ai_warm_up = asyncio.create_task(warm_up_ai()) if AI_ENABLED else None
     yield
+    if ai_warm_up and not ai_warm_up.done():
+        ai_warm_up.cancel()
     print("Приложение останавливается...")
-    scheduler.shutdown()
+    await job_runner.shutdown()
+    await event_bus.stop()
+    await replica_router.stop()
     await engine.dispose()
 
 LOGGING_CONFIG = {
@@ -74,7 +124,7 @@ dictConfig(LOGGING_CONFIG)
 
 LOG_FILE_PATH = "/var/log/uvicorn/access.log"
 
-app = FastAPI(title="Hotel Service API", docs_url=None, redoc_url=None)
+app = FastAPI(title="Hotel Service API", docs_url=None, redoc_url=None, lifespan=lifespan)
 
 class Fail2BanLoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
@@ -111,10 +161,24 @@ async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit
 oauth2 = OAuth2PasswordBearer(tokenUrl="auth/verify-code")
 crypt = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Реплики для тяжёлых чтений (опционально): REPLICA_DATABASES — async URL через запятую
+replica_router = ReplicaRouter(
+    [url.strip() for url in os.getenv("REPLICA_DATABASES", "").split(",") if url.strip()],
+    max_lag=float(os.getenv("REPLICA_MAX_LAG", "2")),
+    check_interval=float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))
+)
+
 async def get_db():
     async with async_session_maker() as session:
         yield session
 
+# Сессия только для чтения списков и отчётов: реплика с допустимым отставанием,
+# иначе основная БД. Записи и чтение сразу после записи идут через get_db
+async def get_read_db():
+    session_maker = replica_router.pick() or async_session_maker
+    async with session_maker() as session:
+        yield session
+
 # JWT токен
 def access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -230,6 +294,35 @@ class RoomUpdate(BaseModel):
     current_price_per_night: Optional[float] = None
     status: Optional[RoomStatusEnum] = None
 
+# Строка импорта номеров (CSV или NDJSON); ключ — room_number
+class RoomImportRow(BaseModel):
+    room_number: str = Field(min_length=1, max_length=10)
+    room_type_id: int
+    current_price_per_night: Decimal = Field(gt=0, max_digits=10, decimal_places=2)
+    status: Optional[RoomStatusEnum] = None
+
+class RoomImportError(BaseModel):
+    line: int
+    detail: str
+
+class RoomImportResult(BaseModel):
+    rows: int
+    batches: int
+    failed: int
+    dry_run: bool
+    errors: List[RoomImportError]
+
+# Массовая смена статуса: хотя бы один фильтр обязателен
+class RoomBulkStatusUpdate(BaseModel):
+    status: RoomStatusEnum
+    room_number_prefix: Optional[str] = None
+    room_type_id: Optional[int] = None
+    current_status: Optional[RoomStatusEnum] = None
+    room_ids: Optional[List[int]] = None
+
+class RoomBulkStatusResult(BaseModel):
+    matched: int
+
 class BookingStatusEnum(str, enum.Enum):
     confirmed = "confirmed"
     active = "active"
@@ -302,6 +395,65 @@ class BookingCreate(BaseModel):
     check_in_date: datetime
     check_out_date: datetime
 
+# Групповое бронирование: список гостей с конкретным номером или типом номера,
+# либо сокращение "count номеров типа room_type_id на гостя user_id"
+class BulkBookingItem(BaseModel):
+    user_id: int
+    room_id: Optional[int] = None
+    room_type_id: Optional[int] = None
+
+class BulkBookingCreate(BaseModel):
+    check_in_date: datetime
+    check_out_date: datetime
+    items: List[BulkBookingItem] = []
+    user_id: Optional[int] = None
+    room_type_id: Optional[int] = None
+    count: Optional[int] = Field(None, ge=1)
+    all_or_nothing: bool = True
+
+class BulkBookingItemResult(BaseModel):
+    index: int
+    user_id: int
+    room_id: Optional[int] = None
+    room_number: Optional[str] = None
+    booking_id: Optional[int] = None
+    status: str
+    detail: Optional[str] = None
+
+class BulkBookingResponse(BaseModel):
+    booked: int
+    failed: int
+    items: List[BulkBookingItemResult]
+
+# Счёт гостя: проживание по цене брони плюс выполненные заявки на услуги
+class FolioServiceLine(BaseModel):
+    service_id: int
+    name: Optional[str] = None
+    quantity: int
+    amount: float
+
+class FolioSchema(BaseModel):
+    booking_id: int
+    user_id: int
+    room_id: int
+    room_number: str
+    status: BookingStatusEnum
+    check_in_date: datetime
+    check_out_date: datetime
+    nights: int
+    price_per_night: float
+    room_total: float
+    services: List[FolioServiceLine]
+    services_total: float
+    total: float
+
+class BookingIdsRequest(BaseModel):
+    booking_ids: List[int]
+
+class BatchCheckoutResponse(BaseModel):
+    checked_out: List[FolioSchema]
+    skipped: List[int]
+
 class ServiceStatusEnum(str, enum.Enum):
     available = "available"
     archived = "archived"
@@ -312,6 +464,13 @@ class ServiceRequestStatusEnum(str, enum.Enum):
     completed = "completed"
     cancelled = "cancelled"
 
+# Порядок значений совпадает с ENUM в БД: MySQL сортирует ENUM по порядку объявления
+class ServiceRequestPriorityEnum(str, enum.Enum):
+    urgent = "urgent"
+    high = "high"
+    normal = "normal"
+    low = "low"
+
 class ServiceTranslationSchema(BaseModel):
     language_code: LanguageCodeEnum
     name: str
@@ -345,11 +504,18 @@ class ServiceRequestSchema(BaseModel):
 class ServiceRequestStatusUpdate(BaseModel):
     status: ServiceRequestStatusEnum
 
+class ServiceRequestPriorityUpdate(BaseModel):
+    priority: ServiceRequestPriorityEnum
+
 class ServiceRequestForEmployeeSchema(BaseModel):
     id: int
     status: ServiceRequestStatusEnum
+    priority: ServiceRequestPriorityEnum
     price: float
     created_at: datetime
+    sla_deadline: datetime
+    escalated_at: Optional[datetime] = None
+    assigned_employee_id: Optional[int] = None
     service: ServiceSchema
     booking: BookingSchema
 
@@ -391,6 +557,9 @@ class ChatSchema(BaseModel):
     type: ChatTypeEnum
     booking: BookingSchema
     messages: List[MessageSchema]
+    # Курсор для подгрузки более старой истории: GET .../messages?before_id=<before_id>
+    has_more: bool = False
+    before_id: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -406,6 +575,22 @@ class ChatClaimResponse(BaseModel):
     status: ChatStatusEnum
     assigned_employee_id: int
 
+class MessageSearchResultSchema(BaseModel):
+    message_id: int
+    chat_id: int
+    booking_id: int
+    sender_type: SenderTypeEnum
+    created_at: datetime
+    snippet: str
+    # Найденные слова в snippet: пары [начало, конец) в символах
+    highlights: List[List[int]]
+
+class MessageSearchPageSchema(BaseModel):
+    results: List[MessageSearchResultSchema]
+    # Курсор следующей (более старой) страницы: GET /reception/messages/search?before_id=<before_id>
+    has_more: bool = False
+    before_id: Optional[int] = None
+
 class LastMessageSchema(BaseModel):
     content: str
     created_at: datetime
@@ -444,6 +629,125 @@ class RoomForDashboardSchema(BaseModel):
     class Config:
         from_attributes = True
 
+class JobMetricsSchema(BaseModel):
+    name: str
+    runs: int
+    failures: int
+    skipped: int
+    last_ms: Optional[float] = None
+    avg_ms: Optional[float] = None
+    max_ms: Optional[float] = None
+    last_started_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+
+class SchedulerStatusSchema(BaseModel):
+    is_leader: bool
+    worker: Optional[str] = None
+    jobs: List[JobMetricsSchema]
+
+class AnalyticsGroupByEnum(str, enum.Enum):
+    day = "day"
+    month = "month"
+    total = "total"
+
+class RoomTypeStatsSchema(BaseModel):
+    period: str
+    room_type_id: Optional[int] = None
+    room_nights_available: int
+    occupied_room_nights: int
+    occupancy: float
+    room_revenue: float
+    adr: Optional[float] = None
+    revpar: float
+    service_revenue: float
+    service_requests: int
+    bookings_created: int
+    cancellations: int
+
+class AnalyticsRefreshRequest(BaseModel):
+    date_from: date
+    date_to: date
+
+class AnalyticsRefreshResult(BaseModel):
+    date_from: date
+    date_to: date
+    days: int
+    elapsed_ms: float
+
+class ReplicaStatusSchema(BaseModel):
+    host: Optional[str] = None
+    lag: Optional[int] = None
+    usable: bool
+    last_error: Optional[str] = None
+
+class ReplicaRouterStatusSchema(BaseModel):
+    max_lag: float
+    primary_fallbacks: int
+    replicas: List[ReplicaStatusSchema]
+
+class AICacheStatsSchema(BaseModel):
+    memory_hits: int
+    redis_hits: int
+    misses: int
+    bypassed: int
+    stores: int
+    evictions: int
+    entries: int
+    hit_rate: float
+
+class ReceptionPresenceUpdate(BaseModel):
+    online: bool
+
+class ReceptionPresenceResult(BaseModel):
+    employee_id: int
+    online: bool
+    reassigned_chats: int
+
+class ChatRoutingEmployeeSchema(BaseModel):
+    employee_id: int
+    online: bool
+    last_seen: Optional[datetime] = None
+    load: int
+
+class ChatRoutingStatusSchema(BaseModel):
+    enabled: bool
+    employees: List[ChatRoutingEmployeeSchema]
+
+class AIGuardStatsSchema(BaseModel):
+    state: str
+    in_flight: int
+    max_in_flight: int
+    consecutive_failures: int
+    calls: int
+    errors: int
+    timeouts: int
+    rejected: int
+    shed: int
+    opened: int
+
+class AIStatsSchema(BaseModel):
+    provider: str
+    cache_enabled: bool
+    cache: AICacheStatsSchema
+    guard: AIGuardStatsSchema
+
+class ArchivedChatSchema(BaseModel):
+    id: int
+    booking_id: int
+    type: ChatTypeEnum
+    status: ChatStatusEnum
+    assigned_employee_id: Optional[int] = None
+    created_at: datetime
+    archived_at: datetime
+    messages: List[MessageSchema]
+
+class ArchiveStatsSchema(BaseModel):
+    enabled: bool
+    after_days: int
+    segments: int
+    chats: int
+    bytes: int
+
 class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True)    
@@ -497,6 +801,7 @@ class RoomTypeTranslation(Base):
 
 class Room(Base):
     __tablename__ = 'rooms'
+    __table_args__ = (UniqueConstraint('room_number', name='uq_rooms_room_number'),)
     id = Column(Integer, primary_key=True)
     room_number = Column(String(10), nullable=False)
     room_type_id = Column(Integer, ForeignKey('room_types.id'), nullable=False)
@@ -506,6 +811,7 @@ class Room(Base):
     room_type = relationship("RoomType", back_populates="rooms")
     bookings = relationship("Booking", back_populates="room")
 
+# В БД первичный ключ (id, check_in_date): таблица секционирована по месяцам заезда
 class Booking(Base):
     __tablename__ = 'bookings'
     id = Column(Integer, primary_key=True)
@@ -541,6 +847,20 @@ class ServiceTranslation(Base):
     
     service = relationship("Service", back_populates="translations")
 
+# Дневные агрегаты по типу номера; заполняются задачами пересчёта, отчёты читают только их
+class DailyRoomTypeStats(Base):
+    __tablename__ = 'daily_room_type_stats'
+    stat_date = Column(Date, primary_key=True)
+    room_type_id = Column(Integer, ForeignKey('room_types.id'), primary_key=True)
+    rooms_total = Column(Integer, nullable=False, default=0)
+    occupied_room_nights = Column(Integer, nullable=False, default=0)
+    room_revenue = Column(DECIMAL(12, 2), nullable=False, default=0)
+    bookings_created = Column(Integer, nullable=False, default=0)
+    cancellations = Column(Integer, nullable=False, default=0)
+    service_requests = Column(Integer, nullable=False, default=0)
+    service_revenue = Column(DECIMAL(12, 2), nullable=False, default=0)
+    refreshed_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+
 class ServiceRequest(Base):
     __tablename__ = 'service_requests'
     id = Column(Integer, primary_key=True)
@@ -549,6 +869,9 @@ class ServiceRequest(Base):
     price = Column(DECIMAL(10, 2), nullable=False)
     assigned_employee_id = Column(Integer, ForeignKey('employees.id'), nullable=True)
     status = Column(Enum(ServiceRequestStatusEnum), nullable=False, default=ServiceRequestStatusEnum.requested)
+    priority = Column(Enum(ServiceRequestPriorityEnum), nullable=False, default=ServiceRequestPriorityEnum.normal)
+    sla_deadline = Column(TIMESTAMP, nullable=False, server_default=func.now())
+    escalated_at = Column(TIMESTAMP, nullable=True)
     created_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
     updated_at = Column(TIMESTAMP, nullable=False, server_default=func.now(), onupdate=func.now())
     
@@ -559,6 +882,7 @@ class ServiceRequest(Base):
 
 class Chat(Base):
     __tablename__ = 'chats'
+    __table_args__ = (UniqueConstraint('booking_id', 'type', name='uq_chats_booking_type'),)
     id = Column(Integer, primary_key=True)
     # user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
     booking_id = Column(Integer, ForeignKey('bookings.id', ondelete="CASCADE"), nullable=False)
@@ -590,6 +914,7 @@ class ChatForReceptionSchema(BaseModel):
     class Config:
         from_attributes = True
 
+# В БД первичный ключ (id, created_at): таблица секционирована по месяцам отправки
 class Message(Base):
     __tablename__ = 'messages'
     id = Column(Integer, primary_key=True)
@@ -604,6 +929,17 @@ class Message(Base):
     sender_user = relationship("User")
     sender_employee = relationship("Employee")
 
+# Копия текста сообщений с FULLTEXT-индексом (migrations/006): у секционированной messages
+# его быть не может. Заполняется и чистится триггерами БД на messages, приложение только читает
+class MessageSearch(Base):
+    __tablename__ = 'message_search'
+    message_id = Column(Integer, primary_key=True)
+    chat_id = Column(Integer, nullable=False, index=True)
+    booking_id = Column(Integer, nullable=False, index=True)
+    sender_type = Column(Enum(SenderTypeEnum), nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+    content = Column(Text, nullable=False)
+
 class UserSchema(BaseModel):
     id: int
     first_name: str
@@ -619,6 +955,440 @@ class UserBookingResponse(BaseModel):
     booking: Optional[BookingSchema] = None
     generated_password: Optional[str] = None
 
+# Предкомпилированные сериализаторы: план обхода полей строится один раз на схему,
+# строки ORM (или dict) превращаются в dict и сразу кодируются orjson в байты
+_PLAIN, _FLOAT, _MODEL, _LIST = range(4)
+
+def _unwrap_optional(annotation):
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+def _is_schema(annotation):
+    return isclass(annotation) and issubclass(annotation, BaseModel)
+
+@lru_cache(maxsize=None)
+def compile_serializer(schema):
+    plan = []
+    for name, field in schema.model_fields.items():
+        default = None if field.is_required() else field.default
+        annotation = _unwrap_optional(field.annotation)
+
+        if get_origin(annotation) is list and _is_schema(get_args(annotation)[0]):
+            plan.append((name, default, _LIST, compile_serializer(get_args(annotation)[0])))
+        elif _is_schema(annotation):
+            plan.append((name, default, _MODEL, compile_serializer(annotation)))
+        elif annotation is float:
+            plan.append((name, default, _FLOAT, None))
+        else:
+            plan.append((name, default, _PLAIN, None))
+
+    def serialize(obj):
+        is_dict = isinstance(obj, dict)
+        data = {}
+        for name, default, kind, nested in plan:
+            value = obj.get(name, default) if is_dict else getattr(obj, name, default)
+            if value is not None:
+                if kind == _FLOAT:
+                    value = float(value)
+                elif kind == _MODEL:
+                    value = nested(value)
+                elif kind == _LIST:
+                    value = [nested(item) for item in value]
+            data[name] = value
+        return data
+
+    return serialize
+
+def fast_json_response(payload, headers=None):
+    return Response(content=orjson.dumps(payload), media_type="application/json", headers=headers)
+
+def fast_json_list(schema, rows, headers=None):
+    serialize = compile_serializer(schema)
+    return fast_json_response([serialize(row) for row in rows], headers=headers)
+
+# Условный GET: слабый ETag собирается из версий ресурса. При совпадении с
+# If-None-Match возвращается 304 до выполнения тяжёлых запросов. Если какая-то
+# версия неизвестна (Redis недоступен), ETag не выдаётся
+def conditional_get(request: Request, response: Response, *parts):
+    if any(part is None for part in parts):
+        return None
+
+    etag = 'W/"' + "-".join(str(part) for part in parts) + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {candidate.strip() for candidate in if_none_match.split(",")}
+        if "*" in candidates or etag in candidates or etag[2:] in candidates:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return None
+
+# Отрисовка истории сообщений: отправители берутся из кэша сотрудников и известных
+# пользователей, поэтому страница сообщений читается одним запросом без JOIN-ов
+AI_SENDER = {"id": 0, "first_name": "AI", "last_name": "Assistant", "patronymic": None, "type": "ai"}
+
+MESSAGE_COLUMNS = (
+    Message.id, Message.content, Message.created_at,
+    Message.sender_type, Message.sender_user_id, Message.sender_employee_id,
+)
+
+def sender_info_from(person, sender_type):
+    return {
+        "id": person.id,
+        "first_name": person.first_name,
+        "last_name": person.last_name,
+        "patronymic": person.patronymic,
+        "type": sender_type,
+    }
+
+class EmployeeDirectory:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._senders = None
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        self._senders = None
+
+    async def get_senders(self, db, employee_ids=()):
+        expired = time.monotonic() - self._loaded_at > self.ttl
+        missing = self._senders is not None and any(eid not in self._senders for eid in employee_ids)
+
+        if self._senders is None or expired or missing:
+            query = select(Employee.id, Employee.first_name, Employee.last_name, Employee.patronymic)
+            rows = (await db.execute(query)).all()
+            self._senders = {row.id: sender_info_from(row, "employee") for row in rows}
+            self._loaded_at = time.monotonic()
+
+        return self._senders
+
+employee_directory = EmployeeDirectory(ttl=int(os.getenv("EMPLOYEE_CACHE_TTL", "300")))
+
+async def render_messages(db, messages, known_users=()):
+    user_senders = {user.id: sender_info_from(user, "user") for user in known_users}
+
+    missing_user_ids = {
+        msg.sender_user_id for msg in messages
+        if msg.sender_type == SenderTypeEnum.user and msg.sender_user_id not in user_senders
+    }
+    if missing_user_ids:
+        query = select(User.id, User.first_name, User.last_name, User.patronymic).where(User.id.in_(missing_user_ids))
+        for row in (await db.execute(query)).all():
+            user_senders[row.id] = sender_info_from(row, "user")
+
+    employee_ids = {msg.sender_employee_id for msg in messages if msg.sender_type == SenderTypeEnum.employee}
+    employee_senders = await employee_directory.get_senders(db, employee_ids) if employee_ids else {}
+
+    rendered = []
+    for msg in messages:
+        sender = None
+        if msg.sender_type == SenderTypeEnum.user:
+            sender = user_senders.get(msg.sender_user_id)
+        elif msg.sender_type == SenderTypeEnum.employee:
+            sender = employee_senders.get(msg.sender_employee_id)
+        elif msg.sender_type == SenderTypeEnum.ai:
+            sender = AI_SENDER
+
+        rendered.append({"id": msg.id, "content": msg.content, "created_at": msg.created_at, "sender": sender})
+
+    return rendered
+
+# Транзакция брони идёт в READ COMMITTED. В REPEATABLE READ блокирующее чтение диапазона
+# bookings ставит gap-блокировки, и бронь свободного номера ждала бы проверку соседнего;
+# в READ COMMITTED FOR UPDATE блокирует только строки номеров, а обычное чтение видит
+# последние закоммиченные брони. Запрос авторизации уже открыл транзакцию сессии, она завершается
+async def begin_read_committed(db):
+    await db.commit()
+    await db.connection(execution_options={"isolation_level": "READ COMMITTED"})
+
+# Блокировка строки номера до конца транзакции (SELECT ... FOR UPDATE): бронирования
+# одного номера выполняются по очереди, бронирования разных номеров не ждут друг друга
+async def lock_room(db, room_id):
+    query = select(Room).where(Room.id == room_id).with_for_update().execution_options(populate_existing=True)
+    return (await db.execute(query)).scalar_one_or_none()
+
+# Проживание не длиннее MAX_STAY_DAYS, поэтому любая бронь, пересекающая [check_in, check_out),
+# заехала не раньше check_in - MAX_STAY_DAYS. Эта нижняя граница по ключу секционирования
+# позволяет MySQL читать только секции bookings за последние месяцы, а не за всю историю
+MAX_STAY_DAYS = int(os.getenv("MAX_STAY_DAYS", "90"))
+
+def check_stay_length(check_in_date, check_out_date):
+    check_in = check_in_date.replace(tzinfo=timezone.utc) if check_in_date.tzinfo is None else check_in_date
+    check_out = check_out_date.replace(tzinfo=timezone.utc) if check_out_date.tzinfo is None else check_out_date
+    if check_out - check_in > timedelta(days=MAX_STAY_DAYS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A stay cannot be longer than {MAX_STAY_DAYS} days"
+        )
+
+def overlapping_bookings_filter(check_in_date, check_out_date):
+    return (
+        Booking.status.in_([BookingStatusEnum.confirmed, BookingStatusEnum.active]),
+        Booking.check_in_date >= check_in_date - timedelta(days=MAX_STAY_DAYS),
+        Booking.check_in_date < check_out_date,
+        check_in_date < Booking.check_out_date
+    )
+
+# Подтверждённые брони для дашборда: неотменённые заезды не старше MAX_STAY_DAYS
+def current_bookings_filter(now):
+    return (
+        Booking.status == BookingStatusEnum.confirmed,
+        Booking.check_in_date >= now - timedelta(days=MAX_STAY_DAYS)
+    )
+
+# Заселённые гости выбираются без границы по дате: их немного, а гость, которого не выселили
+# вовремя, может жить дольше MAX_STAY_DAYS и не должен пропадать с дашборда
+def active_bookings_filter():
+    return (Booking.status == BookingStatusEnum.active,)
+
+# Пересечение с действующими бронями номера. Вызывается под блокировкой номера (lock_room)
+# в транзакции READ COMMITTED: обычное чтение видит брони, закоммиченные до получения
+# блокировки, и не блокирует диапазоны bookings
+async def find_overlapping_booking(db, room_id, check_in_date, check_out_date):
+    query = select(Booking.id).where(
+        Booking.room_id == room_id,
+        *overlapping_bookings_filter(check_in_date, check_out_date)
+    ).limit(1)
+    return (await db.execute(query)).scalar_one_or_none()
+
+# Страница истории: since_id — новые сообщения после id, before_id — более старые до id,
+# без курсоров — последние limit сообщений. not_before — время создания чата: сообщения
+# не старше чата, и по этой границе MySQL отсекает секции messages за прошлые месяцы
+def message_page_query(chat_id, not_before=None):
+    query = select(*MESSAGE_COLUMNS).where(Message.chat_id == chat_id)
+    if not_before is not None:
+        query = query.where(Message.created_at >= not_before)
+    return query
+
+async def load_message_page(db, chat_id, limit, since_id=None, before_id=None, not_before=None):
+    query = message_page_query(chat_id, not_before)
+
+    if since_id:
+        rows = (await db.execute(query.where(Message.id > since_id).order_by(Message.id.asc()))).all()
+        return rows, False
+
+    if before_id:
+        query = query.where(Message.id < before_id)
+
+    rows = (await db.execute(query.order_by(Message.id.desc()).limit(limit + 1))).all()
+    return rows[:limit][::-1], len(rows) > limit
+
+# Каталог переводов типов номеров и сервисов: загружается один раз на воркер,
+# сбрасывается при записи (событие catalog_changed) и по TTL
+class TranslationCatalog:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.version = 0
+        self._room_types = None
+        self._services = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._room_types = None
+        self._services = None
+        self.version += 1
+
+    # Контрольная сумма содержимого для ETag; каталог при необходимости подгружается
+    async def checksum(self, db, section):
+        await self._ensure_loaded(db)
+        return self._checksums[section]
+
+    async def _ensure_loaded(self, db):
+        if self._room_types is not None and time.monotonic() - self._loaded_at <= self.ttl:
+            return
+
+        async with self._lock:
+            if self._room_types is not None and time.monotonic() - self._loaded_at <= self.ttl:
+                return
+
+            # invalidate() во время чтения означает, что прочитанное могло устареть: читаем заново.
+            # Если каталог меняется и на второй попытке, результат отдаётся, но перечитается при
+            # следующем обращении
+            for attempt in range(2):
+                version = self.version
+                # populate_existing: повторное чтение в той же сессии не должно отдать объекты из identity map
+                room_types_query = select(RoomType).options(selectinload(RoomType.translations)).order_by(RoomType.id)
+                services_query = select(Service).options(selectinload(Service.translations)).order_by(Service.id)
+                room_types_query = room_types_query.execution_options(populate_existing=True)
+                services_query = services_query.execution_options(populate_existing=True)
+                room_types = (await db.execute(room_types_query)).scalars().all()
+                services = (await db.execute(services_query)).scalars().all()
+                if self.version == version:
+                    break
+
+            self._room_types = {
+                room_type.id: {
+                    "id": room_type.id,
+                    "code": room_type.code,
+                    "translations": [
+                        {"language_code": t.language_code, "name": t.name} for t in room_type.translations
+                    ],
+                }
+                for room_type in room_types
+            }
+            self._services = {
+                service.id: {
+                    "id": service.id,
+                    "price": float(service.price),
+                    "status": service.status,
+                    "translations": [
+                        {"language_code": t.language_code, "name": t.name, "description": t.description}
+                        for t in service.translations
+                    ],
+                }
+                for service in services
+            }
+            self._checksums = {
+                "room_types": zlib.crc32(orjson.dumps(self._room_types, option=orjson.OPT_NON_STR_KEYS)),
+                "services": zlib.crc32(orjson.dumps(self._services, option=orjson.OPT_NON_STR_KEYS)),
+            }
+            self._loaded_at = time.monotonic() if self.version == version else 0.0
+
+    @staticmethod
+    def _localize(entry, lang):
+        if lang is None:
+            return entry
+        translations = [t for t in entry["translations"] if t["language_code"] == lang]
+        return {**entry, "translations": translations or entry["translations"][:1]}
+
+    # required — id, которые должны быть в каталоге. Тип номера или сервис, созданный на другом
+    # воркере, может прийти раньше события catalog_changed: тогда каталог перечитывается сразу
+    async def _ensure_contains(self, db, section, required):
+        await self._ensure_loaded(db)
+        if required and not set(required) <= getattr(self, section).keys():
+            async with self._lock:
+                # Пока ждали блокировку, invalidate() мог сбросить каталог — тогда он и так перечитается
+                entries = getattr(self, section)
+                if entries is not None and not set(required) <= entries.keys():
+                    self._loaded_at = 0.0
+            await self._ensure_loaded(db)
+
+    async def room_types(self, db, lang=None, required=()):
+        await self._ensure_contains(db, "_room_types", required)
+        return {room_type_id: self._localize(entry, lang) for room_type_id, entry in self._room_types.items()}
+
+    async def services(self, db, lang=None, required=()):
+        await self._ensure_contains(db, "_services", required)
+        return {service_id: self._localize(entry, lang) for service_id, entry in self._services.items()}
+
+translation_catalog = TranslationCatalog(ttl=int(os.getenv("CATALOG_CACHE_TTL", "300")))
+
+# Язык ответа: параметр ?lang= важнее заголовка Accept-Language; без них — все языки
+def get_language(request: Request, lang: Optional[LanguageCodeEnum] = None) -> Optional[LanguageCodeEnum]:
+    if lang:
+        return lang
+
+    candidates = []
+    for position, part in enumerate(request.headers.get("accept-language", "").split(",")):
+        code, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        candidates.append((-quality, position, code.split("-")[0].lower()))
+
+    for _, _, code in sorted(candidates):
+        if code in LanguageCodeEnum.__members__:
+            return LanguageCodeEnum(code)
+    return None
+
+# Версии ресурсов для ETag: счётчики в Redis, увеличиваются на путях записи.
+# Отсутствующий счётчик инициализируется текущим временем, чтобы после очистки
+# Redis старые ETag не совпали с новыми версиями.
+BUMP_VERSION_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    redis.call('set', key, ARGV[1], 'NX')
+    redis.call('incr', key)
+end
+return 1
+"""
+
+class ResourceVersions:
+    def __init__(self, redis, prefix="version"):
+        self.redis = redis
+        self.prefix = prefix
+
+    def _key(self, resource):
+        return f"{self.prefix}:{resource}"
+
+    async def get(self, resource):
+        key = self._key(resource)
+        try:
+            value = await self.redis.get(key)
+            if value is None:
+                await self.redis.set(key, time.time_ns(), nx=True)
+                value = await self.redis.get(key)
+        except Exception as e:
+            logging.warning(f"Failed to read version of {resource}: {e}")
+            return None
+        return value.decode() if isinstance(value, bytes) else str(value)
+
+    async def bump(self, *resources):
+        keys = [self._key(resource) for resource in resources]
+        try:
+            await self.redis.eval(BUMP_VERSION_SCRIPT, len(keys), *keys, time.time_ns())
+        except Exception as e:
+            logging.warning(f"Failed to bump versions {resources}: {e}")
+
+# Idempotency-Key для POST: первый запрос ставит отметку "pending", результат
+# успешного запроса сохраняется на IDEMPOTENCY_TTL и отдаётся повторам с тем же ключом.
+# Ошибки не сохраняются — после них запрос можно повторить с тем же ключом. Отметка
+# "pending" живёт pending_ttl: если воркер упал посреди запроса, ключ освободится сам
+class IdempotencyStore:
+    def __init__(self, redis, ttl=86400, pending_ttl=60, prefix="idempotency"):
+        self.redis = redis
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.prefix = prefix
+
+    async def begin(self, key, fingerprint):
+        pending = orjson.dumps({"fingerprint": fingerprint, "state": "pending"})
+        try:
+            if await self.redis.set(f"{self.prefix}:{key}", pending, nx=True, ex=self.pending_ttl):
+                return None
+            stored = await self.redis.get(f"{self.prefix}:{key}")
+        except Exception as e:
+            logging.warning(f"Idempotency store unavailable, processing {key} without it: {e}")
+            return None
+
+        if stored is None:
+            return await self.begin(key, fingerprint)
+        record = orjson.loads(stored)
+        if record["fingerprint"] != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request"
+            )
+        if record["state"] == "pending":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still being processed"
+            )
+        return record
+
+    async def complete(self, key, fingerprint, status_code, body):
+        record = orjson.dumps({"fingerprint": fingerprint, "state": "done", "status_code": status_code, "body": body})
+        try:
+            await self.redis.set(f"{self.prefix}:{key}", record, ex=self.ttl)
+        except Exception as e:
+            logging.warning(f"Failed to store idempotent response {key}: {e}")
+            return False
+        return True
+
+    async def release(self, key):
+        try:
+            await self.redis.delete(f"{self.prefix}:{key}")
+        except Exception as e:
+            logging.warning(f"Failed to release idempotency key {key}: {e}")
+
 class RateLimiter:
     def __init__(self, redis, key_prefix, limit, period, block_time):
         self.redis = redis
@@ -741,6 +1511,9 @@ def require_role(required_roles: List[EmployeeRoleEnum]):
         employee = await db.get(Employee, int(employee_id))
         if not employee or employee.status != UserStatusEnum.active:
             raise credentials_exception
+
+        if CHAT_AUTO_ROUTING and employee.role == EmployeeRoleEnum.reception:
+            await chat_router.heartbeat(employee.id)
         
         return employee
     
@@ -750,13 +1523,6 @@ def require_role(required_roles: List[EmployeeRoleEnum]):
 async def root():
     return {"message": "Welcome to the API!"}
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    print("Приложение запускается...")
-    yield
-    print("Приложение останавливается...")
-    await engine.dispose()
-
 from redis.asyncio import Redis
 
 redis_client = Redis.from_url("redis://localhost:6379/0")
@@ -769,6 +1535,162 @@ login_rate_limiter = RateLimiter(
     block_time=180  # 3 минуты
 )
 
+# Периодические задачи сервера: выполняются ровно на одном воркере (лидер по аренде в Redis)
+def create_scheduler():
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+    return AsyncIOScheduler(timezone=ZoneInfo("Asia/Tashkent"))
+
+job_runner = JobRunner(
+    create_scheduler,
+    LeaderElection(redis_client, "scheduler:leader", lease_seconds=int(os.getenv("SCHEDULER_LEASE_SECONDS", "15")))
+)
+
+# События между воркерами: message_created, chat_claimed, chat_released, booking_updated, room_status_changed,
+# service_request_created, service_request_updated, service_request_escalated, guest_updated
+event_bus = EventBus(redis_client)
+event_bus.subscribe("employee_updated", lambda event: employee_directory.invalidate())
+event_bus.subscribe("catalog_changed", lambda event: translation_catalog.invalidate())
+
+# Индекс поиска гостей в памяти каждого воркера (/reception/guests/search): строится из users
+# при первом поиске, полностью перестраивается раз в GUEST_INDEX_TTL секунд, новые гости
+# приходят событием guest_updated. Статус гостя в индексе не хранится, его читает поиск из БД
+guest_index = GuestIndex(
+    ttl=int(os.getenv("GUEST_INDEX_TTL", "3600")),
+    country_code=os.getenv("GUEST_PHONE_COUNTRY_CODE", "998"),
+)
+event_bus.subscribe("guest_updated", lambda event: guest_index.upsert((
+    event["payload"]["id"], event["payload"]["first_name"], event["payload"]["last_name"],
+    event["payload"]["patronymic"], event["payload"]["phone_number"]
+)))
+
+resource_versions = ResourceVersions(redis_client)
+idempotency_store = IdempotencyStore(
+    redis_client,
+    ttl=int(os.getenv("IDEMPOTENCY_TTL", "86400")),
+    pending_ttl=int(os.getenv("IDEMPOTENCY_PENDING_TTL", "60"))
+)
+
+# Кэш ответов AI-чата: LRU в памяти воркера и общий уровень в Redis (AI_CACHE_REDIS=0 — только память).
+# AI_FACTS_VERSION увеличивают при смене фактов об отеле, которых нет в каталоге услуг и типов номеров
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "1") == "1"
+AI_FACTS_VERSION = os.getenv("AI_FACTS_VERSION", "1")
+ai_cache = AIResponseCache(
+    redis_client if os.getenv("AI_CACHE_REDIS", "1") == "1" else None,
+    ttl=int(os.getenv("AI_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("AI_CACHE_MAX_ENTRIES", "1000")),
+)
+
+# Автоматическое распределение чатов ресепшена (CHAT_AUTO_ROUTING=1): чат, в который написал
+# гость, назначается сотруднику reception в сети с наименьшим числом чатов. В сети — тот,
+# кто обращался к API за последние RECEPTION_PRESENCE_TTL секунд или держит /reception/events
+CHAT_AUTO_ROUTING = os.getenv("CHAT_AUTO_ROUTING", "0") == "1"
+CHAT_ROUTING_BATCH = int(os.getenv("CHAT_ROUTING_BATCH", "100"))
+chat_router = ReceptionRouter(redis_client, presence_ttl=int(os.getenv("RECEPTION_PRESENCE_TTL", "90")))
+
+# Холодный архив переписки: чаты и сообщения броней, завершённых больше ARCHIVE_AFTER_DAYS дней
+# назад, переносятся из БД в сжатые сегменты в ARCHIVE_DIR (общий каталог для всех воркеров)
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "0") == "1"
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "500"))
+archive_store = ArchiveStore(os.getenv("ARCHIVE_DIR", "archive"))
+
+# Помесячные секции bookings и messages (migrations/005): секции создаются на PARTITION_MONTHS_AHEAD
+# месяцев вперёд; пустые секции messages старше MESSAGES_PARTITION_RETENTION_MONTHS удаляются (0 — не удалять)
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "12"))
+booking_partitions = MonthlyPartitions("bookings", months_ahead=PARTITION_MONTHS_AHEAD)
+message_partitions = MonthlyPartitions(
+    "messages", months_ahead=PARTITION_MONTHS_AHEAD,
+    retention_months=int(os.getenv("MESSAGES_PARTITION_RETENTION_MONTHS", "0"))
+)
+
+# Срок выполнения заявки на сервис по приоритету, минуты: SERVICE_SLA_MINUTES=urgent:15,high:30,normal:60,low:240
+SERVICE_SLA_MINUTES = {
+    ServiceRequestPriorityEnum(name): int(minutes)
+    for name, minutes in (
+        item.split(":") for item in os.getenv("SERVICE_SLA_MINUTES", "urgent:15,high:30,normal:60,low:240").split(",")
+    )
+}
+SERVICE_SLA_CHECK_INTERVAL = int(os.getenv("SERVICE_SLA_CHECK_INTERVAL", "60"))
+SERVICE_SLA_BATCH = int(os.getenv("SERVICE_SLA_BATCH", "500"))
+
+# Срок считается часами БД, как и created_at, чтобы эскалация не зависела от часов воркера
+def sla_deadline_for(priority, start=None):
+    return func.timestampadd(text("MINUTE"), SERVICE_SLA_MINUTES[priority], start if start is not None else func.now())
+
+# Выполняет обработчик POST с учётом Idempotency-Key: повтор с тем же ключом и телом
+# получает сохранённый ответ, а не создаёт вторую бронь. Ключ привязан к сотруднику и пути
+async def run_idempotent(request: Request, idempotency_key, employee, payload, schema, status_code, handler):
+    if not idempotency_key:
+        return await handler()
+
+    key = f"{employee.id}:{request.url.path}:{idempotency_key}"
+    fingerprint = hashlib.sha256(orjson.dumps(payload.model_dump(mode="json"))).hexdigest()
+    record = await idempotency_store.begin(key, fingerprint)
+    if record is not None:
+        return JSONResponse(record["body"], status_code=record["status_code"], headers={"Idempotent-Replayed": "true"})
+
+    try:
+        result = await handler()
+    except BaseException:
+        await idempotency_store.release(key)
+        raise
+
+    # Ключ либо сохраняется как выполненный, либо освобождается — иначе повторы получали бы 409
+    try:
+        body = jsonable_encoder(schema.model_validate(result))
+    except BaseException:
+        await idempotency_store.release(key)
+        raise
+    if not await idempotency_store.complete(key, fingerprint, status_code, body):
+        await idempotency_store.release(key)
+    return result
+
+async def publish_room_change(room):
+    await resource_versions.bump("rooms", "room-details")
+    await event_bus.publish("room_status_changed", {
+        "room_id": room.id, "room_number": room.room_number, "status": room.status
+    })
+
+async def publish_booking_change(booking, room=None):
+    await resource_versions.bump("rooms", f"bookings:user:{booking.user_id}")
+    await event_bus.publish("booking_updated", {
+        "booking_id": booking.id, "room_id": booking.room_id, "user_id": booking.user_id, "status": booking.status
+    })
+    if room is not None:
+        await event_bus.publish("room_status_changed", {
+            "room_id": room.id, "room_number": room.room_number, "status": room.status
+        })
+
+# Поток событий в формате SSE; соединение с БД к этому моменту уже должно быть освобождено
+def event_stream_response(request: Request, event_types, accept=None, heartbeat=None):
+    queue = asyncio.Queue(maxsize=100)
+
+    def enqueue(event):
+        if accept is None or accept(event):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logging.warning(f"SSE client queue is full, dropping {event['type']}")
+
+    async def stream():
+        unsubscribers = [event_bus.subscribe(event_type, enqueue) for event_type in event_types]
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if heartbeat is not None:
+                        await heartbeat()
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {orjson.dumps(event['payload']).decode()}\n\n"
+        finally:
+            for unsubscribe in unsubscribers:
+                unsubscribe()
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.post("/auth/login", tags=["Auth"], response_model=Token)
 async def login_for_user_access_token(
     form_data: UserLoginRequest, db: AsyncSession = Depends(get_db)
@@ -824,9 +1746,21 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
 # Получение всех бронирований текущего пользователя
 @app.get("/user/bookings", tags=["USer"], response_model=List[BookingSchema])
 async def get_my_bookings(
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    not_modified = conditional_get(
+        request, response,
+        "bookings",
+        await resource_versions.get(f"bookings:user:{current_user.id}"),
+        await resource_versions.get("room-details"),
+        await resource_versions.get("employees"),
+    )
+    if not_modified:
+        return not_modified
+
     query = select(Booking).options(
         selectinload(Booking.user),
         selectinload(Booking.room),
@@ -867,15 +1801,25 @@ async def get_my_booking_details(
 # Получение доступных сервисов для пользователя
 @app.get("/user/services", tags=["USer"], response_model=List[ServiceSchema])
 async def get_available_services(
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    lang: Optional[LanguageCodeEnum] = Depends(get_language)
 ):
-    query = select(Service).options(
-        selectinload(Service.translations)
-    ).where(Service.status == ServiceStatusEnum.available)
-    
-    result = await db.execute(query)
-    return result.scalars().all()
+    not_modified = conditional_get(
+        request, response,
+        "services", await translation_catalog.checksum(db, "services"), lang.value if lang else "default"
+    )
+    if not_modified:
+        return not_modified
+
+    services = await translation_catalog.services(db, lang)
+    available = [service for service in services.values() if service["status"] == ServiceStatusEnum.available]
+
+    if FAST_JSON_RESPONSES:
+        return fast_json_list(ServiceSchema, available, headers=response.headers)
+    return available
 
 # Создание заявки на сервис (только для активного бронирования)
 @app.post("/user/service-requests", tags=["USer"], response_model=ServiceRequestSchema, status_code=status.HTTP_200_OK)
@@ -898,11 +1842,16 @@ async def create_service_request(
     new_request = ServiceRequest(
         booking_id=booking.id,
         service_id=service.id,
-        price=service.price
+        price=service.price,
+        priority=ServiceRequestPriorityEnum.normal,
+        sla_deadline=sla_deadline_for(ServiceRequestPriorityEnum.normal)
     )
     
     db.add(new_request)
     await db.commit()
+    await event_bus.publish("service_request_created", {
+        "request_id": new_request.id, "booking_id": booking.id, "priority": ServiceRequestPriorityEnum.normal.value
+    })
 
     query = select(ServiceRequest).options(
         selectinload(ServiceRequest.service).selectinload(Service.translations)
@@ -925,91 +1874,63 @@ async def get_my_service_requests(
     result = await db.execute(query)
     return result.scalars().all()
 
-# Получение/создание чата пользователя с ресепшн или AI
+# Получение/создание чата пользователя с ресепшн или AI (последние limit сообщений + курсор)
 @app.post("/user/chats", tags=["USer"], response_model=ChatSchema)
 async def get_or_create_chat_with_reception(
     request_data: ChatTypeRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    limit: int = 20
 ):
-    active_booking_query = select(Booking).where(
+    active_booking_query = select(Booking).options(
+        selectinload(Booking.user),
+        selectinload(Booking.room),
+        selectinload(Booking.employee)
+    ).where(
         Booking.user_id == current_user.id,
         or_(Booking.status == BookingStatusEnum.active, Booking.status == BookingStatusEnum.confirmed)
     ).order_by(Booking.created_at.desc()).limit(1)
     
     active_booking = (await db.execute(active_booking_query)).scalar_one_or_none()
 
-    if not active_booking and request_data.type == ChatTypeEnum.RECEPTION:
-         raise HTTPException(status_code=400, detail="No active booking found to create a reception chat.")
-
-    chat = None
-
-    if active_booking:
-        query = select(Chat).where(
-            Chat.booking_id == active_booking.id,
-            Chat.type == request_data.type
-        ).options(
-            selectinload(Chat.booking).options(
-                selectinload(Booking.user),
-                selectinload(Booking.room),
-                selectinload(Booking.employee)
-            ),
-            selectinload(Chat.messages).options(
-                selectinload(Message.sender_user),
-                selectinload(Message.sender_employee)
-            )
-        )
-        result = await db.execute(query)
-        chat = result.scalar_one_or_none()
-
-    if not chat:
-        if not active_booking:
-             raise HTTPException(status_code=400, detail="A booking is required to create a new chat.")
-
-        new_chat = Chat(booking_id=active_booking.id, type=request_data.type)
-        db.add(new_chat)
+    if not active_booking:
+        if request_data.type == ChatTypeEnum.RECEPTION:
+            raise HTTPException(status_code=400, detail="No active booking found to create a reception chat.")
+        raise HTTPException(status_code=400, detail="A booking is required to create a new chat.")
+
+    existing_chat = (await db.execute(
+        select(Chat.id, Chat.created_at).where(Chat.booking_id == active_booking.id, Chat.type == request_data.type)
+    )).one_or_none()
+    chat_id, chat_created_at = existing_chat if existing_chat else (None, None)
+
+    if chat_id is None:
+        # Атомарный upsert по уникальному ключу (booking_id, type): LAST_INSERT_ID(id)
+        # возвращает id существующего чата, если его успел создать параллельный запрос
+        upsert = mysql_insert(Chat).values(booking_id=active_booking.id, type=request_data.type)
+        upsert = upsert.on_duplicate_key_update(id=func.last_insert_id(Chat.id))
+        chat_id = (await db.execute(upsert)).lastrowid
         await db.commit()
+        if request_data.type == ChatTypeEnum.RECEPTION:
+            # На дашборде ресепшена появляется ссылка на чат
+            await resource_versions.bump("rooms")
+
+    messages, has_more = await load_message_page(db, chat_id, limit, not_before=chat_created_at)
+    messages_with_sender = await render_messages(db, messages, known_users=[current_user])
+    before_id = messages[0].id if has_more else None
+
+    if FAST_JSON_RESPONSES:
+        return fast_json_response(compile_serializer(ChatSchema)({
+            "id": chat_id, "type": request_data.type, "booking": active_booking,
+            "messages": messages_with_sender, "has_more": has_more, "before_id": before_id
+        }))
+    return ChatSchema(
+        id=chat_id, type=request_data.type, booking=active_booking,
+        messages=messages_with_sender, has_more=has_more, before_id=before_id
+    )
 
-        result = await db.execute(query)
-        chat = result.scalar_one()
-
-    messages_with_sender = []
-    for msg in sorted(chat.messages, key=lambda m: m.created_at):
-        sender_info = None
-        
-        if msg.sender_type == SenderTypeEnum.user and msg.sender_user:
-            sender_info = SenderInfo(
-                id=msg.sender_user.id, 
-                first_name=msg.sender_user.first_name, 
-                last_name=msg.sender_user.last_name,
-                patronymic=msg.sender_user.patronymic,
-                type="user"
-          )
-        elif msg.sender_type == SenderTypeEnum.employee and msg.sender_employee:
-            sender_info = SenderInfo(
-                id=msg.sender_employee.id, 
-                first_name=msg.sender_employee.first_name, 
-                last_name=msg.sender_employee.last_name,
-                patronymic=msg.sender_employee.patronymic,
-                type="employee"
-            )
-        elif msg.sender_type == SenderTypeEnum.ai:
-            sender_info = SenderInfo(id=0, first_name="AI", last_name="Assistant", type="ai")
-        
-        messages_with_sender.append(MessageSchema(
-            id=msg.id, content=msg.content, created_at=msg.created_at, sender=sender_info
-        ))
-
-    return ChatSchema(id=chat.id, type=chat.type, booking=chat.booking, messages=messages_with_sender)
+AI_FALLBACK_MESSAGE = "Произошла ошибка при обращении к ассистенту. Пожалуйста, попробуйте позже."
 
-# Отправка сообщения в чат от пользователя (и генерация ответа AI)
-@app.post("/user/chats/{chat_id}/messages", tags=["USer"], response_model=MessageSchema)
-async def send_message_as_user(
-    chat_id: int,
-    message_data: MessageCreate,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+async def get_user_chat(db: AsyncSession, chat_id: int, current_user: User) -> Chat:
     query = select(Chat).options(
         selectinload(Chat.booking)
     ).where(Chat.id == chat_id)
@@ -1019,51 +1940,189 @@ async def send_message_as_user(
 
     if not chat or chat.booking.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found or access denied")
+    return chat
 
+async def add_user_message(db: AsyncSession, chat: Chat, content: str, current_user: User) -> Message:
+    previous_employee_id = None
     if chat.type == ChatTypeEnum.RECEPTION:
+        previous_employee_id = chat.assigned_employee_id
         chat.status = ChatStatusEnum.open
         chat.assigned_employee_id = None
         db.add(chat)
 
     user_message = Message(
-        chat_id=chat_id,
-        content=message_data.content,
+        chat_id=chat.id,
+        content=content,
         sender_type=SenderTypeEnum.user,
         sender_user_id=current_user.id
     )
     db.add(user_message)
-    
-    db.add(user_message)
     await db.commit()
-    await db.refresh(user_message, attribute_names=['sender_user', 'id', 'created_at'])
+    await db.refresh(user_message, attribute_names=['id', 'created_at'])
+    await event_bus.publish("message_created", {
+        "chat_id": chat.id, "booking_id": chat.booking_id, "message_id": user_message.id, "sender_type": SenderTypeEnum.user
+    })
+
+    if CHAT_AUTO_ROUTING and chat.type == ChatTypeEnum.RECEPTION:
+        # Сообщение уже сохранено: сбой распределения оставляет чат в общей очереди.
+        # Чат снят с сотрудника, поэтому его загрузка возвращается до повторного выбора
+        if previous_employee_id is not None:
+            await chat_router.add_load(previous_employee_id, -1)
+        try:
+            await route_chat(db, chat.id, chat.booking_id, preferred=previous_employee_id)
+        except Exception as e:
+            await db.rollback()
+            logging.error(f"Failed to route chat {chat.id}: {e}", exc_info=True)
+    return user_message
+
+async def save_ai_message(db: AsyncSession, chat_id: int, booking_id: int, content: str) -> Message:
+    ai_message = Message(
+        chat_id=chat_id,
+        content=content,
+        sender_type=SenderTypeEnum.ai
+    )
+    db.add(ai_message)
+    await db.commit()
+    await db.refresh(ai_message, attribute_names=['id', 'created_at'])
+    await event_bus.publish("message_created", {
+        "chat_id": chat_id, "booking_id": booking_id, "message_id": ai_message.id, "sender_type": SenderTypeEnum.ai
+    })
+    return ai_message
+
+# Ключ кэша AI: вопрос, язык и версия фактов (контрольные суммы каталогов); None — вопрос
+# про данные гостя, кэш не используется
+async def ai_cache_key(db: AsyncSession, prompt: str, lang: Optional[LanguageCodeEnum]):
+    facts_version = ":".join([
+        AI_FACTS_VERSION,
+        str(await translation_catalog.checksum(db, "services")),
+        str(await translation_catalog.checksum(db, "room_types")),
+    ])
+    return ai_cache.key(prompt, lang.value if lang else "default", facts_version)
+
+async def ask_ai(prompt: str, cache_key) -> str:
+    if AI_CACHE_ENABLED:
+        cached = await ai_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    answer = await ai_provider.generate(prompt)
+    if AI_CACHE_ENABLED and answer:
+        await ai_cache.set(cache_key, answer)
+    return answer
+
+# Отправка сообщения в чат от пользователя (и генерация ответа AI)
+@app.post("/user/chats/{chat_id}/messages", tags=["USer"], response_model=MessageSchema)
+async def send_message_as_user(
+    chat_id: int,
+    message_data: MessageCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    lang: Optional[LanguageCodeEnum] = Depends(get_language)
+):
+    chat = await get_user_chat(db, chat_id, current_user)
+    is_ai_chat = chat.type == ChatTypeEnum.AI
+    cache_key = await ai_cache_key(db, message_data.content, lang) if is_ai_chat and AI_CACHE_ENABLED else None
+    # После commit соединение возвращается в пул и не занято на время ответа модели
+    user_message = await add_user_message(db, chat, message_data.content, current_user)
 
-    if chat.type == ChatTypeEnum.AI:
+    if is_ai_chat:
         try:
-            response = await model.generate_content_async(message_data.content)
-            ai_message_content = response.text
+            ai_message_content = await ask_ai(message_data.content, cache_key)
+        except AIUnavailableError as e:
+            logging.warning(f"AI is unavailable for chat {chat_id}: {e}")
+            ai_message_content = AI_FALLBACK_MESSAGE
         except Exception as e:
             logging.error(f"AI generation failed for chat {chat_id}: {e}", exc_info=True)
-            ai_message_content = "Произошла ошибка при обращении к ассистенту. Пожалуйста, попробуйте позже."
+            ai_message_content = AI_FALLBACK_MESSAGE
 
-        ai_message = Message(
-            chat_id=chat_id,
-            content=ai_message_content,
-            sender_type=SenderTypeEnum.ai
-        )
-        db.add(ai_message)
-        await db.commit()        
+        await save_ai_message(db, chat_id, chat.booking_id, ai_message_content)
 
     return MessageSchema(
         id=user_message.id,
         content=user_message.content,
         created_at=user_message.created_at,
-        sender=SenderInfo(
-            id=current_user.id,
-            first_name=current_user.first_name,
-            last_name=current_user.last_name,
-            patronymic=current_user.patronymic,
-            type="user"
-        )
+        sender=sender_info_from(current_user, "user")
+    )
+
+# Ответ модели пишется фоновой задачей: она дочитывает поток и сохраняет сообщение
+# в своей сессии, даже если гость закрыл соединение. SSE-ответ только читает очередь
+ai_reply_tasks = set()
+
+async def generate_ai_reply(chat_id: int, booking_id: int, prompt: str, cache_key, queue: asyncio.Queue):
+    parts = []
+    try:
+        cached = await ai_cache.get(cache_key) if AI_CACHE_ENABLED else None
+        if cached is not None:
+            parts.append(cached)
+            queue.put_nowait(("chunk", {"text": cached}))
+        else:
+            async for chunk in ai_provider.stream(prompt):
+                parts.append(chunk)
+                queue.put_nowait(("chunk", {"text": chunk}))
+            if AI_CACHE_ENABLED and parts:
+                await ai_cache.set(cache_key, "".join(parts))
+        content = "".join(parts)
+    except AIUnavailableError as e:
+        logging.warning(f"AI is unavailable for chat {chat_id}: {e}")
+        content = AI_FALLBACK_MESSAGE
+        queue.put_nowait(("error", {"text": content}))
+    except Exception as e:
+        logging.error(f"AI streaming failed for chat {chat_id}: {e}", exc_info=True)
+        content = AI_FALLBACK_MESSAGE
+        queue.put_nowait(("error", {"text": content}))
+
+    try:
+        async with async_session_maker() as session:
+            ai_message = await save_ai_message(session, chat_id, booking_id, content)
+        queue.put_nowait(("done", MessageSchema(
+            id=ai_message.id, content=ai_message.content, created_at=ai_message.created_at, sender=AI_SENDER
+        ).model_dump(mode="json")))
+    except Exception as e:
+        logging.error(f"Failed to save AI reply for chat {chat_id}: {e}", exc_info=True)
+        queue.put_nowait(("error", {"text": AI_FALLBACK_MESSAGE}))
+        queue.put_nowait(("done", None))
+
+# Потоковый вариант для AI-чата (SSE): user_message — сохранённое сообщение гостя,
+# chunk — фрагменты ответа по мере генерации, done — сохранённый ответ целиком.
+# При сбое модели приходит error с текстом-заглушкой, который и сохраняется
+@app.post("/user/chats/{chat_id}/messages/stream", tags=["USer"])
+async def stream_message_as_user(
+    chat_id: int,
+    message_data: MessageCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    lang: Optional[LanguageCodeEnum] = Depends(get_language)
+):
+    chat = await get_user_chat(db, chat_id, current_user)
+    if chat.type != ChatTypeEnum.AI:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Streaming replies are available only in AI chats")
+    cache_key = await ai_cache_key(db, message_data.content, lang) if AI_CACHE_ENABLED else None
+
+    user_message = await add_user_message(db, chat, message_data.content, current_user)
+    user_message_data = MessageSchema(
+        id=user_message.id,
+        content=user_message.content,
+        created_at=user_message.created_at,
+        sender=sender_info_from(current_user, "user")
+    ).model_dump(mode="json")
+    booking_id = chat.booking_id
+    # Соединение с БД не держим на время генерации
+    await db.close()
+
+    queue = asyncio.Queue()
+    task = asyncio.create_task(generate_ai_reply(chat_id, booking_id, message_data.content, cache_key, queue))
+    ai_reply_tasks.add(task)
+    task.add_done_callback(ai_reply_tasks.discard)
+
+    async def stream():
+        yield f"event: user_message\ndata: {orjson.dumps(user_message_data).decode()}\n\n"
+        while True:
+            event_type, payload = await queue.get()
+            yield f"event: {event_type}\ndata: {orjson.dumps(payload).decode()}\n\n"
+            if event_type == "done":
+                break
+
+    return StreamingResponse(
+        stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
@@ -1073,6 +2132,7 @@ async def get_chat_messages(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     since_id: Optional[int] = None,
+    before_id: Optional[int] = None,
     limit: int = 20
 ):
     query = select(Chat).options(
@@ -1085,94 +2145,66 @@ async def get_chat_messages(
     if not chat or chat.booking.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found or access denied")
 
-    query = (
-        select(Message)
-        .where(Message.chat_id == chat_id)
-        .order_by(Message.created_at.asc())
-        .options(
-            selectinload(Message.sender_user),
-            selectinload(Message.sender_employee)
-        )
-    )
+    messages, _ = await load_message_page(db, chat_id, limit, since_id=since_id, before_id=before_id, not_before=chat.created_at)
+    messages_with_sender = await render_messages(db, messages, known_users=[current_user])
 
-    if since_id:
-        query = query.where(Message.id > since_id)
-    else:
-        subquery = (
-            select(Message.id)
-            .where(Message.chat_id == chat_id)
-            .order_by(Message.id.desc())
-            .limit(limit)
-            .subquery()
-        )
-        query = (
-            select(Message)
-            .where(Message.id.in_(select(subquery)))
-            .order_by(Message.id.asc())
-            .options(
-                selectinload(Message.sender_user),
-                selectinload(Message.sender_employee)
-            )
-        )
-
-    result = await db.execute(query)
-    messages = result.scalars().all()
+    if FAST_JSON_RESPONSES:
+        return fast_json_list(MessageSchema, messages_with_sender)
+    return messages_with_sender
 
-    messages_with_sender = []
-    for msg in messages:
-        sender_info = None
-        if msg.sender_type == SenderTypeEnum.user and msg.sender_user:
-            sender_info = SenderInfo(
-                id=msg.sender_user.id, 
-                first_name=msg.sender_user.first_name, 
-                last_name=msg.sender_user.last_name,
-                patronymic=msg.sender_user.patronymic,
-                type="user"
-            )
-        elif msg.sender_type == SenderTypeEnum.employee and msg.sender_employee:
-            sender_info = SenderInfo(
-                id=msg.sender_employee.id, 
-                first_name=msg.sender_employee.first_name, 
-                last_name=msg.sender_employee.last_name,
-                patronymic=msg.sender_employee.patronymic,
-                type="employee"
-            )
-        elif msg.sender_type == SenderTypeEnum.ai:
-            sender_info = SenderInfo(id=0, first_name="AI", last_name="Assistant", type="ai")
-
-        messages_with_sender.append(
-            MessageSchema(
-                id=msg.id,
-                content=msg.content,
-                created_at=msg.created_at,
-                sender=sender_info,
-            )
-        )
+# Поток событий гостя (SSE): новые сообщения и изменения его активных бронирований
+@app.get("/user/events", tags=["USer"])
+async def stream_user_events(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    booking_ids_query = select(Booking.id).where(
+        Booking.user_id == current_user.id,
+        Booking.status.in_([BookingStatusEnum.active, BookingStatusEnum.confirmed])
+    )
+    booking_ids = set((await db.execute(booking_ids_query)).scalars().all())
+    await db.close()
 
-    return messages_with_sender
+    return event_stream_response(
+        request,
+        ["message_created", "booking_updated"],
+        accept=lambda event: event["payload"].get("booking_id") in booking_ids
+    )
 
 # Получение всех номеров (для админа/ресепшн)
 @app.get("/reception/rooms", tags=["Reception"], response_model=List[RoomForDashboardSchema])
 async def get_all_rooms_for_dashboard(
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
-    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception]))
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception])),
+    lang: Optional[LanguageCodeEnum] = Depends(get_language)
 ):
-    rooms_query = select(Room).options(
-        selectinload(Room.room_type).selectinload(RoomType.translations)
+    not_modified = conditional_get(
+        request, response,
+        "rooms",
+        await resource_versions.get("rooms"),
+        await resource_versions.get("employees"),
+        await translation_catalog.checksum(db, "room_types"),
+        lang.value if lang else "default",
     )
-    all_rooms = (await db.execute(rooms_query)).scalars().all()
+    if not_modified:
+        return not_modified
 
-    current_bookings_query = select(Booking).where(
-        or_(
-            Booking.status == BookingStatusEnum.active,
-            Booking.status == BookingStatusEnum.confirmed
-        )
-    ).options(
+    all_rooms = (await db.execute(select(Room))).scalars().all()
+    room_types = await translation_catalog.room_types(db, lang, required={room.room_type_id for room in all_rooms})
+
+    booking_options = (
         selectinload(Booking.user),
         selectinload(Booking.room),
         selectinload(Booking.employee)
     )
-    active_bookings = (await db.execute(current_bookings_query)).scalars().all()
+    # Заселённые идут последними и перекрывают подтверждённую бронь того же номера
+    active_bookings = []
+    for booking_filter in (current_bookings_filter(datetime.now()), active_bookings_filter()):
+        query = select(Booking).where(*booking_filter).options(*booking_options)
+        active_bookings += (await db.execute(query)).scalars().all()
     
     bookings_map = {booking.room_id: booking for booking in active_bookings}
 
@@ -1186,36 +2218,117 @@ async def get_all_rooms_for_dashboard(
 
     dashboard_data = []
     for room in all_rooms:
-        room_dto = RoomForDashboardSchema.from_orm(room)
-        
-        if room.id in bookings_map:
-            booking_obj = bookings_map[room.id]
-            booking_dto = BookingSchema.from_orm(booking_obj)
-            booking_dto.reception_chat_id = chats_map.get(booking_obj.id)
-            room_dto.current_booking = booking_dto
-        
-        dashboard_data.append(room_dto)
-        
+        room_data = {
+            "id": room.id,
+            "room_number": room.room_number,
+            "status": room.status,
+            "current_price_per_night": room.current_price_per_night,
+            "room_type": room_types.get(room.room_type_id),
+            "current_booking": None,
+        }
+
+        booking_obj = bookings_map.get(room.id)
+        if booking_obj:
+            if FAST_JSON_RESPONSES:
+                booking_data = compile_serializer(BookingSchema)(booking_obj)
+                booking_data["reception_chat_id"] = chats_map.get(booking_obj.id)
+            else:
+                booking_data = BookingSchema.from_orm(booking_obj)
+                booking_data.reception_chat_id = chats_map.get(booking_obj.id)
+            room_data["current_booking"] = booking_data
+
+        dashboard_data.append(room_data)
+
+    if FAST_JSON_RESPONSES:
+        return fast_json_list(RoomForDashboardSchema, dashboard_data, headers=response.headers)
     return dashboard_data
 
-# Получение всех заявок на сервис (ресепшн/админ)
-@app.get("/reception/service-requests", tags=["Reception"], response_model=List[ServiceRequestForEmployeeSchema])
-async def get_all_service_requests(
-    db: AsyncSession = Depends(get_db),
-    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception]))
-):
-    query = select(ServiceRequest).options(
+def service_request_for_employee_query():
+    return select(ServiceRequest).options(
         selectinload(ServiceRequest.booking).options(
             selectinload(Booking.user),
             selectinload(Booking.room),
             selectinload(Booking.employee)
         ),
         selectinload(ServiceRequest.service).selectinload(Service.translations)
-    ).order_by(ServiceRequest.created_at.desc())
-    
+    )
+
+# Заявки на сервис (ресепшн/админ), новые сверху; страницы по курсору before_id.
+# Без before_id и limit возвращается весь список, как раньше — на это рассчитывают старые клиенты
+@app.get("/reception/service-requests", tags=["Reception"], response_model=List[ServiceRequestForEmployeeSchema])
+async def get_all_service_requests(
+    db: AsyncSession = Depends(get_read_db),
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception])),
+    status_filter: Optional[ServiceRequestStatusEnum] = Query(None, alias="status"),
+    mine: bool = False,
+    escalated: Optional[bool] = None,
+    before_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=200)
+):
+    query = service_request_for_employee_query()
+    if status_filter:
+        query = query.where(ServiceRequest.status == status_filter)
+    if mine:
+        query = query.where(ServiceRequest.assigned_employee_id == current_employee.id)
+    if escalated is not None:
+        query = query.where(ServiceRequest.escalated_at.is_not(None) if escalated else ServiceRequest.escalated_at.is_(None))
+    if before_id:
+        query = query.where(ServiceRequest.id < before_id)
+    if limit is None and before_id:
+        limit = 50
+
+    query = query.order_by(ServiceRequest.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
     result = await db.execute(query)
     return result.scalars().all()
 
+# Очередь диспетчеризации: ожидающие заявки в порядке выдачи (приоритет, затем время создания)
+@app.get("/reception/service-requests/queue", tags=["Reception"], response_model=List[ServiceRequestForEmployeeSchema])
+async def get_service_request_queue(
+    db: AsyncSession = Depends(get_read_db),
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception])),
+    limit: int = Query(50, ge=1, le=200)
+):
+    query = service_request_for_employee_query().where(
+        ServiceRequest.status == ServiceRequestStatusEnum.requested
+    ).order_by(ServiceRequest.priority, ServiceRequest.created_at, ServiceRequest.id).limit(limit)
+
+    result = await db.execute(query)
+    return result.scalars().all()
+
+# Взять следующую заявку из очереди. Голова очереди читается по индексу (status, priority, created_at);
+# SKIP LOCKED пропускает строки, которые в этот момент берут другие сотрудники, поэтому
+# параллельные вызовы получают разные заявки и не ждут друг друга. Пустая очередь — 204
+@app.post("/reception/service-requests/claim-next", tags=["Reception"], response_model=ServiceRequestForEmployeeSchema)
+async def claim_next_service_request(
+    db: AsyncSession = Depends(get_db),
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception]))
+):
+    request_id = (await db.execute(
+        select(ServiceRequest.id)
+        .where(ServiceRequest.status == ServiceRequestStatusEnum.requested)
+        .order_by(ServiceRequest.priority, ServiceRequest.created_at, ServiceRequest.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )).scalar_one_or_none()
+    if request_id is None:
+        await db.rollback()
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+    await db.execute(
+        update(ServiceRequest)
+        .where(ServiceRequest.id == request_id)
+        .values(status=ServiceRequestStatusEnum.in_progress, assigned_employee_id=current_employee.id)
+    )
+    await db.commit()
+    await event_bus.publish("service_request_updated", {
+        "request_id": request_id, "status": ServiceRequestStatusEnum.in_progress.value, "employee_id": current_employee.id
+    })
+
+    result = await db.execute(service_request_for_employee_query().where(ServiceRequest.id == request_id))
+    return result.scalar_one()
+
 @app.get("/reception/service-requests/{request_id}", tags=["Reception"], response_model=ServiceRequestForEmployeeSchema)
 async def get_service_request_details(
     request_id: int,
@@ -1246,7 +2359,18 @@ async def get_service_request_details(
 
     return service_request
 
-# Обновление статуса заявки на сервис (ресепшн/админ)
+# Допустимые переходы статуса заявки: in_progress -> requested возвращает заявку в очередь
+SERVICE_REQUEST_TRANSITIONS = {
+    ServiceRequestStatusEnum.requested: {ServiceRequestStatusEnum.in_progress, ServiceRequestStatusEnum.cancelled},
+    ServiceRequestStatusEnum.in_progress: {
+        ServiceRequestStatusEnum.requested, ServiceRequestStatusEnum.completed, ServiceRequestStatusEnum.cancelled
+    },
+    ServiceRequestStatusEnum.completed: set(),
+    ServiceRequestStatusEnum.cancelled: set(),
+}
+
+# Обновление статуса заявки на сервис (ресепшн/админ). Переход проверяется и записывается
+# условным UPDATE по текущему статусу: из двух параллельных изменений проходит одно, второе получает 409
 @app.patch("/reception/service-requests/{request_id}", tags=["Reception"], response_model=ServiceRequestForEmployeeSchema)
 async def update_service_request_status(
     request_id: int,
@@ -1254,29 +2378,171 @@ async def update_service_request_status(
     db: AsyncSession = Depends(get_db),
     current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception]))
 ):
-    query = select(ServiceRequest).options(
-        selectinload(ServiceRequest.booking).options(
-            selectinload(Booking.user),
-            selectinload(Booking.room),
-            selectinload(Booking.employee)
-        ),
-        selectinload(ServiceRequest.service).selectinload(Service.translations)
-    ).where(ServiceRequest.id == request_id)
+    current = (await db.execute(
+        select(ServiceRequest.status, ServiceRequest.assigned_employee_id).where(ServiceRequest.id == request_id)
+    )).one_or_none()
+    if not current:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service request not found")
 
-    result = await db.execute(query)
-    service_request = result.scalar_one_or_none()
+    if status_update.status not in SERVICE_REQUEST_TRANSITIONS[current.status]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Cannot change service request status from '{current.status.value}' to '{status_update.status.value}'"
+        )
 
-    if not service_request:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service request not found")
+    values = {"status": status_update.status}
+    if status_update.status in (ServiceRequestStatusEnum.in_progress, ServiceRequestStatusEnum.completed):
+        values["assigned_employee_id"] = current_employee.id
+    elif status_update.status == ServiceRequestStatusEnum.requested:
+        values["assigned_employee_id"] = None
 
-    service_request.status = status_update.status
-    service_request.assigned_employee_id = current_employee.id
-    
-    db.add(service_request)
+    result = await db.execute(
+        update(ServiceRequest)
+        .where(ServiceRequest.id == request_id, ServiceRequest.status == current.status)
+        .values(**values)
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Service request was changed by someone else")
     await db.commit()
-    await db.refresh(service_request)
-    
-    return service_request
+    await event_bus.publish("service_request_updated", {
+        "request_id": request_id, "status": status_update.status.value,
+        "employee_id": values.get("assigned_employee_id", current.assigned_employee_id)
+    })
+
+    result = await db.execute(service_request_for_employee_query().where(ServiceRequest.id == request_id))
+    return result.scalar_one()
+
+# Смена приоритета пересчитывает срок SLA от времени создания и снимает отметку эскалации
+@app.patch("/reception/service-requests/{request_id}/priority", tags=["Reception"], response_model=ServiceRequestForEmployeeSchema)
+async def update_service_request_priority(
+    request_id: int,
+    priority_update: ServiceRequestPriorityUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception]))
+):
+    result = await db.execute(
+        update(ServiceRequest)
+        .where(
+            ServiceRequest.id == request_id,
+            ServiceRequest.status.in_([ServiceRequestStatusEnum.requested, ServiceRequestStatusEnum.in_progress])
+        )
+        .values(
+            priority=priority_update.priority,
+            sla_deadline=sla_deadline_for(priority_update.priority, ServiceRequest.created_at),
+            escalated_at=None
+        )
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        exists = (await db.execute(select(ServiceRequest.id).where(ServiceRequest.id == request_id))).scalar_one_or_none()
+        if exists is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service request not found")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Service request is already completed or cancelled")
+    await db.commit()
+    await event_bus.publish("service_request_updated", {
+        "request_id": request_id, "priority": priority_update.priority.value
+    })
+
+    result = await db.execute(service_request_for_employee_query().where(ServiceRequest.id == request_id))
+    return result.scalar_one()
+
+# Эскалация просроченных заявок: ожидающие поднимаются в начало очереди (urgent), о всех
+# просроченных сообщается ресепшену событием. Отметка escalated_at не даёт эскалировать повторно
+async def escalate_overdue_service_requests():
+    async with async_session_maker() as db:
+        overdue = (await db.execute(
+            select(ServiceRequest.id, ServiceRequest.booking_id, ServiceRequest.status, ServiceRequest.assigned_employee_id)
+            .where(
+                ServiceRequest.status.in_([ServiceRequestStatusEnum.requested, ServiceRequestStatusEnum.in_progress]),
+                ServiceRequest.sla_deadline < func.now(),
+                ServiceRequest.escalated_at.is_(None)
+            )
+            .order_by(ServiceRequest.sla_deadline)
+            .limit(SERVICE_SLA_BATCH)
+        )).all()
+        if not overdue:
+            return
+
+        ids = [row.id for row in overdue]
+        await db.execute(
+            update(ServiceRequest)
+            .where(ServiceRequest.id.in_(ids), ServiceRequest.status == ServiceRequestStatusEnum.requested)
+            .values(priority=ServiceRequestPriorityEnum.urgent)
+        )
+        await db.execute(
+            update(ServiceRequest)
+            .where(
+                ServiceRequest.id.in_(ids),
+                ServiceRequest.status.in_([ServiceRequestStatusEnum.requested, ServiceRequestStatusEnum.in_progress]),
+                ServiceRequest.escalated_at.is_(None)
+            )
+            .values(escalated_at=func.now())
+        )
+        await db.commit()
+
+    for row in overdue:
+        await event_bus.publish("service_request_escalated", {
+            "request_id": row.id, "booking_id": row.booking_id,
+            "status": row.status.value, "employee_id": row.assigned_employee_id
+        })
+    logging.warning(f"Escalated {len(overdue)} service requests past their SLA deadline")
+
+# Перенос переписки завершённых и отменённых броней в холодный архив пачками по ARCHIVE_BATCH броней.
+# Сегмент записывается на диск до удаления строк: при сбое между шагами бронь просто
+# попадёт в архив ещё раз, а чтение возьмёт её последнюю копию
+async def archive_completed_stays():
+    cutoff = datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    archived_bookings = archived_messages = 0
+    async with async_session_maker() as db:
+        while True:
+            booking_ids = (await db.execute(
+                select(Chat.booking_id.distinct())
+                .join(Booking, Booking.id == Chat.booking_id)
+                .where(
+                    Booking.status.in_([BookingStatusEnum.completed, BookingStatusEnum.cancelled]),
+                    Booking.check_out_date < cutoff
+                )
+                .order_by(Chat.booking_id)
+                .limit(ARCHIVE_BATCH)
+            )).scalars().all()
+            if not booking_ids:
+                break
+
+            chats = (await db.execute(
+                select(Chat.id, Chat.booking_id, Chat.type, Chat.status, Chat.assigned_employee_id, Chat.created_at)
+                .where(Chat.booking_id.in_(booking_ids))
+            )).all()
+            chat_ids = [chat.id for chat in chats]
+            messages = (await db.execute(
+                select(Message.chat_id, *MESSAGE_COLUMNS).where(Message.chat_id.in_(chat_ids)).order_by(Message.id)
+            )).all()
+
+            transcripts = {chat.id: {**chat._asdict(), "archived_at": datetime.now(timezone.utc), "messages": []} for chat in chats}
+            for message, rendered in zip(messages, await render_messages(db, messages)):
+                transcripts[message.chat_id]["messages"].append(rendered)
+            await run_in_threadpool(archive_store.write_segment, list(transcripts.values()))
+
+            await db.execute(delete(Message).where(Message.chat_id.in_(chat_ids)))
+            await db.execute(delete(Chat).where(Chat.id.in_(chat_ids)))
+            await db.commit()
+            archived_bookings += len(booking_ids)
+            archived_messages += len(messages)
+            if len(booking_ids) < ARCHIVE_BATCH:
+                break
+    if archived_bookings:
+        logging.info(f"Archived chats of {archived_bookings} bookings ({archived_messages} messages)")
+
+# Переписка брони из холодного архива (ресепшн/админ)
+@app.get("/reception/archive/bookings/{booking_id}/chats", tags=["Reception"], response_model=List[ArchivedChatSchema])
+async def get_archived_chats(
+    booking_id: int,
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception]))
+):
+    chats = await run_in_threadpool(archive_store.find, booking_id)
+    if not chats:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No archived chats for this booking")
+    return chats
 
 # Отправка сообщения в чат от сотрудника (ресепшн/админ)
 @app.post("/reception/chats/{chat_id}/messages", tags=["Reception"], response_model=MessageSchema)
@@ -1298,25 +2564,24 @@ async def send_message_as_employee(
     )
     db.add(new_message)
     await db.commit()
-    await db.refresh(new_message, attribute_names=['sender_employee', 'id', 'created_at'])
+    await db.refresh(new_message, attribute_names=['id', 'created_at'])
+    await event_bus.publish("message_created", {
+        "chat_id": chat_id, "booking_id": chat.booking_id, "message_id": new_message.id, "sender_type": SenderTypeEnum.employee
+    })
     
     return MessageSchema(
         id=new_message.id,
         content=new_message.content,
         created_at=new_message.created_at,
-        sender=SenderInfo(
-            id=current_employee.id,
-            first_name=current_employee.first_name,
-            last_name=current_employee.last_name,
-            patronymic=current_employee.patronymic,
-            type="employee"
-        )
+        sender=sender_info_from(current_employee, "employee")
     )
 
+# Открытые чаты; mine=true — чаты, назначенные текущему сотруднику (вручную или распределением)
 @app.get("/reception/chats", tags=["Reception"], response_model=List[ChatForReceptionSchema])
 async def get_all_chats(
     db: AsyncSession = Depends(get_db),
-    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception]))
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception])),
+    mine: bool = False
 ):
     last_message_subquery = (
         select(
@@ -1345,12 +2610,26 @@ async def get_all_chats(
                 selectinload(Booking.room)
             )
         )
-        .where(Chat.status == ChatStatusEnum.open)
+        .where(
+            and_(Chat.status == ChatStatusEnum.claimed, Chat.assigned_employee_id == current_employee.id)
+            if mine else Chat.status == ChatStatusEnum.open
+        )
         .order_by(Chat.id)
     )
 
     result = await db.execute(query)
 
+    if FAST_JSON_RESPONSES:
+        serialize_chat = compile_serializer(ChatForReceptionSchema)
+        serialize_last_message = compile_serializer(LastMessageSchema)
+        payload = []
+        for chat, last_message_data in result:
+            chat_data = serialize_chat(chat)
+            if last_message_data and last_message_data.id is not None:
+                chat_data["last_message"] = serialize_last_message(last_message_data)
+            payload.append(chat_data)
+        return fast_json_response(payload)
+
     response_data = []
     for chat, last_message_data in result:
         chat_schema = ChatForReceptionSchema.from_orm(chat)
@@ -1363,12 +2642,31 @@ async def get_all_chats(
     return response_data
 
 
+# Поток событий ресепшена (SSE): работает через все воркеры благодаря Redis pub/sub
+@app.get("/reception/events", tags=["Reception"])
+async def stream_reception_events(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception]))
+):
+    await db.close()
+    heartbeat = None
+    if CHAT_AUTO_ROUTING and current_employee.role == EmployeeRoleEnum.reception:
+        heartbeat = lambda: chat_router.heartbeat(current_employee.id)
+    return event_stream_response(
+        request,
+        ["message_created", "chat_claimed", "chat_released", "booking_updated", "room_status_changed", "rooms_bulk_changed",
+         "service_request_created", "service_request_updated", "service_request_escalated"],
+        heartbeat=heartbeat
+    )
+
 @app.get("/reception/chats/{chat_id}/messages", tags=["Reception"], response_model=List[MessageSchema])
 async def get_chat_messages_for_employee(
     chat_id: int,
     db: AsyncSession = Depends(get_db),
     current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception])),
     since_id: Optional[int] = None,
+    before_id: Optional[int] = None,
     limit: int = 35
 ):
     chat = await db.get(Chat, chat_id)
@@ -1377,104 +2675,99 @@ async def get_chat_messages_for_employee(
             status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found"
         )
 
-    query = (
-        select(Message)
-        .where(Message.chat_id == chat_id)
-        .options(
-            selectinload(Message.sender_user),
-            selectinload(Message.sender_employee)
-        )
-    )
-
-    if since_id:
-        query = query.where(Message.id > since_id).order_by(Message.id.asc())
-    else:
-        subquery = (
-            select(Message.id)
-            .where(Message.chat_id == chat_id)
-            .order_by(Message.id.desc())
-            .limit(limit)
-            .subquery()
-        )
-        query = (
-            query.where(Message.id.in_(select(subquery)))
-            .order_by(Message.id.asc())
-        )
-
-    result = await db.execute(query)
-    messages = result.scalars().all()
-
-    messages_with_sender = []
-    for msg in messages:
-        sender_info = None
-        if msg.sender_type == SenderTypeEnum.user and msg.sender_user:
-            sender_info = SenderInfo(
-                id=msg.sender_user.id, 
-                first_name=msg.sender_user.first_name, 
-                last_name=msg.sender_user.last_name,
-                patronymic=msg.sender_user.patronymic,
-                type="user"
-            )
-        elif msg.sender_type == SenderTypeEnum.employee and msg.sender_employee:
-            sender_info = SenderInfo(
-                id=msg.sender_employee.id, 
-                first_name=msg.sender_employee.first_name, 
-                last_name=msg.sender_employee.last_name,
-                patronymic=msg.sender_employee.patronymic,
-                type="employee"
-            )
-        elif msg.sender_type == SenderTypeEnum.ai:
-            sender_info = SenderInfo(id=0, first_name="AI", last_name="Assistant", type="ai")
-
-        messages_with_sender.append(
-            MessageSchema(
-                id=msg.id,
-                content=msg.content,
-                created_at=msg.created_at,
-                sender=sender_info,
-            )
-        )
+    messages, _ = await load_message_page(db, chat_id, limit, since_id=since_id, before_id=before_id, not_before=chat.created_at)
+    messages_with_sender = await render_messages(db, messages)
 
+    if FAST_JSON_RESPONSES:
+        return fast_json_list(MessageSchema, messages_with_sender)
     return messages_with_sender
 
-# Создание бронирования (ресепшн/админ)
-@app.post("/reception/bookings", tags=["Reception"], response_model=BookingSchema, status_code=status.HTTP_200_OK)
-async def create_booking(
-    booking_data: BookingCreate,
-    db: AsyncSession = Depends(get_db),
+# Поиск по переписке: слова короче innodb_ft_min_token_size в индексе нет, такие слова отбрасываются
+MESSAGE_SEARCH_MIN_WORD = int(os.getenv("MESSAGE_SEARCH_MIN_WORD", "3"))
+MESSAGE_SEARCH_MAX_WORDS = 8
+MESSAGE_SNIPPET_CHARS = 160
+
+def message_search_words(q):
+    words = [word.casefold() for word in re.findall(r"\w+", q) if len(word) >= MESSAGE_SEARCH_MIN_WORD]
+    return list(dict.fromkeys(words))[:MESSAGE_SEARCH_MAX_WORDS]
+
+# Все слова запроса обязательны и ищутся по началу: «завтрак» находит «завтраком»
+def message_search_filter(words):
+    return mysql_match(MessageSearch.content, against=" ".join(f"+{word}*" for word in words)).in_boolean_mode()
+
+# Фрагмент вокруг первого найденного слова и позиции всех найденных слов в нём
+def message_snippet(content, words):
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True)) + r")\w*", re.IGNORECASE)
+    matches = list(pattern.finditer(content))
+    first = matches[0].start() if matches else 0
+    end = min(len(content), max(first - MESSAGE_SNIPPET_CHARS // 3, 0) + MESSAGE_SNIPPET_CHARS)
+    start = max(end - MESSAGE_SNIPPET_CHARS, 0)
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(content) else ""
+    shift = len(prefix) - start
+    highlights = [[match.start() + shift, match.end() + shift] for match in matches if match.start() >= start and match.end() <= end]
+    return prefix + content[start:end] + suffix, highlights
+
+# Поиск сообщений по всему отелю, брони или чату, новые сверху; страницы по курсору before_id.
+# Читает FULLTEXT-индекс message_search; переписка из холодного архива в поиск не входит
+@app.get("/reception/messages/search", tags=["Reception"], response_model=MessageSearchPageSchema)
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    chat_id: Optional[int] = None,
+    booking_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
     current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception]))
 ):
+    words = message_search_words(q)
+    if not words:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Search query must contain a word of at least {MESSAGE_SEARCH_MIN_WORD} characters"
+        )
 
+    query = select(MessageSearch).where(message_search_filter(words))
+    if chat_id:
+        query = query.where(MessageSearch.chat_id == chat_id)
+    if booking_id:
+        query = query.where(MessageSearch.booking_id == booking_id)
+    if before_id:
+        query = query.where(MessageSearch.message_id < before_id)
+
+    rows = (await db.execute(query.order_by(MessageSearch.message_id.desc()).limit(limit + 1))).scalars().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    results = []
+    for row in rows:
+        snippet, highlights = message_snippet(row.content, words)
+        results.append(MessageSearchResultSchema(
+            message_id=row.message_id, chat_id=row.chat_id, booking_id=row.booking_id,
+            sender_type=row.sender_type, created_at=row.created_at, snippet=snippet, highlights=highlights
+        ))
+    return MessageSearchPageSchema(results=results, has_more=has_more, before_id=rows[-1].message_id if has_more else None)
+
+# Создание брони под блокировкой номера: проверка статуса и пересечений и вставка
+# выполняются в одной транзакции, параллельная бронь того же номера ждёт коммита
+async def book_room(db, booking_data: BookingCreate, employee: Employee):
     if booking_data.check_in_date > booking_data.check_out_date:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Check-out date must be after check-in date")
+    check_stay_length(booking_data.check_in_date, booking_data.check_out_date)
 
+    await begin_read_committed(db)
     user = await db.get(User, booking_data.user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    room = await db.get(Room, booking_data.room_id)
+    room = await lock_room(db, booking_data.room_id)
     if not room:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found")
 
     if room.status != RoomStatusEnum.available:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Room is not available")
 
-    overlapping_booking_query = select(Booking.id).where(
-        Booking.room_id == booking_data.room_id,
-        Booking.status != BookingStatusEnum.cancelled,
-        or_(
-            # Новое бронирование начинается во время существующего
-            (Booking.check_in_date <= booking_data.check_in_date) & (booking_data.check_in_date < Booking.check_out_date),
-            # Новое бронирование заканчивается во время существующего
-            (Booking.check_in_date < booking_data.check_out_date) & (booking_data.check_out_date <= Booking.check_out_date),
-            # Новое бронирование полностью "поглощает" существующее
-            (booking_data.check_in_date <= Booking.check_in_date) & (booking_data.check_out_date >= Booking.check_out_date)
-        )
-    ).limit(1)
-    
-    
-    result = await db.execute(overlapping_booking_query)
-    if result.scalar_one_or_none():
+    if await find_overlapping_booking(db, room.id, booking_data.check_in_date, booking_data.check_out_date):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="The room is already booked for the selected dates"
@@ -1485,7 +2778,7 @@ async def create_booking(
         room_id=booking_data.room_id,
         check_in_date=booking_data.check_in_date,
         check_out_date=booking_data.check_out_date,
-        employee_id=current_employee.id,
+        employee_id=employee.id,
         price_per_night=room.current_price_per_night
     )
     
@@ -1494,6 +2787,7 @@ async def create_booking(
     db.add(new_booking)
     db.add(room)
     await db.commit()
+    await publish_booking_change(new_booking, room)
     
     query = select(Booking).options(
         selectinload(Booking.user),
@@ -1502,14 +2796,351 @@ async def create_booking(
     ).where(Booking.id == new_booking.id)
     
     result = await db.execute(query)
-    created_booking = result.scalar_one()
+    return result.scalar_one()
+
+# Создание бронирования (ресепшн/админ). Повтор с тем же Idempotency-Key возвращает ту же бронь
+@app.post("/reception/bookings", tags=["Reception"], response_model=BookingSchema, status_code=status.HTTP_200_OK)
+async def create_booking(
+    request: Request,
+    booking_data: BookingCreate,
+    db: AsyncSession = Depends(get_db),
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception])),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    return await run_idempotent(
+        request, idempotency_key, current_employee, booking_data, BookingSchema, status.HTTP_200_OK,
+        lambda: book_room(db, booking_data, current_employee)
+    )
+
+BULK_BOOKING_MAX_ITEMS = int(os.getenv("BULK_BOOKING_MAX_ITEMS", "100"))
+BULK_BOOKING_ATTEMPTS = 3
+
+# Номера из room_ids, у которых есть действующая бронь, пересекающая даты (обычное чтение)
+async def find_busy_rooms(db, room_ids, check_in_date, check_out_date):
+    if not room_ids:
+        return set()
+    busy_query = select(Booking.room_id).where(
+        Booking.room_id.in_(room_ids),
+        *overlapping_bookings_filter(check_in_date, check_out_date)
+    ).distinct()
+    return set((await db.execute(busy_query)).scalars().all())
+
+# Распределение позиций группы по номерам: сначала конкретные номера, затем подбор по типу.
+# Возвращает отчёт по позициям и новые брони (index, booking, room), в БД ничего не пишет
+def allocate_bulk_rooms(items, rooms, busy_room_ids, known_users, bulk_data, employee_id):
+    rooms_by_id = {room.id: room for room in rooms}
+    free_by_type = {}
+    for room in rooms:
+        if room.status == RoomStatusEnum.available and room.id not in busy_room_ids:
+            free_by_type.setdefault(room.room_type_id, []).append(room)
+    taken = set()
+
+    def allocate(item):
+        if item.user_id not in known_users:
+            return None, "User not found"
+        if item.room_id:
+            room = rooms_by_id.get(item.room_id)
+            if not room:
+                return None, "Room not found"
+            if room.id in taken:
+                return None, "Room is requested twice in this group"
+            if room.status != RoomStatusEnum.available:
+                return None, "Room is not available"
+            if room.id in busy_room_ids:
+                return None, "The room is already booked for the selected dates"
+            return room, None
+        if item.room_type_id:
+            for room in free_by_type.get(item.room_type_id, ()):
+                if room.id not in taken:
+                    return room, None
+            return None, "No free rooms of this type for the selected dates"
+        return None, "room_id or room_type_id is required"
+
+    order = sorted(range(len(items)), key=lambda index: items[index].room_id is None)
+    results = [None] * len(items)
+    new_bookings = []
+    for index in order:
+        item = items[index]
+        room, error = allocate(item)
+        if error:
+            results[index] = BulkBookingItemResult(index=index, user_id=item.user_id, room_id=item.room_id, status="failed", detail=error)
+            continue
+        taken.add(room.id)
+        booking = Booking(
+            user_id=item.user_id,
+            room_id=room.id,
+            check_in_date=bulk_data.check_in_date,
+            check_out_date=bulk_data.check_out_date,
+            employee_id=employee_id,
+            price_per_night=room.current_price_per_night
+        )
+        new_bookings.append((index, booking, room))
+        results[index] = BulkBookingItemResult(index=index, user_id=item.user_id, room_id=room.id, room_number=room.room_number, status="booked")
+    return results, new_bookings
+
+# Групповое бронирование в одной транзакции READ COMMITTED: кандидаты и пересечения
+# читаются одним запросом без блокировок, свободные номера нужного типа распределяются
+# автоматически, блокируются только выбранные номера в порядке id (параллельные
+# групповые брони не взаимоблокируются)
+async def book_rooms_bulk(db, bulk_data: BulkBookingCreate, employee: Employee):
+    if bulk_data.check_in_date >= bulk_data.check_out_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Check-out date must be after check-in date")
+    check_stay_length(bulk_data.check_in_date, bulk_data.check_out_date)
+
+    items = list(bulk_data.items)
+    # Лимит проверяется до развёртывания count, иначе огромный count раздует список в памяти
+    if len(items) + (bulk_data.count or 0) > BULK_BOOKING_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {BULK_BOOKING_MAX_ITEMS} rooms can be booked in one request"
+        )
+    if bulk_data.count:
+        if not bulk_data.room_type_id or not bulk_data.user_id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="count requires room_type_id and user_id")
+        items += [BulkBookingItem(user_id=bulk_data.user_id, room_type_id=bulk_data.room_type_id)] * bulk_data.count
+
+    if not items:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No rooms requested")
+
+    # Откат между попытками сбрасывает загруженные объекты сессии, в том числе сотрудника
+    employee_id = employee.id
+    user_ids = {item.user_id for item in items}
+    room_ids = {item.room_id for item in items if item.room_id}
+    room_type_ids = {item.room_type_id for item in items if not item.room_id and item.room_type_id}
+
+    # Подбор идёт по обычному чтению, блокируются только выбранные номера (по возрастанию id,
+    # как и везде), после блокировки они проверяются заново. Если номер за это время заняли,
+    # подбор повторяется по свежим данным; на последней попытке такие позиции отклоняются
+    for attempt in range(BULK_BOOKING_ATTEMPTS):
+        await begin_read_committed(db)
+        known_users = set((await db.execute(select(User.id).where(User.id.in_(user_ids)))).scalars().all())
+        candidates_query = select(Room).where(or_(
+            Room.id.in_(room_ids),
+            Room.room_type_id.in_(room_type_ids) & (Room.status == RoomStatusEnum.available)
+        )).order_by(Room.id).execution_options(populate_existing=True)
+        rooms = (await db.execute(candidates_query)).scalars().all()
+        busy_room_ids = await find_busy_rooms(db, [room.id for room in rooms], bulk_data.check_in_date, bulk_data.check_out_date)
+
+        results, new_bookings = allocate_bulk_rooms(items, rooms, busy_room_ids, known_users, bulk_data, employee_id)
+        if bulk_data.all_or_nothing and any(result.status == "failed" for result in results):
+            break
+        picked_ids = sorted(room.id for _, _, room in new_bookings)
+        locked_query = select(Room).where(Room.id.in_(picked_ids)).order_by(Room.id).with_for_update().execution_options(populate_existing=True)
+        locked = (await db.execute(locked_query)).scalars().all() if picked_ids else []
+        lost = {room.id for room in locked if room.status != RoomStatusEnum.available}
+        lost |= await find_busy_rooms(db, picked_ids, bulk_data.check_in_date, bulk_data.check_out_date)
+        if not lost:
+            break
+        if attempt < BULK_BOOKING_ATTEMPTS - 1:
+            await db.rollback()
+            continue
+        for index, booking, room in list(new_bookings):
+            if room.id in lost:
+                new_bookings.remove((index, booking, room))
+                results[index] = BulkBookingItemResult(
+                    index=index, user_id=booking.user_id, room_id=items[index].room_id, status="failed",
+                    detail="The room was booked by a concurrent request"
+                )
+
+    failed = sum(1 for result in results if result.status == "failed")
+    if failed and bulk_data.all_or_nothing:
+        await db.rollback()
+        for index, _, _ in new_bookings:
+            results[index].status = "skipped"
+        return BulkBookingResponse(booked=0, failed=failed, items=results)
+
+    for _, booking, room in new_bookings:
+        room.status = RoomStatusEnum.occupied
+        db.add(booking)
+    await db.commit()
+
+    for index, booking, room in new_bookings:
+        results[index].booking_id = booking.id
+        await publish_booking_change(booking, room)
+
+    return BulkBookingResponse(booked=len(new_bookings), failed=failed, items=results)
+
+# Групповое бронирование (ресепшн/админ): отчёт по каждой позиции. При all_or_nothing
+# ошибка любой позиции отменяет всю группу
+@app.post("/reception/bookings/bulk", tags=["Reception"], response_model=BulkBookingResponse, status_code=status.HTTP_200_OK)
+async def create_bookings_bulk(
+    request: Request,
+    bulk_data: BulkBookingCreate,
+    db: AsyncSession = Depends(get_db),
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception])),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    return await run_idempotent(
+        request, idempotency_key, current_employee, bulk_data, BulkBookingResponse, status.HTTP_200_OK,
+        lambda: book_rooms_bulk(db, bulk_data, current_employee)
+    )
+
+FOLIO_MAX_BOOKINGS = 500
+CENTS = Decimal("0.01")
+
+# Счета для набора броней: одна выборка колонок брони и номера и один агрегат
+# выполненных заявок по (бронь, услуга), без загрузки ORM-связей. Деньги считаются
+# в Decimal; ночей — по календарным датам заезда и выезда, минимум одна
+async def compute_folios(db, booking_ids, lang=None):
+    bookings_query = select(
+        Booking.id, Booking.user_id, Booking.room_id, Room.room_number, Booking.status,
+        Booking.check_in_date, Booking.check_out_date, Booking.price_per_night
+    ).join(Room, Room.id == Booking.room_id).where(Booking.id.in_(booking_ids)).order_by(Booking.id)
+    bookings = (await db.execute(bookings_query)).all()
+
+    services_query = select(
+        ServiceRequest.booking_id, ServiceRequest.service_id,
+        func.count(ServiceRequest.id), func.sum(ServiceRequest.price)
+    ).where(
+        ServiceRequest.booking_id.in_(booking_ids),
+        ServiceRequest.status == ServiceRequestStatusEnum.completed
+    ).group_by(ServiceRequest.booking_id, ServiceRequest.service_id).order_by(ServiceRequest.service_id)
+    service_lines = {}
+    for booking_id, service_id, quantity, amount in (await db.execute(services_query)).all():
+        service_lines.setdefault(booking_id, []).append((service_id, quantity, Decimal(amount)))
+
+    catalog = await translation_catalog.services(
+        db, lang, required={service_id for lines in service_lines.values() for service_id, _, _ in lines}
+    ) if service_lines else {}
+
+    folios = {}
+    for booking_id, user_id, room_id, room_number, booking_status, check_in, check_out, price in bookings:
+        nights = max(1, (check_out.date() - check_in.date()).days)
+        room_total = (Decimal(price) * nights).quantize(CENTS)
+        lines = []
+        services_total = Decimal("0")
+        for service_id, quantity, amount in service_lines.get(booking_id, ()):
+            translations = catalog.get(service_id, {}).get("translations") or [{}]
+            lines.append({
+                "service_id": service_id, "name": translations[0].get("name"),
+                "quantity": quantity, "amount": float(amount.quantize(CENTS)),
+            })
+            services_total += amount
+        folios[booking_id] = {
+            "booking_id": booking_id,
+            "user_id": user_id,
+            "room_id": room_id,
+            "room_number": room_number,
+            "status": booking_status,
+            "check_in_date": check_in,
+            "check_out_date": check_out,
+            "nights": nights,
+            "price_per_night": float(price),
+            "room_total": float(room_total),
+            "services": lines,
+            "services_total": float(services_total.quantize(CENTS)),
+            "total": float((room_total + services_total).quantize(CENTS)),
+        }
+    return folios
+
+def check_folio_batch(booking_ids):
+    if not booking_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="booking_ids must not be empty")
+    if len(booking_ids) > FOLIO_MAX_BOOKINGS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {FOLIO_MAX_BOOKINGS} bookings per request")
+
+# Счёт по одной брони
+@app.get("/reception/bookings/{booking_id}/folio", tags=["Reception"], response_model=FolioSchema)
+async def get_booking_folio(
+    booking_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception])),
+    lang: Optional[LanguageCodeEnum] = Depends(get_language)
+):
+    folios = await compute_folios(db, [booking_id], lang)
+    if booking_id not in folios:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Booking not found")
+    return folios[booking_id]
+
+# Счета по списку броней (отсутствующие id пропускаются)
+@app.post("/reception/bookings/folios", tags=["Reception"], response_model=List[FolioSchema])
+async def get_booking_folios(
+    request_data: BookingIdsRequest,
+    db: AsyncSession = Depends(get_db),
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception])),
+    lang: Optional[LanguageCodeEnum] = Depends(get_language)
+):
+    check_folio_batch(request_data.booking_ids)
+    folios = await compute_folios(db, request_data.booking_ids, lang)
+    return list(folios.values())
+
+# Пакетный выезд: брони и номера блокируются, брони завершаются, номера освобождаются,
+# гости архивируются (как при PATCH со статусом completed), счета считаются в той же
+# транзакции. Уже завершённые, отменённые и несуществующие брони попадают в skipped
+@app.post("/reception/bookings/checkout", tags=["Reception"], response_model=BatchCheckoutResponse)
+async def checkout_bookings(
+    request_data: BookingIdsRequest,
+    db: AsyncSession = Depends(get_db),
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception])),
+    lang: Optional[LanguageCodeEnum] = Depends(get_language)
+):
+    check_folio_batch(request_data.booking_ids)
+
+    bookings_query = select(Booking).where(
+        Booking.id.in_(request_data.booking_ids),
+        Booking.status.in_([BookingStatusEnum.confirmed, BookingStatusEnum.active])
+    ).order_by(Booking.id).with_for_update().execution_options(populate_existing=True)
+    bookings = (await db.execute(bookings_query)).scalars().all()
+
+    rooms_query = select(Room).where(
+        Room.id.in_({booking.room_id for booking in bookings})
+    ).order_by(Room.id).with_for_update().execution_options(populate_existing=True)
+    rooms = {room.id: room for room in (await db.execute(rooms_query)).scalars().all()}
+
+    for booking in bookings:
+        booking.status = BookingStatusEnum.completed
+        rooms[booking.room_id].status = RoomStatusEnum.available
+    if bookings:
+        await db.execute(
+            update(User).where(User.id.in_({booking.user_id for booking in bookings}))
+            .values(status=UserStatusEnum.archived, archived_at=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        )
+        await db.flush()
+
+    folios = await compute_folios(db, [booking.id for booking in bookings], lang)
+    await db.commit()
 
-    return created_booking
+    for booking in bookings:
+        await publish_booking_change(booking, rooms[booking.room_id])
+
+    checked_out_ids = {booking.id for booking in bookings}
+    return BatchCheckoutResponse(
+        checked_out=[folios[booking.id] for booking in bookings],
+        skipped=[booking_id for booking_id in dict.fromkeys(request_data.booking_ids) if booking_id not in checked_out_ids]
+    )
+
+# Загрузка индекса идёт с основной БД: с отстающей реплики пропали бы гости,
+# которые уже пришли в индекс событием guest_updated
+async def load_guest_rows():
+    async with async_session_maker() as db:
+        result = await db.stream(
+            select(User.id, User.first_name, User.last_name, User.patronymic, User.phone_number)
+            .execution_options(yield_per=10000)
+        )
+        return [tuple(row) async for row in result]
+
+# Поиск гостей по началу имени, фамилии, отчества (в любой из записей ru/uz/en) и по цифрам
+# телефона: началу номера с кодом страны или без него, последним цифрам или любой их части.
+# Архивные гости тоже находятся — это возвращающиеся гости
+@app.get("/reception/guests/search", tags=["Reception"], response_model=List[UserSchema])
+async def search_guests(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception]))
+):
+    await guest_index.ensure_loaded(load_guest_rows)
+    user_ids = guest_index.search(q, limit)
+    if not user_ids:
+        return []
+    users = {user.id: user for user in (await db.execute(select(User).where(User.id.in_(user_ids)))).scalars()}
+    return [users[user_id] for user_id in user_ids if user_id in users]
 
 # Получение всех бронирований (ресепшн/админ)
 @app.get("/reception/getusers", tags=["Reception"], response_model=List[GetUserSchema])
 async def get_all_bookings(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception]))
 ):
     query = select(Booking).options(
@@ -1551,7 +3182,9 @@ async def get_all_bookings(
             "check_out_date": booking.check_out_date.isoformat(),
             "generated_password": password_to_return  
         })
-        
+
+    if FAST_JSON_RESPONSES:
+        return fast_json_list(GetUserSchema, response_data)
     return response_data
     
 
@@ -1632,11 +3265,13 @@ async def update_booking(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="New check-out date must be after check-in date"
                 )
+            check_stay_length(check_in, check_out)
             booking.check_out_date = update_data.check_out_date
 
         db.add(booking)
         await db.commit()
         await db.refresh(booking)
+        await publish_booking_change(booking, booking.room if update_data.status else None)
         
         return booking
 
@@ -1650,6 +3285,9 @@ async def update_booking(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Internal server error: {str(e)}"
         )
+
+    except HTTPException:
+        raise
     
     except Exception as e:
         raise HTTPException(
@@ -1658,13 +3296,8 @@ async def update_booking(
         )
 
 
-@app.post("/reception/users", tags=["Reception"], response_model=UserBookingResponse, status_code=status.HTTP_201_CREATED)
-async def create_user_and_book_room(
-    user_data: UserCreate,
-    db: AsyncSession = Depends(get_db),
-    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception])),
-    
-):
+async def register_guest(db, user_data: UserCreate, current_employee: Employee):
+    await begin_read_committed(db)
     user_query = select(User).where(User.phone_number == user_data.phone_number)
     user = (await db.execute(user_query)).scalar_one_or_none()
     
@@ -1705,7 +3338,7 @@ async def create_user_and_book_room(
         await db.commit()
         return UserBookingResponse(user=user, booking=None, generated_password=generated_password)
 
-    room = await db.get(Room, user_data.room_id)
+    room = await lock_room(db, user_data.room_id)
     if not room:
         raise HTTPException(status.HTTP_404_NOT_FOUND, f"Room with id {user_data.room_id} not found.")
 
@@ -1714,18 +3347,10 @@ async def create_user_and_book_room(
     
     if not user_data.check_out_date:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, "check_out_date is required")
+    check_stay_length(check_in_date, user_data.check_out_date)
     
     if room.status == RoomStatusEnum.available:
-        overlapping_booking_query = select(Booking.id).where(
-            Booking.room_id == user_data.room_id,
-            Booking.status.in_([BookingStatusEnum.confirmed, BookingStatusEnum.active]),
-            or_(
-                (Booking.check_in_date <= check_in_date) & (check_in_date < Booking.check_out_date),
-                (Booking.check_in_date < user_data.check_out_date) & (user_data.check_out_date <= Booking.check_out_date)
-            )
-        ).limit(1)
-        
-        if (await db.execute(overlapping_booking_query)).scalar_one_or_none():
+        if await find_overlapping_booking(db, room.id, check_in_date, user_data.check_out_date):
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="The room is already booked for the selected dates")
 
         new_booking = Booking(
@@ -1741,6 +3366,7 @@ async def create_user_and_book_room(
         room.status = RoomStatusEnum.occupied
         db.add(room)
         await db.commit()
+        await publish_booking_change(new_booking, room)
 
         query = select(Booking).options(
             selectinload(Booking.user),
@@ -1779,26 +3405,160 @@ async def create_user_and_book_room(
     else:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Room is currently unavailable (Status: {room.status.value})")
 
+# Регистрация гостя с заселением. Повтор с тем же Idempotency-Key возвращает тот же ответ
+@app.post("/reception/users", tags=["Reception"], response_model=UserBookingResponse, status_code=status.HTTP_201_CREATED)
+async def create_user_and_book_room(
+    request: Request,
+    user_data: UserCreate,
+    db: AsyncSession = Depends(get_db),
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception])),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    async def handler():
+        response = await register_guest(db, user_data, current_employee)
+        await event_bus.publish("guest_updated", response.user.model_dump(include={"id", "first_name", "last_name", "patronymic", "phone_number"}))
+        return response
+
+    return await run_idempotent(
+        request, idempotency_key, current_employee, user_data, UserBookingResponse, status.HTTP_201_CREATED, handler
+    )
+
+# Захват чата одним условным UPDATE: из параллельных захватов одного чата проходит только один
+async def try_claim_chat(db: AsyncSession, chat_id: int, employee_id: int) -> bool:
+    result = await db.execute(
+        update(Chat)
+        .where(Chat.id == chat_id, Chat.status == ChatStatusEnum.open)
+        .values(status=ChatStatusEnum.claimed, assigned_employee_id=employee_id)
+    )
+    return result.rowcount == 1
+
+async def route_chat(db: AsyncSession, chat_id: int, booking_id: int, preferred: Optional[int] = None) -> Optional[int]:
+    employee_id = await chat_router.pick(preferred)
+    if employee_id is None:
+        return None
+    if not await try_claim_chat(db, chat_id, employee_id):
+        # Чат уже занят: pick засчитал его сотруднику, возвращаем загрузку
+        await db.rollback()
+        await chat_router.add_load(employee_id, -1)
+        return None
+    await db.commit()
+    await event_bus.publish("chat_claimed", {
+        "chat_id": chat_id, "booking_id": booking_id, "employee_id": employee_id, "auto": True
+    })
+    return employee_id
+
+# Чаты сотрудников, которые вышли из сети, возвращаются в очередь и распределяются заново
+async def release_employee_chats(db: AsyncSession, employee_ids) -> int:
+    if not employee_ids:
+        return 0
+    chats = (await db.execute(
+        select(Chat.id, Chat.booking_id, Chat.assigned_employee_id).where(
+            Chat.type == ChatTypeEnum.RECEPTION,
+            Chat.status == ChatStatusEnum.claimed,
+            Chat.assigned_employee_id.in_(employee_ids)
+        )
+    )).all()
+    if not chats:
+        return 0
+
+    await db.execute(
+        update(Chat)
+        .where(Chat.id.in_([chat.id for chat in chats]), Chat.status == ChatStatusEnum.claimed)
+        .values(status=ChatStatusEnum.open, assigned_employee_id=None)
+    )
+    await db.commit()
+    for employee_id in {chat.assigned_employee_id for chat in chats}:
+        await chat_router.add_load(employee_id, -sum(1 for chat in chats if chat.assigned_employee_id == employee_id))
+    for chat in chats:
+        await event_bus.publish("chat_released", {
+            "chat_id": chat.id, "booking_id": chat.booking_id, "employee_id": chat.assigned_employee_id
+        })
+    for chat in chats:
+        if await route_chat(db, chat.id, chat.booking_id) is None:
+            break
+    return len(chats)
+
+async def rebalance_reception_chats():
+    online = await chat_router.online()
+    async with async_session_maker() as db:
+        offline_ids = (await db.execute(
+            select(Chat.assigned_employee_id.distinct())
+            .join(Employee, Employee.id == Chat.assigned_employee_id)
+            .where(
+                Chat.type == ChatTypeEnum.RECEPTION,
+                Chat.status == ChatStatusEnum.claimed,
+                Employee.role == EmployeeRoleEnum.reception,
+                Employee.id.not_in(list(online) or [0])
+            )
+        )).scalars().all()
+        released = await release_employee_chats(db, offline_ids)
+
+        # Загрузка в Redis пересчитывается из БД: счётчики могут разойтись, если воркер упал между шагами
+        loads = (await db.execute(
+            select(Chat.assigned_employee_id, func.count())
+            .where(Chat.type == ChatTypeEnum.RECEPTION, Chat.status == ChatStatusEnum.claimed)
+            .group_by(Chat.assigned_employee_id)
+        )).all()
+        await chat_router.set_loads({employee_id: count for employee_id, count in loads})
+
+        # Чаты, в которые гости писали, пока никого не было в сети
+        pending = (await db.execute(
+            select(Chat.id, Chat.booking_id)
+            .where(
+                Chat.type == ChatTypeEnum.RECEPTION,
+                Chat.status == ChatStatusEnum.open,
+                select(Message.id).where(Message.chat_id == Chat.id).exists()
+            )
+            .order_by(Chat.id)
+            .limit(CHAT_ROUTING_BATCH)
+        )).all()
+        routed = 0
+        for chat in pending:
+            if await route_chat(db, chat.id, chat.booking_id) is None:
+                break
+            routed += 1
+    if released or routed:
+        logging.info(f"Chat routing: released {released} chats of offline employees, routed {routed} pending chats")
+
 @app.patch("/reception/chats/{chat_id}/claim", tags=["Reception"], response_model=ChatClaimResponse)
 async def claim_chat(
     chat_id: int,
     db: AsyncSession = Depends(get_db),
     current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception]))
 ):
-    chat = await db.get(Chat, chat_id)
-    if not chat:
+    booking_id = (await db.execute(select(Chat.booking_id).where(Chat.id == chat_id))).scalar_one_or_none()
+    if booking_id is None:
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    if chat.status != ChatStatusEnum.open:
+    if not await try_claim_chat(db, chat_id, current_employee.id):
         raise HTTPException(status_code=409, detail="Chat is already claimed or closed")
 
-    chat.status = ChatStatusEnum.claimed
-    chat.assigned_employee_id = current_employee.id
-    
     await db.commit()
-    await db.refresh(chat)
+    await event_bus.publish("chat_claimed", {
+        "chat_id": chat_id, "booking_id": booking_id, "employee_id": current_employee.id
+    })
+    if CHAT_AUTO_ROUTING:
+        await chat_router.add_load(current_employee.id)
     
-    return chat
+    return {"id": chat_id, "status": ChatStatusEnum.claimed, "assigned_employee_id": current_employee.id}
+
+# Присутствие для распределения чатов: offline сразу возвращает чаты сотрудника в очередь
+@app.post("/reception/presence", tags=["Reception"], response_model=ReceptionPresenceResult)
+async def update_reception_presence(
+    presence: ReceptionPresenceUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.reception]))
+):
+    if not CHAT_AUTO_ROUTING or current_employee.role != EmployeeRoleEnum.reception:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Chat auto-routing is not enabled for this employee")
+
+    reassigned = 0
+    if presence.online:
+        await chat_router.heartbeat(current_employee.id, force=True)
+    else:
+        await chat_router.go_offline(current_employee.id)
+        reassigned = await release_employee_chats(db, [current_employee.id])
+    return {"employee_id": current_employee.id, "online": presence.online, "reassigned_chats": reassigned}
 
 # Логин для сотрудников (админ/ресепшн)
 @app.post("/admin/login", tags=["Admin"], response_model=Token)
@@ -1859,6 +3619,7 @@ async def create_employee(
     db.add(new_employee)
     await db.commit()
     await db.refresh(new_employee)
+    await event_bus.publish("employee_updated", {"employee_id": new_employee.id})
     
     return new_employee
 
@@ -1904,6 +3665,8 @@ async def update_employee_details(
     db.add(employee)
     await db.commit()
     await db.refresh(employee)
+    await resource_versions.bump("employees")
+    await event_bus.publish("employee_updated", {"employee_id": employee.id})
     return employee
 
 # Архивация сотрудника 
@@ -1925,9 +3688,262 @@ async def archive_employee(
     
     db.add(employee)
     await db.commit()
+    await resource_versions.bump("employees")
+    await event_bus.publish("employee_updated", {"employee_id": employee.id})
     
     return None
 
+# Пересчёт дневных агрегатов за окно дат одним INSERT ... SELECT: занятые ночи и выручка
+# по ценам броней, созданные и отменённые брони (по дате заезда), заявки на услуги
+# (выручка — только по выполненным, как в счетах).
+# Каждая пара (дата, тип номера) получает строку, в том числе нулевую
+ROLLUP_DAILY_STATS_SQL = """
+INSERT INTO daily_room_type_stats
+    (stat_date, room_type_id, rooms_total, occupied_room_nights, room_revenue,
+     bookings_created, cancellations, service_requests, service_revenue)
+WITH RECURSIVE dates (stat_date) AS (
+    SELECT CAST(:date_from AS DATE)
+    UNION ALL
+    SELECT stat_date + INTERVAL 1 DAY FROM dates WHERE stat_date < :date_to
+),
+inventory AS (
+    SELECT room_type_id, COUNT(*) AS rooms_total FROM rooms GROUP BY room_type_id
+),
+nights AS (
+    SELECT d.stat_date, r.room_type_id, COUNT(*) AS room_nights, SUM(b.price_per_night) AS revenue
+    FROM bookings b
+    JOIN rooms r ON r.id = b.room_id
+    JOIN dates d ON d.stat_date >= DATE(b.check_in_date) AND d.stat_date < DATE(b.check_out_date)
+    WHERE b.status IN ('confirmed', 'active', 'completed')
+      AND b.check_in_date < :window_end AND b.check_out_date > :date_from
+    GROUP BY d.stat_date, r.room_type_id
+),
+created AS (
+    SELECT DATE(b.created_at) AS stat_date, r.room_type_id, COUNT(*) AS bookings_created
+    FROM bookings b
+    JOIN rooms r ON r.id = b.room_id
+    WHERE b.created_at >= :date_from AND b.created_at < :window_end
+    GROUP BY DATE(b.created_at), r.room_type_id
+),
+cancelled AS (
+    SELECT DATE(b.check_in_date) AS stat_date, r.room_type_id, COUNT(*) AS cancellations
+    FROM bookings b
+    JOIN rooms r ON r.id = b.room_id
+    WHERE b.status = 'cancelled' AND b.check_in_date >= :date_from AND b.check_in_date < :window_end
+    GROUP BY DATE(b.check_in_date), r.room_type_id
+),
+services AS (
+    SELECT DATE(sr.created_at) AS stat_date, r.room_type_id,
+           COUNT(*) AS service_requests,
+           SUM(CASE WHEN sr.status = 'completed' THEN sr.price ELSE 0 END) AS service_revenue
+    FROM service_requests sr
+    JOIN bookings b ON b.id = sr.booking_id
+    JOIN rooms r ON r.id = b.room_id
+    WHERE sr.status <> 'cancelled' AND sr.created_at >= :date_from AND sr.created_at < :window_end
+    GROUP BY DATE(sr.created_at), r.room_type_id
+)
+SELECT d.stat_date, rt.id,
+       COALESCE(i.rooms_total, 0), COALESCE(n.room_nights, 0), COALESCE(n.revenue, 0),
+       COALESCE(c.bookings_created, 0), COALESCE(x.cancellations, 0),
+       COALESCE(s.service_requests, 0), COALESCE(s.service_revenue, 0)
+FROM dates d
+CROSS JOIN room_types rt
+LEFT JOIN inventory i ON i.room_type_id = rt.id
+LEFT JOIN nights n ON n.stat_date = d.stat_date AND n.room_type_id = rt.id
+LEFT JOIN created c ON c.stat_date = d.stat_date AND c.room_type_id = rt.id
+LEFT JOIN cancelled x ON x.stat_date = d.stat_date AND x.room_type_id = rt.id
+LEFT JOIN services s ON s.stat_date = d.stat_date AND s.room_type_id = rt.id
+"""
+
+# Окно пересчёта ограничено, чтобы рекурсивный CTE дат не упирался в cte_max_recursion_depth
+ANALYTICS_CHUNK_DAYS = 366
+ANALYTICS_MAX_RANGE_DAYS = 3 * 366
+ANALYTICS_DAYS_BACK = int(os.getenv("ANALYTICS_DAYS_BACK", "35"))
+ANALYTICS_DAYS_AHEAD = int(os.getenv("ANALYTICS_DAYS_AHEAD", "365"))
+ANALYTICS_INCREMENTAL_DAYS_AHEAD = int(os.getenv("ANALYTICS_INCREMENTAL_DAYS_AHEAD", "30"))
+
+# Старые строки окна удаляются и вставляются заново в одной транзакции:
+# отчёты видят либо прежние, либо новые агрегаты
+async def refresh_daily_stats(date_from: date, date_to: date):
+    chunk_start = date_from
+    async with async_session_maker() as db:
+        while chunk_start <= date_to:
+            chunk_end = min(date_to, chunk_start + timedelta(days=ANALYTICS_CHUNK_DAYS - 1))
+            await db.execute(delete(DailyRoomTypeStats).where(
+                DailyRoomTypeStats.stat_date >= chunk_start,
+                DailyRoomTypeStats.stat_date <= chunk_end
+            ))
+            await db.execute(text(ROLLUP_DAILY_STATS_SQL), {
+                "date_from": chunk_start, "date_to": chunk_end, "window_end": chunk_end + timedelta(days=1)
+            })
+            await db.commit()
+            chunk_start = chunk_end + timedelta(days=1)
+
+def hotel_today():
+    return datetime.now(ZoneInfo("Asia/Tashkent")).date()
+
+# Каждые 15 минут — вчера, сегодня и ближайшие дни, где меняется большинство броней
+async def refresh_recent_stats():
+    today = hotel_today()
+    await refresh_daily_stats(today - timedelta(days=1), today + timedelta(days=ANALYTICS_INCREMENTAL_DAYS_AHEAD))
+
+# Ночью — широкое окно: поздние отмены, выезды и правки дальних броней
+async def refresh_nightly_stats():
+    today = hotel_today()
+    await refresh_daily_stats(today - timedelta(days=ANALYTICS_DAYS_BACK), today + timedelta(days=ANALYTICS_DAYS_AHEAD))
+
+# Секции на год вперёд и удаление опустевших старых секций; на несекционированных таблицах ничего не делает
+async def maintain_partitions():
+    today = hotel_today()
+    async with async_session_maker() as db:
+        for partitions in (booking_partitions, message_partitions):
+            await partitions.ensure_future(db, today)
+            await partitions.drop_expired(db, today)
+
+job_runner.add_job(refresh_recent_stats, "interval", minutes=15)
+job_runner.add_job(maintain_partitions, "cron", hour=4, minute=40)
+job_runner.add_job(refresh_nightly_stats, "cron", hour=3, minute=10)
+job_runner.add_job(escalate_overdue_service_requests, "interval", seconds=SERVICE_SLA_CHECK_INTERVAL)
+if ARCHIVE_ENABLED:
+    job_runner.add_job(archive_completed_stays, "cron", hour=4, minute=20)
+if CHAT_AUTO_ROUTING:
+    job_runner.add_job(rebalance_reception_chats, "interval", seconds=int(os.getenv("CHAT_REBALANCE_INTERVAL", "30")))
+
+# Отчёт по занятости и выручке: читает только daily_room_type_stats
+@app.get("/admin/analytics/room-types", tags=["Admin"], response_model=List[RoomTypeStatsSchema])
+async def get_room_type_analytics(
+    date_from: date,
+    date_to: date,
+    group_by: AnalyticsGroupByEnum = AnalyticsGroupByEnum.month,
+    room_type_id: Optional[int] = None,
+    by_room_type: bool = True,
+    db: AsyncSession = Depends(get_read_db),
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.manager]))
+):
+    if date_from > date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from must not be after date_to")
+    if (date_to - date_from).days > ANALYTICS_MAX_RANGE_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Range is limited to {ANALYTICS_MAX_RANGE_DAYS} days")
+
+    keys = []
+    if group_by == AnalyticsGroupByEnum.day:
+        keys.append(func.date_format(DailyRoomTypeStats.stat_date, "%Y-%m-%d").label("period"))
+    elif group_by == AnalyticsGroupByEnum.month:
+        keys.append(func.date_format(DailyRoomTypeStats.stat_date, "%Y-%m").label("period"))
+    if by_room_type:
+        keys.append(DailyRoomTypeStats.room_type_id)
+
+    query = select(
+        *keys,
+        func.sum(DailyRoomTypeStats.rooms_total).label("room_nights_available"),
+        func.sum(DailyRoomTypeStats.occupied_room_nights).label("occupied_room_nights"),
+        func.sum(DailyRoomTypeStats.room_revenue).label("room_revenue"),
+        func.sum(DailyRoomTypeStats.service_revenue).label("service_revenue"),
+        func.sum(DailyRoomTypeStats.service_requests).label("service_requests"),
+        func.sum(DailyRoomTypeStats.bookings_created).label("bookings_created"),
+        func.sum(DailyRoomTypeStats.cancellations).label("cancellations"),
+    ).where(
+        DailyRoomTypeStats.stat_date >= date_from,
+        DailyRoomTypeStats.stat_date <= date_to
+    )
+    if room_type_id:
+        query = query.where(DailyRoomTypeStats.room_type_id == room_type_id)
+    if keys:
+        query = query.group_by(*keys).order_by(*keys)
+
+    report = []
+    for row in (await db.execute(query)).mappings():
+        if row["room_nights_available"] is None:
+            continue
+        available = int(row["room_nights_available"])
+        nights = int(row["occupied_room_nights"])
+        revenue = float(row["room_revenue"])
+        report.append({
+            "period": row.get("period", "total"),
+            "room_type_id": row.get("room_type_id"),
+            "room_nights_available": available,
+            "occupied_room_nights": nights,
+            "occupancy": round(nights / available, 4) if available else 0.0,
+            "room_revenue": revenue,
+            "adr": round(revenue / nights, 2) if nights else None,
+            "revpar": round(revenue / available, 2) if available else 0.0,
+            "service_revenue": float(row["service_revenue"]),
+            "service_requests": int(row["service_requests"]),
+            "bookings_created": int(row["bookings_created"]),
+            "cancellations": int(row["cancellations"]),
+        })
+    return report
+
+# Пересчёт агрегатов за произвольный период (первичное заполнение истории)
+@app.post("/admin/analytics/refresh", tags=["Admin"], response_model=AnalyticsRefreshResult)
+async def refresh_analytics(
+    refresh_data: AnalyticsRefreshRequest,
+    current_admin: Employee = Depends(require_role([EmployeeRoleEnum.admin]))
+):
+    if refresh_data.date_from > refresh_data.date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from must not be after date_to")
+
+    started = time.perf_counter()
+    await refresh_daily_stats(refresh_data.date_from, refresh_data.date_to)
+    return AnalyticsRefreshResult(
+        date_from=refresh_data.date_from,
+        date_to=refresh_data.date_to,
+        days=(refresh_data.date_to - refresh_data.date_from).days + 1,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 3)
+    )
+
+# Состояние планировщика и метрики задач на текущем воркере
+@app.get("/admin/jobs", tags=["Admin"], response_model=SchedulerStatusSchema)
+async def get_scheduler_status(
+    current_admin: Employee = Depends(require_role([EmployeeRoleEnum.admin]))
+):
+    return job_runner.stats()
+
+# Состояние реплик чтения в текущем воркере
+@app.get("/admin/replicas", tags=["Admin"], response_model=ReplicaRouterStatusSchema)
+async def get_replica_status(
+    current_admin: Employee = Depends(require_role([EmployeeRoleEnum.admin]))
+):
+    return replica_router.stats()
+
+@app.get("/admin/chat-routing", tags=["Admin"], response_model=ChatRoutingStatusSchema)
+async def get_chat_routing_status(
+    current_admin: Employee = Depends(require_role([EmployeeRoleEnum.admin, EmployeeRoleEnum.manager]))
+):
+    if not CHAT_AUTO_ROUTING:
+        return {"enabled": False, "employees": []}
+    online = await chat_router.online()
+    loads = await chat_router.loads()
+    return {
+        "enabled": True,
+        "employees": [
+            {
+                "employee_id": employee_id,
+                "online": employee_id in online,
+                "last_seen": datetime.fromtimestamp(online[employee_id]) if employee_id in online else None,
+                "load": loads.get(employee_id, 0),
+            }
+            for employee_id in sorted(set(online) | set(loads))
+        ],
+    }
+
+@app.get("/admin/ai/stats", tags=["Admin"], response_model=AIStatsSchema)
+async def get_ai_stats(
+    current_admin: Employee = Depends(require_role([EmployeeRoleEnum.admin]))
+):
+    return {
+        "provider": ai_provider.name,
+        "cache_enabled": AI_CACHE_ENABLED,
+        "cache": ai_cache.stats(),
+        "guard": ai_provider.stats(),
+    }
+
+@app.get("/admin/archive/stats", tags=["Admin"], response_model=ArchiveStatsSchema)
+async def get_archive_stats(
+    current_admin: Employee = Depends(require_role([EmployeeRoleEnum.admin]))
+):
+    return {"enabled": ARCHIVE_ENABLED, "after_days": ARCHIVE_AFTER_DAYS, **(await run_in_threadpool(archive_store.stats))}
+
 # Создание типа номера 
 @app.post("/admin/room-types", tags=["Admin"], response_model=RoomTypeSchema, status_code=status.HTTP_200_OK)
 async def create_room_type(
@@ -1953,19 +3969,28 @@ async def create_room_type(
     
     await db.commit()
     await db.refresh(new_room_type, attribute_names=['translations'])
+    await event_bus.publish("catalog_changed", {"room_type_id": new_room_type.id})
 
     return new_room_type
 
 # Получение всех типов номеров 
 @app.get("/admin/room-types", tags=["Admin"], response_model=List[RoomTypeSchema])
 async def get_all_room_types(
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
-    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin]))
+    current_employee: Employee = Depends(require_role([EmployeeRoleEnum.admin])),
+    lang: Optional[LanguageCodeEnum] = Depends(get_language)
 ):
-    query = select(RoomType)
-    result = await db.execute(query)
-    roomtype = result.scalars().all()
-    return roomtype
+    not_modified = conditional_get(
+        request, response,
+        "room-types", await translation_catalog.checksum(db, "room_types"), lang.value if lang else "default"
+    )
+    if not_modified:
+        return not_modified
+
+    room_types = await translation_catalog.room_types(db, lang)
+    return list(room_types.values())
 
 # Создание номера 
 @app.post("/admin/rooms", tags=["Admin"], response_model=RoomSchema, status_code=status.HTTP_200_OK)
@@ -1980,6 +4005,7 @@ async def create_room(
     new_room = Room(**room_data.dict())
     db.add(new_room)
     await db.commit()
+    await publish_room_change(new_room)
     
     query = select(Room).options(selectinload(Room.room_type).selectinload(RoomType.translations)).where(Room.id == new_room.id)
     result = await db.execute(query)
@@ -2004,12 +4030,169 @@ async def update_room(
         
     db.add(room)
     await db.commit()
+    await publish_room_change(room)
     
     query = select(Room).options(selectinload(Room.room_type).selectinload(RoomType.translations)).where(Room.id == room.id)
     result = await db.execute(query)
     
     return result.scalar_one()
 
+ROOM_IMPORT_BATCH_SIZE = int(os.getenv("ROOM_IMPORT_BATCH_SIZE", "500"))
+ROOM_IMPORT_MAX_ERRORS = 100
+
+# Построчное чтение тела запроса без загрузки файла целиком в память
+async def iter_body_lines(request: Request):
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+async def upsert_rooms(db, rows, update_status):
+    upsert = mysql_insert(Room).values(rows)
+    columns = {
+        "room_type_id": upsert.inserted.room_type_id,
+        "current_price_per_night": upsert.inserted.current_price_per_night,
+    }
+    # Занятый номер (с действующей бронью) остаётся occupied: статус из файла к нему не применяется
+    if update_status:
+        columns["status"] = case(
+            (Room.status == RoomStatusEnum.occupied, Room.status),
+            else_=upsert.inserted.status
+        )
+    await db.execute(upsert.on_duplicate_key_update(**columns))
+
+# Импорт номеров из CSV (заголовок room_number,room_type_id,current_price_per_night[,status])
+# или NDJSON. Строки проверяются по одной и пишутся пачками INSERT ... ON DUPLICATE KEY UPDATE
+# по room_number, каждая пачка в своей транзакции. Статус существующего номера меняется,
+# только если он указан в строке и номер не занят
+@app.post("/admin/rooms/import", tags=["Admin"], response_model=RoomImportResult)
+async def import_rooms(
+    request: Request,
+    import_format: Optional[str] = Query(None, alias="format"),
+    dry_run: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_admin: Employee = Depends(require_role([EmployeeRoleEnum.admin]))
+):
+    content_type = request.headers.get("content-type", "")
+    import_format = import_format or ("csv" if "csv" in content_type else "ndjson" if "ndjson" in content_type or "jsonl" in content_type else None)
+    if import_format not in ("csv", "ndjson"):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv or application/x-ndjson, or pass format=csv|ndjson"
+        )
+
+    room_type_ids = set((await db.execute(select(RoomType.id))).scalars().all())
+    await db.commit()
+
+    result = RoomImportResult(rows=0, batches=0, failed=0, dry_run=dry_run, errors=[])
+    pending = {True: [], False: []}
+    header = None
+
+    async def flush(with_status):
+        rows = pending[with_status]
+        if rows and not dry_run:
+            await upsert_rooms(db, rows, with_status)
+            await db.commit()
+            result.batches += 1
+        pending[with_status] = []
+
+    def reject(line_number, detail):
+        result.failed += 1
+        if len(result.errors) < ROOM_IMPORT_MAX_ERRORS:
+            result.errors.append(RoomImportError(line=line_number, detail=detail))
+
+    line_number = 0
+    async for raw_line in iter_body_lines(request):
+        line_number += 1
+        line = raw_line.decode("utf-8-sig" if line_number == 1 else "utf-8", errors="replace").strip()
+        if not line:
+            continue
+
+        try:
+            if import_format == "csv":
+                values = next(csv.reader([line]))
+                if header is None:
+                    header = [column.strip() for column in values]
+                    missing = {"room_number", "room_type_id", "current_price_per_night"} - set(header)
+                    if missing:
+                        raise HTTPException(
+                            status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"CSV header is missing columns: {', '.join(sorted(missing))}"
+                        )
+                    continue
+                data = {column: value.strip() or None for column, value in zip(header, values)}
+            else:
+                data = orjson.loads(line)
+            row = RoomImportRow.model_validate(data)
+        except ValidationError as e:
+            reject(line_number, "; ".join(
+                f"{'.'.join(map(str, error['loc']))}: {error['msg']}" if error["loc"] else error["msg"] for error in e.errors()
+            ))
+            continue
+        except (orjson.JSONDecodeError, csv.Error) as e:
+            reject(line_number, str(e))
+            continue
+
+        if row.room_type_id not in room_type_ids:
+            reject(line_number, f"Room type {row.room_type_id} not found")
+            continue
+
+        with_status = row.status is not None
+        pending[with_status].append({
+            "room_number": row.room_number,
+            "room_type_id": row.room_type_id,
+            "current_price_per_night": row.current_price_per_night,
+            "status": row.status or RoomStatusEnum.available,
+        })
+        result.rows += 1
+        if len(pending[with_status]) >= ROOM_IMPORT_BATCH_SIZE:
+            await flush(with_status)
+
+    await flush(False)
+    await flush(True)
+
+    if result.batches:
+        await resource_versions.bump("rooms", "room-details")
+        await event_bus.publish("rooms_bulk_changed", {"rows": result.rows})
+    return result
+
+# Массовая смена статуса номеров одним UPDATE по фильтрам (префикс номера — этаж,
+# тип, текущий статус, список id). Занятые номера без явного current_status не трогаются
+@app.patch("/admin/rooms/status", tags=["Admin"], response_model=RoomBulkStatusResult)
+async def update_rooms_status(
+    update_data: RoomBulkStatusUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_admin: Employee = Depends(require_role([EmployeeRoleEnum.admin]))
+):
+    conditions = []
+    if update_data.room_number_prefix:
+        conditions.append(Room.room_number.startswith(update_data.room_number_prefix, autoescape=True))
+    if update_data.room_type_id:
+        conditions.append(Room.room_type_id == update_data.room_type_id)
+    if update_data.room_ids:
+        conditions.append(Room.id.in_(update_data.room_ids))
+    if update_data.current_status:
+        conditions.append(Room.status == update_data.current_status)
+
+    if not conditions:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="At least one filter is required")
+    if not update_data.current_status:
+        conditions.append(Room.status != RoomStatusEnum.occupied)
+
+    result = await db.execute(
+        update(Room).where(*conditions).values(status=update_data.status).execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+    if result.rowcount:
+        await resource_versions.bump("rooms", "room-details")
+        await event_bus.publish("rooms_bulk_changed", {"rows": result.rowcount, "status": update_data.status})
+    return RoomBulkStatusResult(matched=result.rowcount)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,25 @@
+-- Уникальный чат каждого типа на бронирование: нужен для атомарного
+-- upsert в POST /user/chats (INSERT ... ON DUPLICATE KEY UPDATE).
+
+-- Перенос сообщений из дублей в самый ранний чат брони
+UPDATE `messages` m
+JOIN `chats` c ON c.`id` = m.`chat_id`
+JOIN (
+  SELECT `booking_id`, `type`, MIN(`id`) AS keep_id
+  FROM `chats`
+  GROUP BY `booking_id`, `type`
+  HAVING COUNT(*) > 1
+) d ON d.`booking_id` = c.`booking_id` AND d.`type` = c.`type`
+SET m.`chat_id` = d.keep_id
+WHERE c.`id` <> d.keep_id;
+
+-- Удаление дублей
+DELETE c FROM `chats` c
+JOIN (
+  SELECT `booking_id`, `type`, MIN(`id`) AS keep_id
+  FROM `chats`
+  GROUP BY `booking_id`, `type`
+) d ON d.`booking_id` = c.`booking_id` AND d.`type` = c.`type`
+WHERE c.`id` <> d.keep_id;
+
+ALTER TABLE `chats` ADD UNIQUE KEY `uq_chats_booking_type` (`booking_id`, `type`);
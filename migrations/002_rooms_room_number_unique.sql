@@ -0,0 +1,10 @@
+-- Уникальный номер комнаты: ключ для импорта номеров
+-- (INSERT ... ON DUPLICATE KEY UPDATE в POST /admin/rooms/import).
+--
+-- Дубли не объединяются автоматически — на них ссылаются бронирования.
+-- Если ALTER завершится ошибкой, найдите их запросом ниже и исправьте вручную:
+--
+--   SELECT `room_number`, GROUP_CONCAT(`id`) FROM `rooms`
+--   GROUP BY `room_number` HAVING COUNT(*) > 1;
+
+ALTER TABLE `rooms` ADD UNIQUE KEY `uq_rooms_room_number` (`room_number`);
@@ -0,0 +1,26 @@
+-- Дневные агрегаты по типам номеров для /admin/analytics.
+-- Заполняются периодическими задачами (каждые 15 минут — ближайшее окно,
+-- ночью — широкое). Историю можно пересчитать через POST /admin/analytics/refresh.
+
+CREATE TABLE `daily_room_type_stats` (
+  `stat_date` date NOT NULL,
+  `room_type_id` int unsigned NOT NULL,
+  `rooms_total` int unsigned NOT NULL DEFAULT '0',
+  `occupied_room_nights` int unsigned NOT NULL DEFAULT '0',
+  `room_revenue` decimal(12,2) NOT NULL DEFAULT '0.00',
+  `bookings_created` int unsigned NOT NULL DEFAULT '0',
+  `cancellations` int unsigned NOT NULL DEFAULT '0',
+  `service_requests` int unsigned NOT NULL DEFAULT '0',
+  `service_revenue` decimal(12,2) NOT NULL DEFAULT '0.00',
+  `refreshed_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`stat_date`, `room_type_id`),
+  KEY `room_type_id` (`room_type_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Окна пересчёта выбираются по датам, а не полным сканированием
+ALTER TABLE `bookings`
+  ADD KEY `idx_bookings_check_in_date` (`check_in_date`),
+  ADD KEY `idx_bookings_check_out_date` (`check_out_date`),
+  ADD KEY `idx_bookings_created_at` (`created_at`);
+
+ALTER TABLE `service_requests` ADD KEY `idx_service_requests_created_at` (`created_at`);
@@ -0,0 +1,17 @@
+-- Очередь заявок на сервис: приоритет, срок по SLA и отметка эскалации.
+-- Следующая заявка берётся по индексу (status, priority, created_at) с
+-- FOR UPDATE SKIP LOCKED; задача эскалации читает индекс (status, sla_deadline).
+
+ALTER TABLE `service_requests`
+  ADD COLUMN `priority` enum('urgent','high','normal','low') CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'normal' AFTER `status`,
+  ADD COLUMN `sla_deadline` timestamp NULL DEFAULT NULL AFTER `priority`,
+  ADD COLUMN `escalated_at` timestamp NULL DEFAULT NULL AFTER `sla_deadline`;
+
+-- Срок для существующих заявок — час от создания (SLA приоритета normal по умолчанию)
+UPDATE `service_requests` SET `sla_deadline` = `created_at` + INTERVAL 60 MINUTE;
+
+-- Незакрытые заявки старше часа будут эскалированы при первом запуске задачи SLA
+ALTER TABLE `service_requests`
+  MODIFY `sla_deadline` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  ADD KEY `idx_service_requests_queue` (`status`, `priority`, `created_at`),
+  ADD KEY `idx_service_requests_sla` (`status`, `sla_deadline`);
@@ -0,0 +1,129 @@
+-- Помесячное RANGE-секционирование bookings (по check_in_date) и messages (по created_at).
+-- Границы секций — полночь первого числа месяца по времени отеля (Asia/Tashkent, +05:00)
+-- в секундах Unix; p_old — всё до 2025-01, pmax — всё после последнего месяца.
+-- Новые секции заранее добавляет задача maintain_partitions (PARTITION_MONTHS_AHEAD).
+--
+-- Ограничения MySQL для секционированных таблиц:
+--   * внешних ключей нет ни у самих таблиц, ни ссылок на них — целостность
+--     обеспечивает приложение (брони и чаты не удаляются, переписку удаляет только архивация);
+--   * первичный ключ включает столбец секционирования: (id, check_in_date) и (id, created_at).
+--
+-- ALTER перестраивает таблицы целиком: на больших таблицах выполняйте в окно
+-- обслуживания или через pt-online-schema-change / gh-ost.
+--
+-- Проверка пересечений броней читает только брони, заехавшие не раньше check_in - MAX_STAY_DAYS
+-- (по умолчанию 90), поэтому действующая бронь длиннее этого срока пропала бы из проверки.
+-- Миграция прерывается с ошибкой 1242 (Subquery returns more than 1 row), пока такие брони есть;
+-- при другом MAX_STAY_DAYS поменяйте интервал. Найти их:
+--
+--   SELECT `id`, `check_in_date`, `check_out_date` FROM `bookings`
+--   WHERE `status` IN ('confirmed', 'active') AND `check_out_date` > `check_in_date` + INTERVAL 90 DAY;
+--
+-- Их нужно разбить на несколько броней или завершить до применения миграции.
+DO (
+  SELECT 1 FROM (SELECT 1 AS `n` UNION ALL SELECT 2) AS `long_stay_guard`
+  WHERE EXISTS (
+    SELECT 1 FROM `bookings`
+    WHERE `status` IN ('confirmed', 'active') AND `check_out_date` > `check_in_date` + INTERVAL 90 DAY
+  )
+);
+
+ALTER TABLE `chats` DROP FOREIGN KEY `fk_chats_booking`;
+ALTER TABLE `service_requests` DROP FOREIGN KEY `fk_service_requests_booking`;
+ALTER TABLE `messages`
+  DROP FOREIGN KEY `messages_ibfk_1`,
+  DROP FOREIGN KEY `messages_ibfk_2`,
+  DROP FOREIGN KEY `messages_ibfk_3`;
+ALTER TABLE `bookings`
+  DROP FOREIGN KEY `bookings_ibfk_1`,
+  DROP FOREIGN KEY `bookings_ibfk_2`,
+  DROP FOREIGN KEY `bookings_ibfk_3`;
+
+ALTER TABLE `bookings` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `check_in_date`);
+-- Заселённые гости выбираются дашбордом без границы по дате (см. active_bookings_filter)
+ALTER TABLE `bookings` ADD KEY `idx_bookings_status` (`status`);
+ALTER TABLE `messages` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `created_at`);
+
+ALTER TABLE `bookings`
+PARTITION BY RANGE (UNIX_TIMESTAMP(`check_in_date`)) (
+  PARTITION p_old VALUES LESS THAN (1735671600),
+  PARTITION p202501 VALUES LESS THAN (1738350000),
+  PARTITION p202502 VALUES LESS THAN (1740769200),
+  PARTITION p202503 VALUES LESS THAN (1743447600),
+  PARTITION p202504 VALUES LESS THAN (1746039600),
+  PARTITION p202505 VALUES LESS THAN (1748718000),
+  PARTITION p202506 VALUES LESS THAN (1751310000),
+  PARTITION p202507 VALUES LESS THAN (1753988400),
+  PARTITION p202508 VALUES LESS THAN (1756666800),
+  PARTITION p202509 VALUES LESS THAN (1759258800),
+  PARTITION p202510 VALUES LESS THAN (1761937200),
+  PARTITION p202511 VALUES LESS THAN (1764529200),
+  PARTITION p202512 VALUES LESS THAN (1767207600),
+  PARTITION p202601 VALUES LESS THAN (1769886000),
+  PARTITION p202602 VALUES LESS THAN (1772305200),
+  PARTITION p202603 VALUES LESS THAN (1774983600),
+  PARTITION p202604 VALUES LESS THAN (1777575600),
+  PARTITION p202605 VALUES LESS THAN (1780254000),
+  PARTITION p202606 VALUES LESS THAN (1782846000),
+  PARTITION p202607 VALUES LESS THAN (1785524400),
+  PARTITION p202608 VALUES LESS THAN (1788202800),
+  PARTITION p202609 VALUES LESS THAN (1790794800),
+  PARTITION p202610 VALUES LESS THAN (1793473200),
+  PARTITION p202611 VALUES LESS THAN (1796065200),
+  PARTITION p202612 VALUES LESS THAN (1798743600),
+  PARTITION p202701 VALUES LESS THAN (1801422000),
+  PARTITION p202702 VALUES LESS THAN (1803841200),
+  PARTITION p202703 VALUES LESS THAN (1806519600),
+  PARTITION p202704 VALUES LESS THAN (1809111600),
+  PARTITION p202705 VALUES LESS THAN (1811790000),
+  PARTITION p202706 VALUES LESS THAN (1814382000),
+  PARTITION p202707 VALUES LESS THAN (1817060400),
+  PARTITION p202708 VALUES LESS THAN (1819738800),
+  PARTITION p202709 VALUES LESS THAN (1822330800),
+  PARTITION p202710 VALUES LESS THAN (1825009200),
+  PARTITION p202711 VALUES LESS THAN (1827601200),
+  PARTITION p202712 VALUES LESS THAN (1830279600),
+  PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+ALTER TABLE `messages`
+PARTITION BY RANGE (UNIX_TIMESTAMP(`created_at`)) (
+  PARTITION p_old VALUES LESS THAN (1735671600),
+  PARTITION p202501 VALUES LESS THAN (1738350000),
+  PARTITION p202502 VALUES LESS THAN (1740769200),
+  PARTITION p202503 VALUES LESS THAN (1743447600),
+  PARTITION p202504 VALUES LESS THAN (1746039600),
+  PARTITION p202505 VALUES LESS THAN (1748718000),
+  PARTITION p202506 VALUES LESS THAN (1751310000),
+  PARTITION p202507 VALUES LESS THAN (1753988400),
+  PARTITION p202508 VALUES LESS THAN (1756666800),
+  PARTITION p202509 VALUES LESS THAN (1759258800),
+  PARTITION p202510 VALUES LESS THAN (1761937200),
+  PARTITION p202511 VALUES LESS THAN (1764529200),
+  PARTITION p202512 VALUES LESS THAN (1767207600),
+  PARTITION p202601 VALUES LESS THAN (1769886000),
+  PARTITION p202602 VALUES LESS THAN (1772305200),
+  PARTITION p202603 VALUES LESS THAN (1774983600),
+  PARTITION p202604 VALUES LESS THAN (1777575600),
+  PARTITION p202605 VALUES LESS THAN (1780254000),
+  PARTITION p202606 VALUES LESS THAN (1782846000),
+  PARTITION p202607 VALUES LESS THAN (1785524400),
+  PARTITION p202608 VALUES LESS THAN (1788202800),
+  PARTITION p202609 VALUES LESS THAN (1790794800),
+  PARTITION p202610 VALUES LESS THAN (1793473200),
+  PARTITION p202611 VALUES LESS THAN (1796065200),
+  PARTITION p202612 VALUES LESS THAN (1798743600),
+  PARTITION p202701 VALUES LESS THAN (1801422000),
+  PARTITION p202702 VALUES LESS THAN (1803841200),
+  PARTITION p202703 VALUES LESS THAN (1806519600),
+  PARTITION p202704 VALUES LESS THAN (1809111600),
+  PARTITION p202705 VALUES LESS THAN (1811790000),
+  PARTITION p202706 VALUES LESS THAN (1814382000),
+  PARTITION p202707 VALUES LESS THAN (1817060400),
+  PARTITION p202708 VALUES LESS THAN (1819738800),
+  PARTITION p202709 VALUES LESS THAN (1822330800),
+  PARTITION p202710 VALUES LESS THAN (1825009200),
+  PARTITION p202711 VALUES LESS THAN (1827601200),
+  PARTITION p202712 VALUES LESS THAN (1830279600),
+  PARTITION pmax VALUES LESS THAN MAXVALUE
+);
@@ -0,0 +1,40 @@
+-- Полнотекстовый поиск по переписке. Секционированная messages не может иметь
+-- FULLTEXT-индекс, поэтому текст сообщений дублируется в несекционированную
+-- message_search вместе с чатом и бронью. Таблицу поддерживают триггеры на messages:
+-- новое сообщение попадает в поиск в той же транзакции, удалённое (архивация) — исчезает.
+--
+-- Стоп-слова InnoDB отключаются на время создания индекса: иначе в нём нет слов
+-- вроде «will», «what», «about», и поиск по ним ничего не находит. Слова короче
+-- innodb_ft_min_token_size (по умолчанию 3) не индексируются, API их отбрасывает.
+
+CREATE TABLE `message_search` (
+  `message_id` bigint unsigned NOT NULL,
+  `chat_id` bigint unsigned NOT NULL,
+  `booking_id` bigint unsigned NOT NULL,
+  `sender_type` enum('user','employee','ai') CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `content` text CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL,
+  PRIMARY KEY (`message_id`),
+  KEY `idx_message_search_chat` (`chat_id`, `message_id`),
+  KEY `idx_message_search_booking` (`booking_id`, `message_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+DROP TRIGGER IF EXISTS `messages_search_insert`;
+CREATE TRIGGER `messages_search_insert` AFTER INSERT ON `messages` FOR EACH ROW
+  INSERT INTO `message_search` (`message_id`, `chat_id`, `booking_id`, `sender_type`, `created_at`, `content`)
+  SELECT NEW.`id`, NEW.`chat_id`, `chats`.`booking_id`, NEW.`sender_type`, NEW.`created_at`, NEW.`content`
+  FROM `chats` WHERE `chats`.`id` = NEW.`chat_id`;
+
+DROP TRIGGER IF EXISTS `messages_search_delete`;
+CREATE TRIGGER `messages_search_delete` AFTER DELETE ON `messages` FOR EACH ROW
+  DELETE FROM `message_search` WHERE `message_id` = OLD.`id`;
+
+-- Существующая переписка. Триггеры уже работают, поэтому сообщения, пришедшие
+-- во время переноса, пропускаются (IGNORE). Индекс строится после заполнения — так быстрее
+INSERT IGNORE INTO `message_search` (`message_id`, `chat_id`, `booking_id`, `sender_type`, `created_at`, `content`)
+SELECT `messages`.`id`, `messages`.`chat_id`, `chats`.`booking_id`, `messages`.`sender_type`, `messages`.`created_at`, `messages`.`content`
+FROM `messages` JOIN `chats` ON `chats`.`id` = `messages`.`chat_id`;
+
+SET SESSION innodb_ft_enable_stopword = OFF;
+ALTER TABLE `message_search` ADD FULLTEXT KEY `ft_message_search_content` (`content`);
+SET SESSION innodb_ft_enable_stopword = ON;
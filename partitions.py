@@ -0,0 +1,91 @@
+import logging
+import re
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import text
+
+HOTEL_TZ = ZoneInfo("Asia/Tashkent")
+MONTHLY_PARTITION = re.compile(r"^p(\d{4})(\d{2})$")
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# Граница секции — полночь первого числа месяца по времени отеля в секундах Unix:
+# таблицы секционируются по UNIX_TIMESTAMP(столбца TIMESTAMP), и граница не зависит от time_zone сессии
+def month_bound(month):
+    return int(datetime(month.year, month.month, 1, tzinfo=HOTEL_TZ).timestamp())
+
+
+def partition_name(month):
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+def partition_definition(month):
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ({month_bound(add_months(month, 1))})"
+
+
+# Помесячные RANGE-секции таблицы: секция pYYYYMM содержит строки своего месяца,
+# p_old — всё, что раньше первой помесячной секции, pmax — всё после последней.
+# ensure_future заранее отрезает от pmax секции на months_ahead месяцев вперёд (pmax
+# при этом пуста, перестройка мгновенная); drop_expired удаляет секции старше
+# retention_months, только если они уже пусты (переписку вычищает архивация)
+class MonthlyPartitions:
+    def __init__(self, table, months_ahead=12, retention_months=0):
+        self.table = table
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+
+    async def months(self, conn):
+        rows = (await conn.execute(text(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION"
+        ), {"table": self.table})).scalars().all()
+        if not rows:
+            return None
+        return [
+            date(int(match.group(1)), int(match.group(2)), 1)
+            for match in (MONTHLY_PARTITION.match(name) for name in rows) if match
+        ]
+
+    async def ensure_future(self, conn, today):
+        months = await self.months(conn)
+        if months is None:
+            return []
+        target = add_months(date(today.year, today.month, 1), self.months_ahead)
+        month = add_months(months[-1], 1) if months else date(today.year, today.month, 1)
+        missing = []
+        while month <= target:
+            missing.append(month)
+            month = add_months(month, 1)
+        if missing:
+            definitions = ", ".join([partition_definition(month) for month in missing] + ["PARTITION pmax VALUES LESS THAN MAXVALUE"])
+            await conn.execute(text(f"ALTER TABLE `{self.table}` REORGANIZE PARTITION pmax INTO ({definitions})"))
+            logging.info(f"Added partitions to {self.table}: {', '.join(partition_name(month) for month in missing)}")
+        return missing
+
+    async def drop_expired(self, conn, today):
+        if not self.retention_months:
+            return []
+        months = await self.months(conn)
+        if not months:
+            return []
+        cutoff = add_months(date(today.year, today.month, 1), -self.retention_months)
+        dropped = []
+        for month in months:
+            if month >= cutoff:
+                break
+            name = partition_name(month)
+            has_rows = (await conn.execute(text(f"SELECT 1 FROM `{self.table}` PARTITION ({name}) LIMIT 1"))).first()
+            if has_rows:
+                logging.warning(f"Partition {self.table}.{name} is past retention but still has rows, keeping it")
+                continue
+            await conn.execute(text(f"ALTER TABLE `{self.table}` DROP PARTITION {name}"))
+            dropped.append(name)
+        if dropped:
+            logging.info(f"Dropped expired partitions of {self.table}: {', '.join(dropped)}")
+        return dropped
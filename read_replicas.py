@@ -0,0 +1,106 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+
+class Replica:
+    def __init__(self, url):
+        self.engine = create_async_engine(url, pool_pre_ping=True)
+        self.session_maker = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.host = self.engine.url.host
+        self.lag = None
+        self.checked_at = 0.0
+        self.last_error = None
+
+    async def read_lag(self):
+        async with self.engine.connect() as connection:
+            try:
+                status = (await connection.execute(text("SHOW REPLICA STATUS"))).mappings().first()
+                column = "Seconds_Behind_Source"
+            except Exception:
+                # MySQL до 8.0.22
+                status = (await connection.execute(text("SHOW SLAVE STATUS"))).mappings().first()
+                column = "Seconds_Behind_Master"
+        if status is None:
+            raise RuntimeError("server is not a replica")
+        if status[column] is None:
+            raise RuntimeError("replication is not running")
+        return int(status[column])
+
+
+# Маршрутизация чтений на реплики. Отставание каждой реплики проверяется в фоне
+# раз в check_interval секунд; запрос получает реплику по кругу среди тех, что
+# отстают не больше max_lag секунд и проверены недавно. Если таких нет —
+# вызывающий код остаётся на основной БД
+class ReplicaRouter:
+    def __init__(self, urls, max_lag=2, check_interval=5):
+        self.replicas = [Replica(url) for url in urls]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._cycle = itertools.count()
+        self._task = None
+        self.primary_fallbacks = 0
+
+    def _is_usable(self, replica):
+        fresh = time.monotonic() - replica.checked_at < self.check_interval * 3
+        return fresh and replica.lag is not None and replica.lag <= self.max_lag
+
+    def pick(self):
+        if not self.replicas:
+            return None
+        usable = [replica for replica in self.replicas if self._is_usable(replica)]
+        if not usable:
+            self.primary_fallbacks += 1
+            return None
+        return usable[next(self._cycle) % len(usable)].session_maker
+
+    async def _check(self, replica):
+        try:
+            replica.lag = await asyncio.wait_for(replica.read_lag(), timeout=self.check_interval)
+            replica.last_error = None
+        except Exception as e:
+            if replica.last_error != str(e):
+                logging.warning(f"Replica {replica.host} is unavailable for reads: {e}")
+            replica.lag = None
+            replica.last_error = str(e)
+        replica.checked_at = time.monotonic()
+
+    async def _loop(self):
+        while True:
+            await asyncio.gather(*(self._check(replica) for replica in self.replicas))
+            await asyncio.sleep(self.check_interval)
+
+    def stats(self):
+        return {
+            "max_lag": self.max_lag,
+            "primary_fallbacks": self.primary_fallbacks,
+            "replicas": [
+                {
+                    "host": replica.host,
+                    "lag": replica.lag,
+                    "usable": self._is_usable(replica),
+                    "last_error": replica.last_error,
+                }
+                for replica in self.replicas
+            ],
+        }
+
+    def start(self):
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
@@ -32,6 +32,9 @@ PREVIOUS_HOTEL_STATE: Dict[str, Dict] = {}
 
 NOTIFICATIONS_SENT: Dict[str, bool] = {}
 
+# Не больше, чем принимает POST /reception/bookings/checkout за один запрос (FOLIO_MAX_BOOKINGS)
+CHECKOUT_BATCH_SIZE = 500
+
 
 class APIClient:
     def __init__(self, base_url: str, username: str, password: str):
@@ -40,6 +43,8 @@ class APIClient:
         self._password = password
         self._token: Optional[str] = None
         self._client = httpx.AsyncClient(timeout=20.0)
+        # Последний ответ GET-запросов с ETag: URL -> (etag, данные)
+        self._etag_cache: Dict[str, tuple] = {}
 
     async def login(self) -> bool:
         logging.info("Попытка входа в API...")
@@ -66,22 +71,38 @@ class APIClient:
                 return None
 
         try:
-            response = await self._client.request(method, url, **kwargs)
-            response.raise_for_status()
-            return response.json()
+            return await self._send(method, url, **kwargs)
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 401:
                 logging.warning("Токен истек. Повторный вход...")
                 if await self.login():
-                    response = await self._client.request(method, url, **kwargs)
-                    response.raise_for_status()
-                    return response.json()
+                    return await self._send(method, url, **kwargs)
             logging.error(f"Ошибка API запроса {method} {url}: {e.response.status_code} {e.response.text}")
             return None
         except Exception as e:
             logging.error(f"Критическая ошибка при запросе {method} {url}: {e}")
             return None
 
+    # GET-запросы отправляются с If-None-Match: на 304 возвращаются сохранённые данные
+    async def _send(self, method: str, url: str, **kwargs) -> Any:
+        cache_key = None
+        if method == "GET":
+            cache_key = str(httpx.URL(url, params=kwargs.get("params")))
+            cached = self._etag_cache.get(cache_key)
+            if cached:
+                kwargs["headers"] = {**kwargs.get("headers", {}), "If-None-Match": cached[0]}
+
+        response = await self._client.request(method, url, **kwargs)
+        if response.status_code == 304 and cache_key in self._etag_cache:
+            return self._etag_cache[cache_key][1]
+        response.raise_for_status()
+
+        data = response.json()
+        etag = response.headers.get("etag")
+        if cache_key and etag:
+            self._etag_cache[cache_key] = (etag, data)
+        return data
+
     async def get_rooms(self) -> Optional[List[Dict]]:
         return await self._make_request("GET", f"{self._base_url}/reception/rooms")
 
@@ -99,6 +120,13 @@ class APIClient:
     async def get_all_bookings(self) -> Optional[List[Dict]]:
         return await self._make_request("GET", f"{self._base_url}/reception/getusers")
 
+    async def checkout_bookings(self, booking_ids: List[int]) -> Optional[Dict]:
+        return await self._make_request(
+            "POST",
+            f"{self._base_url}/reception/bookings/checkout",
+            json={"booking_ids": booking_ids}
+        )
+
     async def close(self):
         await self._client.aclose()
 
@@ -117,6 +145,7 @@ async def automated_checkout_process(bot: Bot, api_client: APIClient, chat_id: i
     # Устанавливаем часовой пояс один раз
     tashkent_tz = timezone("Asia/Tashkent")
     now_tashkent = datetime.now(tashkent_tz)
+    overdue_bookings = {}
 
     for booking in all_bookings:
         booking_status = booking.get("booking_status")
@@ -136,22 +165,10 @@ async def automated_checkout_process(bot: Bot, api_client: APIClient, chat_id: i
             logging.error(f"Не удалось обработать check_out_date для бронирования {booking_id}: {e}")
             continue
 
-        # 1. ЛОГИКА АВТОМАТИЧЕСКОГО ВЫСЕЛЕНИЯ
+        # 1. ЛОГИКА АВТОМАТИЧЕСКОГО ВЫСЕЛЕНИЯ: просроченные брони собираются и выселяются одним запросом
         if checkout_date <= now_tashkent:
             logging.info(f"ACTION: Найдено просроченное бронирование ID {booking_id}. Запуск выселения...")
-            
-            # Вызываем PATCH-эндпоинт для обновления статуса
-            response = await api_client._make_request(
-                "PATCH",
-                f"{api_client._base_url}/reception/bookings/{booking_id}",
-                json={"status": "completed"}
-            )
-            if response:
-                guest_name = booking.get("last_name", "Гость")
-                # Примечание: в этом ответе нет номера комнаты, уведомление будет более общим
-                await send_message_with_retry(
-                    bot, chat_id, f"✅ **Автоматическое выселение**\nГость: {guest_name}\nБронь ID: {booking_id}"
-                )
+            overdue_bookings[booking_id] = booking
             continue # Переходим к следующему бронированию
 
         # 2. ЛОГИКА УВЕДОМЛЕНИЙ (остается без изменений)
@@ -171,6 +188,28 @@ async def automated_checkout_process(bot: Bot, api_client: APIClient, chat_id: i
                 NOTIFICATIONS_SENT[notification_key] = True
                 break
 
+    if not overdue_bookings:
+        return
+
+    # Пакетный выезд со счетами вместо PATCH на каждую бронь, пачками по CHECKOUT_BATCH_SIZE.
+    # Неудачная пачка не останавливает остальные, её брони попадут в следующий проход
+    booking_ids = list(overdue_bookings)
+    for start in range(0, len(booking_ids), CHECKOUT_BATCH_SIZE):
+        batch = booking_ids[start:start + CHECKOUT_BATCH_SIZE]
+        response = await api_client.checkout_bookings(batch)
+        if not response:
+            logging.warning(f"Задача выселения: пакет из {len(batch)} бронирований не обработан.")
+            continue
+
+        for folio in response.get("checked_out", []):
+            guest_name = overdue_bookings.get(folio["booking_id"], {}).get("last_name", "Гость")
+            await send_message_with_retry(
+                bot, chat_id,
+                f"✅ **Автоматическое выселение**\nГость: {guest_name}\nКомната: {folio['room_number']}\n"
+                f"Бронь ID: {folio['booking_id']}\nНочей: {folio['nights']}\n"
+                f"Проживание: {folio['room_total']:.2f}\nУслуги: {folio['services_total']:.2f}\nИтого: {folio['total']:.2f}"
+            )
+
 
 def load_json_file(filename: str) -> Dict:
     try:
@@ -0,0 +1,168 @@
+# Нагрузочная проверка двойных бронирований: много параллельных POST /reception/bookings
+# на одни и те же номера и даты (часть запросов — повторы с тем же Idempotency-Key).
+# На каждый номер должна появиться ровно одна бронь. Если задан --database,
+# пересечения дополнительно ищутся SQL-запросом по таблице bookings.
+#
+#   python tools/booking_stress.py --base-url http://localhost:8000 \
+#       --username reception --password secret --rooms 1 2 3 4 --attempts 50 --cleanup
+#
+# Номера должны быть в статусе available. Код выхода 1 — найдено двойное бронирование.
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+
+OVERLAPS_SQL = """
+SELECT a.room_id, a.id, b.id
+FROM bookings a
+JOIN bookings b ON a.room_id = b.room_id AND a.id < b.id
+WHERE a.status IN ('confirmed', 'active') AND b.status IN ('confirmed', 'active')
+  AND a.check_in_date < b.check_out_date AND b.check_in_date < a.check_out_date
+"""
+
+
+async def login(client, username, password):
+    response = await client.post("/admin/login", json={"username": username, "password": password})
+    response.raise_for_status()
+    client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+
+async def create_guests(client, count, seed):
+    rng = random.Random(seed)
+    guest_ids = []
+    for i in range(count):
+        response = await client.post("/reception/users", json={
+            "first_name": "Stress", "last_name": f"Guest{i}",
+            "phone_number": f"+99877{rng.randrange(10 ** 7):07d}",
+        })
+        response.raise_for_status()
+        guest_ids.append(response.json()["user"]["id"])
+    return guest_ids
+
+
+async def attempt(client, semaphore, payload, idempotency_key):
+    async with semaphore:
+        started = time.perf_counter()
+        response = await client.post(
+            "/reception/bookings", json=payload, headers={"Idempotency-Key": idempotency_key}
+        )
+        elapsed = time.perf_counter() - started
+    booking_id = response.json().get("id") if response.status_code == 200 else None
+    return payload["room_id"], response.status_code, booking_id, elapsed
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def find_overlaps_in_db(database_url):
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(database_url)
+    try:
+        async with engine.connect() as connection:
+            return (await connection.execute(text(OVERLAPS_SQL))).all()
+    finally:
+        await engine.dispose()
+
+
+async def stress(client, args):
+    await login(client, args.username, args.password)
+    guest_ids = await create_guests(client, args.guests, args.seed)
+
+    check_in = (datetime.now() + timedelta(days=args.days_ahead)).replace(hour=14, minute=0, second=0, microsecond=0)
+    check_out = check_in + timedelta(days=args.nights)
+
+    tasks = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+    rng = random.Random(args.seed)
+    for room_id in args.rooms:
+        requests = [
+            ({
+                "user_id": rng.choice(guest_ids), "room_id": room_id,
+                "check_in_date": check_in.isoformat(), "check_out_date": check_out.isoformat(),
+            }, uuid.uuid4().hex)
+            for _ in range(args.attempts)
+        ]
+        # Повторы уже отправленного запроса с тем же ключом имитируют двойной клик и ретраи клиента
+        requests += [rng.choice(requests) for _ in range(args.replays)]
+        for payload, key in requests:
+            tasks.append(attempt(client, semaphore, payload, key))
+    rng.shuffle(tasks)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*tasks)
+    total = time.perf_counter() - started
+
+    statuses = Counter(status_code for _, status_code, _, _ in results)
+    bookings_by_room = defaultdict(set)
+    for room_id, status_code, booking_id, _ in results:
+        if booking_id is not None:
+            bookings_by_room[room_id].add(booking_id)
+    latencies = [elapsed * 1000 for _, _, _, elapsed in results]
+
+    print(f"requests={len(results)} rooms={len(args.rooms)} total={total:.2f}s rps={len(results) / total:.1f}")
+    print(f"statuses: {dict(sorted(statuses.items()))}")
+    print(
+        f"latency ms: p50={statistics.median(latencies):.1f} "
+        f"p95={percentile(latencies, 0.95):.1f} max={max(latencies):.1f}"
+    )
+
+    double_booked = {room_id: ids for room_id, ids in bookings_by_room.items() if len(ids) > 1}
+    for room_id in args.rooms:
+        print(f"room {room_id}: bookings={sorted(bookings_by_room.get(room_id, ()))}")
+
+    if args.database:
+        overlaps = await find_overlaps_in_db(args.database)
+        print(f"overlapping booking pairs in DB: {len(overlaps)}")
+        for room_id, first_id, second_id in overlaps:
+            double_booked.setdefault(room_id, {first_id, second_id})
+
+    if args.cleanup:
+        for ids in bookings_by_room.values():
+            for booking_id in ids:
+                await client.patch(f"/reception/bookings/{booking_id}", json={"status": "cancelled"})
+
+    unexpected = [code for code in statuses if code not in (200, 409)]
+    if double_booked:
+        print(f"DOUBLE BOOKINGS: {double_booked}")
+    if unexpected:
+        print(f"unexpected statuses: {unexpected}")
+    return not double_booked and not unexpected
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--rooms", type=int, nargs="+", required=True)
+    parser.add_argument("--attempts", type=int, default=50, help="разных запросов на номер")
+    parser.add_argument("--replays", type=int, default=10, help="повторов с тем же Idempotency-Key на номер")
+    parser.add_argument("--guests", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--days-ahead", type=int, default=30)
+    parser.add_argument("--nights", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database", help="async URL БД для проверки пересечений SQL-запросом")
+    parser.add_argument("--cleanup", action="store_true", help="отменить созданные брони")
+    args = parser.parse_args()
+
+    async def run():
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=60.0) as client:
+            return await stress(client, args)
+
+    sys.exit(0 if asyncio.run(run()) else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
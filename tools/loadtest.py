@@ -0,0 +1,355 @@
+# Нагрузочный прогон всего API смешанным трафиком. Виртуальные пользователи:
+#   guest     — гости с активной бронью: опрос броней, сообщений чата, услуг, изредка
+#               сообщения ресепшену и заказ услуг (с If-None-Match, как клиентские приложения)
+#   bot       — Telegram-бот: синхронизация /reception/rooms и чатов раз в --bot-interval,
+#               проход выселения (/reception/getusers) раз в --sweep-interval
+#   reception — сотрудник ресепшена: дашборд, чаты, ответы гостям, заявки, брони и счета
+#   ai        — гости, пишущие в AI-чат (только с --ai; API запускается с AI_PROVIDER=local,
+#               иначе меряется внешний API). С --ai-stream — потоковый вариант и время
+#               до первого фрагмента отдельной строкой
+# Данные берутся из манифеста tools/seed_data.py. По каждому эндпоинту печатаются
+# p50/p95/p99; --output сохраняет результат в JSON, --baseline сравнивает с прошлым прогоном
+# и завершает процесс с кодом 1, если p95 или p99 выросли больше допустимого.
+#
+#   python tools/loadtest.py --base-url http://localhost:8000 --manifest loadtest_manifest.json \
+#       --username reception --password secret --duration 120 --guests 200 --receptionists 5 \
+#       --output results/2.4.json --baseline results/2.3.json
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import httpx
+import orjson
+
+MIXES = {
+    "guest": [
+        (30, "GET /user/bookings"),
+        (35, "GET /user/chats/{id}/messages"),
+        (10, "GET /user/services"),
+        (8, "GET /user/service-requests"),
+        (7, "GET /user/profile"),
+        (6, "POST /user/chats/{id}/messages"),
+        (4, "POST /user/service-requests"),
+    ],
+    "reception": [
+        (20, "GET /reception/rooms"),
+        (15, "GET /reception/chats"),
+        (15, "GET /reception/chats/{id}/messages"),
+        (10, "POST /reception/chats/{id}/messages"),
+        (8, "GET /reception/service-requests"),
+        (5, "PATCH /reception/service-requests/{id}"),
+        (12, "GET /reception/bookings/{id}"),
+        (10, "GET /reception/bookings/{id}/folio"),
+        (5, "PATCH /reception/chats/{id}/claim"),
+    ],
+}
+GUEST_TEXTS = ["Во сколько завтрак?", "Принесите воды, пожалуйста", "What time is check-out?", "Wifi ishlamayapti"]
+# Ожидаемые ответы, которые не считаются ошибкой (повторный claim и т.п.)
+EXPECTED_STATUSES = {200, 201, 304, 409}
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+
+    def add(self, endpoint, status_code, elapsed):
+        self.latencies[endpoint].append(elapsed * 1000)
+        self.statuses[endpoint][status_code] += 1
+        if status_code not in EXPECTED_STATUSES:
+            self.errors[endpoint] += 1
+
+    def summary(self, duration):
+        return {
+            endpoint: {
+                "count": len(values),
+                "rps": round(len(values) / duration, 2),
+                "errors": self.errors[endpoint],
+                "statuses": {str(code): count for code, count in sorted(self.statuses[endpoint].items())},
+                "p50": round(percentile(values, 0.50), 2),
+                "p95": round(percentile(values, 0.95), 2),
+                "p99": round(percentile(values, 0.99), 2),
+                "max": round(max(values), 2),
+            }
+            for endpoint, values in sorted(self.latencies.items())
+        }
+
+
+class Session:
+    # Клиент одного виртуального пользователя: свой токен и свой кэш ETag
+    def __init__(self, client, recorder):
+        self.client = client
+        self.recorder = recorder
+        self.headers = {}
+        self.etags = {}
+
+    async def call(self, endpoint, method, url, **kwargs):
+        headers = dict(self.headers)
+        cache_key = (url, tuple(sorted(kwargs.get("params", {}).items())))
+        if method == "GET" and cache_key in self.etags:
+            headers["If-None-Match"] = self.etags[cache_key]
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.add(endpoint, 0, time.perf_counter() - started)
+            return None
+        self.recorder.add(endpoint, response.status_code, time.perf_counter() - started)
+        if method == "GET" and response.headers.get("etag"):
+            self.etags[cache_key] = response.headers["etag"]
+        if response.status_code >= 300 or not response.content:
+            return None
+        return response.json()
+
+    # SSE-ответ: отдельно время до первого фрагмента (то, что видит гость) и до конца потока
+    async def stream(self, endpoint, url, **kwargs):
+        started = time.perf_counter()
+        first_chunk = None
+        try:
+            async with self.client.stream("POST", url, headers=self.headers, **kwargs) as response:
+                async for line in response.aiter_lines():
+                    if first_chunk is None and line.startswith("event: chunk"):
+                        first_chunk = time.perf_counter() - started
+        except httpx.HTTPError:
+            self.recorder.add(endpoint, 0, time.perf_counter() - started)
+            return
+        self.recorder.add(endpoint, response.status_code, time.perf_counter() - started)
+        if first_chunk is not None:
+            self.recorder.add(f"{endpoint} (first chunk)", response.status_code, first_chunk)
+
+    async def login(self, endpoint, url, payload):
+        data = await self.call(endpoint, "POST", url, json=payload)
+        if data is None:
+            return False
+        self.headers["Authorization"] = f"Bearer {data['access_token']}"
+        return True
+
+
+async def think(rng, args):
+    await asyncio.sleep(rng.expovariate(1 / args.think_time) if args.think_time > 0 else 0)
+
+
+def weighted(rng, mix):
+    return rng.choices([name for _, name in mix], weights=[weight for weight, _ in mix])[0]
+
+
+async def guest_user(session, rng, args, manifest, deadline, ai=False):
+    guest = rng.choice(manifest["guests"])
+    if not await session.login("POST /auth/login", "/auth/login", {
+        "phone_number": guest["phone_number"], "password": guest["password"]
+    }):
+        return
+    chat_type = "AI" if ai else "RECEPTION"
+    chat = await session.call("POST /user/chats", "POST", "/user/chats", json={"type": chat_type})
+    services = await session.call("GET /user/services", "GET", "/user/services") or []
+    if chat is None:
+        return
+    chat_id = chat["id"]
+    last_message_id = chat["messages"][-1]["id"] if chat["messages"] else None
+
+    while time.monotonic() < deadline:
+        await think(rng, args)
+        if ai and args.ai_stream:
+            await session.stream("POST /user/chats/{id}/messages/stream", f"/user/chats/{chat_id}/messages/stream",
+                                 json={"content": rng.choice(GUEST_TEXTS)})
+            continue
+        if ai:
+            await session.call("POST /user/chats/{id}/messages (AI)", "POST", f"/user/chats/{chat_id}/messages",
+                               json={"content": rng.choice(GUEST_TEXTS)})
+            continue
+
+        action = weighted(rng, MIXES["guest"])
+        if action == "GET /user/bookings":
+            await session.call(action, "GET", "/user/bookings")
+        elif action == "GET /user/chats/{id}/messages":
+            params = {"since_id": last_message_id} if last_message_id else {}
+            messages = await session.call(action, "GET", f"/user/chats/{chat_id}/messages", params=params)
+            if messages:
+                last_message_id = messages[-1]["id"]
+        elif action == "GET /user/services":
+            await session.call(action, "GET", "/user/services")
+        elif action == "GET /user/service-requests":
+            await session.call(action, "GET", "/user/service-requests")
+        elif action == "GET /user/profile":
+            await session.call(action, "GET", "/user/profile")
+        elif action == "POST /user/chats/{id}/messages":
+            await session.call(action, "POST", f"/user/chats/{chat_id}/messages",
+                               json={"content": rng.choice(GUEST_TEXTS)})
+        elif action == "POST /user/service-requests" and services and chat["booking"]["status"] == "active":
+            # Услуги заказываются только в активной брони
+            await session.call(action, "POST", "/user/service-requests", json={
+                "booking_id": chat["booking"]["id"], "service_id": rng.choice(services)["id"]
+            })
+
+
+async def employee_login(session, args):
+    return await session.login("POST /admin/login", "/admin/login", {
+        "username": args.username, "password": args.password
+    })
+
+
+async def bot_user(session, rng, args, manifest, deadline):
+    if not await employee_login(session, args):
+        return
+    last_seen = {}
+    next_sweep = time.monotonic()
+    while time.monotonic() < deadline:
+        await session.call("GET /reception/rooms", "GET", "/reception/rooms")
+        for chat_id in rng.sample(manifest["reception_chat_ids"], min(args.bot_chats, len(manifest["reception_chat_ids"]))):
+            params = {"since_id": last_seen[chat_id]} if chat_id in last_seen else {}
+            messages = await session.call("GET /reception/chats/{id}/messages", "GET",
+                                          f"/reception/chats/{chat_id}/messages", params=params)
+            if messages:
+                last_seen[chat_id] = messages[-1]["id"]
+        if time.monotonic() >= next_sweep:
+            await session.call("GET /reception/getusers", "GET", "/reception/getusers")
+            next_sweep = time.monotonic() + args.sweep_interval
+        await asyncio.sleep(args.bot_interval)
+
+
+async def reception_user(session, rng, args, manifest, deadline):
+    if not await employee_login(session, args):
+        return
+    chat_ids = manifest["reception_chat_ids"]
+    booking_ids = manifest["booking_ids"]
+    request_ids = list(manifest["service_request_ids"])
+    while time.monotonic() < deadline:
+        await think(rng, args)
+        action = weighted(rng, MIXES["reception"])
+        if action == "GET /reception/rooms":
+            await session.call(action, "GET", "/reception/rooms")
+        elif action == "GET /reception/chats":
+            await session.call(action, "GET", "/reception/chats")
+        elif action == "GET /reception/chats/{id}/messages" and chat_ids:
+            await session.call(action, "GET", f"/reception/chats/{rng.choice(chat_ids)}/messages")
+        elif action == "POST /reception/chats/{id}/messages" and chat_ids:
+            await session.call(action, "POST", f"/reception/chats/{rng.choice(chat_ids)}/messages",
+                               json={"content": "Здравствуйте! Сейчас поможем."})
+        elif action == "GET /reception/service-requests":
+            await session.call(action, "GET", "/reception/service-requests")
+        elif action == "PATCH /reception/service-requests/{id}" and request_ids:
+            await session.call(action, "PATCH", f"/reception/service-requests/{request_ids.pop()}",
+                               json={"status": "in_progress"})
+        elif action == "GET /reception/bookings/{id}" and booking_ids:
+            await session.call(action, "GET", f"/reception/bookings/{rng.choice(booking_ids)}")
+        elif action == "GET /reception/bookings/{id}/folio" and booking_ids:
+            await session.call(action, "GET", f"/reception/bookings/{rng.choice(booking_ids)}/folio")
+        elif action == "PATCH /reception/chats/{id}/claim" and chat_ids:
+            await session.call(action, "PATCH", f"/reception/chats/{rng.choice(chat_ids)}/claim")
+
+
+def compare(current, baseline, threshold):
+    regressions = []
+    print(f"\n{'endpoint':<42} {'p95 base':>9} {'p95 now':>9} {'p99 base':>9} {'p99 now':>9}")
+    for endpoint, stats in current.items():
+        base = baseline.get(endpoint)
+        if base is None:
+            continue
+        print(f"{endpoint:<42} {base['p95']:>9.1f} {stats['p95']:>9.1f} {base['p99']:>9.1f} {stats['p99']:>9.1f}")
+        for key in ("p95", "p99"):
+            if base[key] > 0 and stats[key] > base[key] * (1 + threshold):
+                regressions.append(f"{endpoint} {key}: {base[key]:.1f} -> {stats[key]:.1f} ms")
+    return regressions
+
+
+def print_report(summary, duration):
+    total = sum(stats["count"] for stats in summary.values())
+    print(f"\nrequests={total} duration={duration:.1f}s rps={total / duration:.1f}")
+    print(f"{'endpoint':<42} {'count':>7} {'err':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for endpoint, stats in summary.items():
+        print(
+            f"{endpoint:<42} {stats['count']:>7} {stats['errors']:>5} "
+            f"{stats['p50']:>8.1f} {stats['p95']:>8.1f} {stats['p99']:>8.1f} {stats['max']:>8.1f}"
+        )
+
+
+async def run(args):
+    with open(args.manifest, "rb") as f:
+        manifest = orjson.loads(f.read())
+    if not manifest["guests"]:
+        raise SystemExit("Manifest has no guests with active bookings")
+
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    started = time.monotonic()
+    deadline = started + args.duration
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        users = []
+        for i in range(args.guests):
+            users.append(guest_user(Session(client, recorder), random.Random(args.seed * 100003 + i), args, manifest, deadline))
+        for i in range(args.ai_guests if args.ai else 0):
+            users.append(guest_user(Session(client, recorder), random.Random(args.seed * 200003 + i), args, manifest, deadline, ai=True))
+        for i in range(args.receptionists):
+            users.append(reception_user(Session(client, recorder), random.Random(args.seed * 300007 + i), args, manifest, deadline))
+        for i in range(args.bots):
+            users.append(bot_user(Session(client, recorder), random.Random(args.seed * 400009 + i), args, manifest, deadline))
+        await asyncio.gather(*users)
+    duration = time.monotonic() - started
+
+    summary = recorder.summary(duration)
+    print_report(summary, duration)
+
+    if args.output:
+        result = {
+            "meta": {
+                "base_url": args.base_url, "started_at": datetime.now().isoformat(timespec="seconds"),
+                "duration": round(duration, 1), "seed": args.seed, "guests": args.guests,
+                "ai_guests": args.ai_guests if args.ai else 0, "receptionists": args.receptionists,
+                "bots": args.bots, "think_time": args.think_time, "label": args.label,
+            },
+            "endpoints": summary,
+        }
+        with open(args.output, "wb") as f:
+            f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+
+    ok = not any(stats["errors"] for stats in summary.values())
+    if args.baseline:
+        with open(args.baseline, "rb") as f:
+            baseline = orjson.loads(f.read())["endpoints"]
+        regressions = compare(summary, baseline, args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        ok = ok and not regressions
+    return ok
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--manifest", default="loadtest_manifest.json")
+    parser.add_argument("--username", required=True, help="сотрудник ресепшена/админ")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--guests", type=int, default=100)
+    parser.add_argument("--receptionists", type=int, default=3)
+    parser.add_argument("--bots", type=int, default=1)
+    parser.add_argument("--ai", action="store_true", help="включить сценарий AI-чата")
+    parser.add_argument("--ai-guests", type=int, default=10)
+    parser.add_argument("--ai-stream", action="store_true", help="AI-чат через SSE, с замером до первого фрагмента")
+    parser.add_argument("--think-time", type=float, default=1.0, help="средняя пауза между действиями, с")
+    parser.add_argument("--bot-interval", type=float, default=5.0)
+    parser.add_argument("--sweep-interval", type=float, default=60.0)
+    parser.add_argument("--bot-chats", type=int, default=10, help="чатов, опрашиваемых ботом за цикл")
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--label", help="метка прогона (версия, коммит)")
+    parser.add_argument("--output", help="сохранить результат в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="допустимый рост p95/p99, доля")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main_cli()